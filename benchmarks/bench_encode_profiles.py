@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+编码档位（fast / balanced / max_compression）的耗时与文件大小对比基准（默认 WebP）
+
+每张图片只解码并 resize 一次，之后按各档位分别编码，汇总整个样本集的编码耗时和输出字节数
+
+用法:
+    python benchmarks/bench_encode_profiles.py [images or directories...] [--width 1200] [--quality 80] [--runs 3]
+        [--format avif]
+
+未指定图片时生成一组合成样本（照片、截图、带透明通道的图标）
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image, ImageDraw
+
+from imgseofriend.batch import collect_images
+from imgseofriend.core import ENCODE_PROFILES, encode_image, format_filesize, open_image, prepare_image
+from imgseofriend.encoders import DEFAULT_OUTPUT_FORMAT, get_available_formats, get_encoder
+from samples import make_photo
+
+
+def make_samples(directory: Path):
+    """生成不同类型的合成样本"""
+    size = (3000, 2000)
+
+    # 照片：渐变 + 噪点 + 细线
+    make_photo(size).save(directory / "photo.jpg", quality=92)
+
+    # 截图：大面积纯色 + 文字
+    screenshot = Image.new('RGB', size, (245, 245, 245))
+    draw = ImageDraw.Draw(screenshot)
+    for y in range(40, size[1], 60):
+        draw.rectangle((40, y, size[0] // 2, y + 30), fill=(60, 90, 160))
+        draw.text((size[0] // 2 + 40, y), "Lorem ipsum dolor sit amet " * 4, fill=(20, 20, 20))
+    screenshot.save(directory / "screenshot.png")
+
+    # 图标：透明背景上的形状
+    icon = Image.new('RGBA', (1600, 1600), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(icon)
+    draw.ellipse((200, 200, 1400, 1400), fill=(230, 80, 40, 255))
+    draw.rectangle((600, 500, 1000, 1100), fill=(255, 255, 255, 200))
+    icon.save(directory / "icon.png")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encode profiles")
+    parser.add_argument("images", nargs="*", help="images or directories to benchmark")
+    parser.add_argument("--width", type=int, default=1200, help="target width (default: 1200)")
+    parser.add_argument("--quality", type=int, default=80, help="output quality (default: 80)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per image and profile (default: 3)")
+    parser.add_argument("--format", choices=get_available_formats(), default=DEFAULT_OUTPUT_FORMAT,
+                        help=f"output format (default: {DEFAULT_OUTPUT_FORMAT})")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = []
+        for path in args.images:
+            images.extend(collect_images(path) if os.path.isdir(path) else [path])
+        if not args.images:
+            make_samples(Path(tmp))
+            images = collect_images(tmp)
+
+        # 解码和 resize 与档位无关，只做一次
+        prepared = []
+        for path in images:
+            source, _ = open_image(path)
+            with source:
+                img = prepare_image(source, args.width)
+                img.load()
+            prepared.append(img)
+
+        encoder = get_encoder(args.format)
+        print(f"{len(prepared)} images, {encoder.label}, width {args.width}, quality {args.quality}, {args.runs} runs")
+        print(f"{'profile':<16} {'options':<24} {'encode ms':>10} {'bytes':>12} "
+              f"{'vs max time':>11} {'vs max bytes':>12}")
+
+        rows = []
+        for name in ENCODE_PROFILES:
+            total_ms, total_bytes = 0.0, 0
+            for img in prepared:
+                times = []
+                for _ in range(args.runs):
+                    start = time.perf_counter()
+                    data = encode_image(img, args.quality, name, args.format)
+                    times.append(time.perf_counter() - start)
+                total_ms += statistics.median(times) * 1000
+                total_bytes += len(data)
+            options = ", ".join(f"{key}={value}" for key, value in encoder.profile_options.get(name, {}).items())
+            rows.append((name, options, total_ms, total_bytes))
+
+        _, _, reference_ms, reference_bytes = rows[-1]
+        for name, options, total_ms, total_bytes in rows:
+            print(f"{name:<16} {options:<24} {total_ms:>10.1f} {format_filesize(total_bytes):>12} "
+                  f"{total_ms / reference_ms:>10.2f}x {(total_bytes / reference_bytes - 1) * 100:>+11.1f}%")
+
+
+if __name__ == "__main__":
+    main()
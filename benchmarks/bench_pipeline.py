@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+图片流水线基准：按格式 / 编码档位 / 宽度分别统计解码、resize 和编码耗时
+
+每个 (图片, 宽度) 组合在独立的子进程中执行，峰值内存（RSS）互不影响；
+解码和 resize 与格式无关，每个组合只计时一次，之后按各格式和档位分别编码。
+结果以 JSON 输出，便于保存后与改动前的结果对比。
+
+用法:
+    python benchmarks/bench_pipeline.py [images or directories...] [--widths 750,1200]
+        [--formats webp,avif] [--profiles fast,max_compression] [--quality 80] [--runs 3]
+        [--output results.json]
+
+未指定图片时生成一组合成样本（JPEG 照片、带透明通道的 PNG、HEIC、大尺寸全景图）
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFilter
+
+from imgseofriend.analysis import compute_ssim, get_ssim_reference
+from imgseofriend.batch import collect_images
+from imgseofriend.core import (
+    ENCODE_PROFILES, calculate_target_size, encode_image, open_image, prepare_image,
+    reduce_for_target
+)
+from imgseofriend.encoders import DEFAULT_OUTPUT_FORMAT, get_available_formats, get_encoder
+from samples import make_photo
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def make_corpus(directory: Path) -> List[str]:
+    """生成合成样本，返回文件路径列表（未安装 pillow-heif 时跳过 HEIC）"""
+    paths = []
+
+    photo = make_photo((4000, 3000))
+    photo.save(directory / "photo.jpg", quality=92)
+    paths.append(directory / "photo.jpg")
+
+    # 带透明通道的产品图：半透明边缘和阴影
+    cutout = Image.new('RGBA', (2400, 2400), (0, 0, 0, 0))
+    mask = Image.new('L', (1600, 1600), 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, 1599, 1599), radius=200, fill=255)
+    cutout.paste(photo.resize((1600, 1600)), (400, 400), mask.filter(ImageFilter.GaussianBlur(8)))
+    draw = ImageDraw.Draw(cutout)
+    draw.ellipse((200, 1900, 2200, 2300), fill=(0, 0, 0, 90))
+    cutout.save(directory / "cutout.png")
+    paths.append(directory / "cutout.png")
+
+    try:
+        from pillow_heif import register_heif_opener
+        register_heif_opener()
+        photo.save(directory / "photo.heic", quality=90)
+        paths.append(directory / "photo.heic")
+    except Exception as e:
+        print(f"Skipping HEIC sample: {e}", file=sys.stderr)
+
+    make_photo((12000, 3000)).save(directory / "panorama.jpg", quality=90)
+    paths.append(directory / "panorama.jpg")
+
+    return [str(path) for path in paths]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB，不支持的平台返回 None）"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 以 KB 为单位，macOS 以字节为单位
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def psnr(reference: Image.Image, data: bytes) -> float:
+    """解码输出并与编码前的图片比较，返回 PSNR（dB）"""
+    with Image.open(io.BytesIO(data)) as decoded:
+        candidate = np.asarray(decoded.convert('RGB'), dtype=np.float32)
+    expected = np.asarray(reference.convert('RGB'), dtype=np.float32)
+    mse = float(np.mean((expected - candidate) ** 2))
+    if mse == 0:
+        return float('inf')
+    return 10 * np.log10(255 ** 2 / mse)
+
+
+def decode(path: str, target_width: int) -> Image.Image:
+    """
+    打开并解码图片，与流水线的 decode 阶段一致：
+    按目标尺寸降低解码分辨率（JPEG 使用 draft 模式，其他格式使用 Image.reduce）
+    """
+    img, _ = open_image(path)
+    source_format = img.format
+    reduced = reduce_for_target(img, calculate_target_size(img.size, target_width))
+    reduced.load()
+    if reduced is not img:
+        img.close()
+        reduced.format = source_format  # Image.reduce 返回的新图片不带 format
+    return reduced
+
+
+def median_ms(func, runs: int):
+    """执行 runs 次，返回 (耗时中位数 ms, 最后一次的结果)"""
+    times = []
+    result = None
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000, result
+
+
+def bench_image(task: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """子进程任务：对一张图片和一个宽度执行所有格式和档位，返回结果行"""
+    path, width, runs, quality = task["path"], task["width"], task["runs"], task["quality"]
+    source_bytes = os.path.getsize(path)
+
+    decode_ms, source_img = median_ms(lambda: decode(path, width), runs)
+    resize_ms, img = median_ms(lambda: prepare_image(source_img, width), runs)
+    reference = get_ssim_reference(img)
+
+    rows = []
+    for output_format in task["formats"]:
+        for profile in task["profiles"]:
+            encode_ms, data = median_ms(lambda: encode_image(img, quality, profile, output_format), runs)
+            total_ms = decode_ms + resize_ms + encode_ms
+            rows.append({
+                "image": Path(path).name,
+                "source_format": source_img.format,
+                "source_size": list(source_img.size),
+                "source_bytes": source_bytes,
+                "width": width,
+                "output_size": list(img.size),
+                "format": output_format,
+                "profile": profile,
+                "quality": quality,
+                "decode_ms": round(decode_ms, 2),
+                "resize_ms": round(resize_ms, 2),
+                "encode_ms": round(encode_ms, 2),
+                "total_ms": round(total_ms, 2),
+                "mb_per_s": round(source_bytes / (1024 * 1024) / (total_ms / 1000), 2),
+                "output_bytes": len(data),
+                "psnr_db": round(psnr(img, data), 2),
+                "ssim": round(compute_ssim(reference, data), 4),
+            })
+
+    peak = peak_rss_mb()
+    for row in rows:
+        row["peak_rss_mb"] = round(peak, 1) if peak is not None else None
+    return rows
+
+
+def parse_list(value: str) -> List[str]:
+    """解析逗号分隔的参数"""
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark decode, resize and encode per format, profile and width")
+    parser.add_argument("images", nargs="*", help="images or directories to benchmark")
+    parser.add_argument("--widths", default="1200", help="comma-separated target widths (default: 1200)")
+    parser.add_argument("--formats", default=DEFAULT_OUTPUT_FORMAT,
+                        help=f"comma-separated formats from: {', '.join(get_available_formats())} "
+                             f"(default: {DEFAULT_OUTPUT_FORMAT})")
+    parser.add_argument("--profiles", default=",".join(ENCODE_PROFILES),
+                        help="comma-separated encode profiles (default: all)")
+    parser.add_argument("--quality", type=int, default=80, help="output quality (default: 80)")
+    parser.add_argument("--runs", type=int, default=3, help="runs per stage, median is reported (default: 3)")
+    parser.add_argument("--output", default=None, help="write JSON to this file instead of stdout")
+    args = parser.parse_args()
+
+    try:
+        widths = [int(width) for width in parse_list(args.widths)]
+        formats = parse_list(args.formats)
+        for output_format in formats:
+            get_encoder(output_format)
+    except ValueError as e:
+        parser.error(str(e))
+    profiles = parse_list(args.profiles)
+    for profile in profiles:
+        if profile not in ENCODE_PROFILES:
+            parser.error(f"Unknown encode profile: {profile}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = []
+        for item in args.images:
+            if os.path.isdir(item):
+                images.extend(str(path) for path in collect_images(item))
+            else:
+                images.append(item)
+        if not images:
+            images = make_corpus(Path(tmp))
+
+        tasks = [{"path": path, "width": width, "runs": args.runs, "quality": args.quality,
+                  "formats": formats, "profiles": profiles}
+                 for path in images for width in widths]
+
+        # 每个任务使用新的子进程，峰值内存只反映该图片和宽度
+        rows = []
+        with multiprocessing.Pool(1, maxtasksperchild=1) as pool:
+            for task_rows in pool.imap(bench_image, tasks):
+                rows.extend(task_rows)
+                for row in task_rows:
+                    print(f"{row['image']:<20} {row['width']:>5}w {row['format']:<5} {row['profile']:<16} "
+                          f"{row['total_ms']:>9.1f} ms {row['output_bytes']:>10} B", file=sys.stderr)
+
+    report = {
+        "environment": {
+            "python": platform.python_version(),
+            "pillow": Image.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "settings": {"widths": widths, "formats": formats, "profiles": profiles,
+                     "quality": args.quality, "runs": args.runs},
+        "results": rows,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+降低解码分辨率（JPEG draft / Image.reduce）与全分辨率解码的对比基准
+
+对每张图片分别用两种方式 resize 到目标宽度，报告耗时和 PSNR（以全分辨率路径为参考）
+
+用法:
+    python benchmarks/bench_reduced_decode.py [images...] [--width 1200] [--runs 5]
+
+未指定图片时生成一张 6000x4000 的合成 JPEG 和 PNG 作为样本
+"""
+
+import argparse
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image, ImageChops, ImageStat
+
+from imgseofriend.core import calculate_target_size, get_reduction_factor, open_image, prepare_image
+from samples import make_photo
+
+
+def run_once(path: str, target_width: int, reduced_decode: bool):
+    """执行一次解码 + resize，返回 (耗时, 结果图片)"""
+    start = time.perf_counter()
+    source, _ = open_image(path)
+    with source:
+        img = prepare_image(source, target_width, reduced_decode=reduced_decode)
+        img.load()
+    return time.perf_counter() - start, img
+
+
+def psnr(reference: Image.Image, candidate: Image.Image) -> float:
+    """计算 PSNR（dB）"""
+    diff = ImageChops.difference(reference.convert('RGB'), candidate.convert('RGB'))
+    mse = statistics.mean(rms ** 2 for rms in ImageStat.Stat(diff).rms)
+    if mse == 0:
+        return float('inf')
+    return 10 * math.log10(255 ** 2 / mse)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark reduced decoding against full decoding")
+    parser.add_argument("images", nargs="*", help="images to benchmark")
+    parser.add_argument("--width", type=int, default=1200, help="target width (default: 1200)")
+    parser.add_argument("--runs", type=int, default=5, help="runs per image (default: 5)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        images = args.images
+        if not images:
+            jpeg_path = Path(tmp) / "sample.jpg"
+            make_photo((6000, 4000)).save(jpeg_path, quality=92)
+            png_path = Path(tmp) / "sample.png"
+            with Image.open(jpeg_path) as img:
+                img.save(png_path)
+            images = [str(jpeg_path), str(png_path)]
+
+        print(f"{'image':<24} {'size':>11} {'factor':>6} {'full ms':>9} "
+              f"{'reduced ms':>10} {'speedup':>7} {'PSNR dB':>8}")
+        for path in images:
+            with Image.open(path) as img:
+                size = img.size
+            factor = get_reduction_factor(size, calculate_target_size(size, args.width))
+
+            full_times, reduced_times = [], []
+            for _ in range(args.runs):
+                elapsed, full_img = run_once(path, args.width, reduced_decode=False)
+                full_times.append(elapsed)
+                elapsed, reduced_img = run_once(path, args.width, reduced_decode=True)
+                reduced_times.append(elapsed)
+
+            full_ms = statistics.median(full_times) * 1000
+            reduced_ms = statistics.median(reduced_times) * 1000
+            print(f"{Path(path).name[:24]:<24} {size[0]:>5}x{size[1]:<5} {factor:>6} "
+                  f"{full_ms:>9.1f} {reduced_ms:>10.1f} {full_ms / reduced_ms:>6.1f}x "
+                  f"{psnr(full_img, reduced_img):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+"""
+基准脚本共用的合成样本
+"""
+
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def make_photo(size=(6000, 4000)) -> Image.Image:
+    """生成带渐变、细节和噪点的合成照片"""
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 40)
+    img = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    draw = ImageDraw.Draw(img)
+    for i in range(0, size[0], 97):
+        draw.line((i, 0, size[0] - i, size[1]), fill=(255, 255, 255), width=3)
+    return img.filter(ImageFilter.GaussianBlur(1))
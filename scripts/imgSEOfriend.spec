@@ -61,7 +61,6 @@ a = Analysis(
         # 排除不需要的模块以减小包大小
         'tkinter',
         'matplotlib',
-        'numpy',
         'scipy',
         'pandas',
         'jupyter',
@@ -0,0 +1,256 @@
+"""
+异步批量生成 SEO 数据
+在 asyncio 中同时处理大量关键词：并发数有上限，每个请求有独立的超时，结果按完成顺序返回。
+
+HTTP 请求仍由 AIService 的连接池（requests.Session）发送，在与并发上限相同大小的线程池中执行；
+限流（RateLimiter）和重试等待使用 asyncio.sleep，等待并发名额时由 RateLimiter 唤醒，都不占用线程。
+
+用法:
+    async with AsyncAIService(config_manager, concurrency=16) as service:
+        async for index, result in service.generate_many([("black tote", "IMG_001"), ...]):
+            ...
+
+指定 batch_size 时多个关键词合并为一个请求（见 AIService.generate_seo_batch）
+"""
+
+import asyncio
+import functools
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import (TYPE_CHECKING, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional,
+                    Sequence, Tuple, TypeVar)
+
+import requests
+
+from .ai_service import BATCH_REASK_ROUNDS, AIService, get_ai_service
+from .rate_limit import estimate_tokens
+
+if TYPE_CHECKING:
+    from .config_manager import ConfigManager
+
+# 默认同时进行的请求数
+DEFAULT_CONCURRENCY = 8
+
+T = TypeVar("T")
+
+
+def _set_done(future: asyncio.Future) -> None:
+    """唤醒等待并发名额的任务（已被取消或已唤醒时忽略）"""
+    if not future.done():
+        future.set_result(None)
+
+
+def _wake(loop: asyncio.AbstractEventLoop, future: asyncio.Future) -> None:
+    """RateLimiter 有名额时的回调（可能在其他线程中调用）"""
+    try:
+        loop.call_soon_threadsafe(_set_done, future)
+    except RuntimeError:
+        pass  # 事件循环已关闭
+
+
+def _empty_result() -> Dict[str, str]:
+    """生成失败时的结果（与 AIService.generate_seo_data 一致）"""
+    return {"title": "", "alt_text": ""}
+
+
+def _batched(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    """按 size 个一组逐批读取"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class AsyncAIService:
+    """AIService 的 asyncio 版本，用于批量生成"""
+
+    def __init__(self, config_manager: Optional["ConfigManager"] = None,
+                 concurrency: int = DEFAULT_CONCURRENCY,
+                 request_timeout: Optional[float] = None,
+                 service: Optional[AIService] = None):
+        """
+        Args:
+            config_manager: 配置管理器（未指定 service 时使用）
+            concurrency: 同时进行的请求数上限
+            request_timeout: 单次请求的超时时间（秒，默认与 AIService.timeout 相同）
+            service: 复用已有的 AIService（默认新建，连接池大小与并发数相同，
+                与 get_ai_service() 共用 RateLimiter 和 AI 响应缓存）
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        if service is None:
+            # 只有连接池按并发数单独创建；配额、429 暂停、自适应并发数和 AI 响应缓存与界面及其他调用共用
+            shared = get_ai_service(config_manager)
+            service = AIService(config_manager or shared.config_manager, pool_maxsize=concurrency,
+                                cache=shared.cache, rate_limiter=shared.rate_limiter)
+            self._owns_service = True
+        else:
+            self._owns_service = False
+        self.service = service
+        self.request_timeout = request_timeout or self.service.timeout
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ai-request")
+
+    async def _in_thread(self, func: Callable[..., T], *args: Any) -> T:
+        """在默认线程池中执行阻塞调用（读取配置、AI 缓存的 SQLite 读写），不占用请求线程池"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _acquire_slot(self) -> None:
+        """等待 RateLimiter 的并发名额（名额释放时由 RateLimiter 唤醒，不轮询）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            available = loop.create_future()
+            if self.service.rate_limiter.try_acquire(functools.partial(_wake, loop, available)):
+                return
+            await available
+
+    async def _send(self, url: str, headers: Dict[str, str], payload: Dict) -> requests.Response:
+        """
+        在 RateLimiter 的并发名额内发送一次请求（在线程池中执行）
+
+        requests 的读取超时在每次收到数据时重新计时，这里另外限制整个请求的时间，
+        超时后抛出 requests.exceptions.Timeout 并释放名额
+        """
+        await self._acquire_slot()
+        try:
+            return await asyncio.wait_for(
+                asyncio.get_running_loop().run_in_executor(
+                    self._executor, self.service._post, url, headers, payload, self.request_timeout),
+                self.request_timeout)
+        except asyncio.TimeoutError:
+            raise requests.exceptions.Timeout(f"Request exceeded {self.request_timeout}s")
+        finally:
+            self.service.rate_limiter.release()
+
+    async def _request(self, url: str, headers: Dict[str, str],
+                       payload: Dict) -> Optional[requests.Response]:
+        """带重试的异步请求（失败返回 None）"""
+        tokens = estimate_tokens(payload)
+        last_error = None
+        wait_time: Optional[float]
+
+        for attempt in range(self.service.max_retries):
+            await asyncio.sleep(self.service.rate_limiter.reserve(tokens))
+            try:
+                response = await self._send(url, headers, payload)
+            except requests.exceptions.RequestException as e:
+                last_error = self.service._describe_error(e, attempt)
+                print(f"[AI_ASYNC] {last_error}")
+                wait_time = 2
+            else:
+                wait_time = self.service._check_response(response, attempt)
+                if wait_time == 0:
+                    return response
+                if wait_time is None:
+                    break
+            if attempt < self.service.max_retries - 1:
+                await asyncio.sleep(wait_time)
+
+        print(f"[AI_ASYNC] All attempts failed. Last error: {last_error}")
+        return None
+
+    async def generate(self, keyword: str, filename: str = "",
+                       bypass_cache: bool = False) -> Dict[str, str]:
+        """生成单个关键词的 SEO 数据（参数和返回值同 AIService.generate_seo_data）"""
+        # 读取配置（QSettings 和 API Key 解密）在线程中执行，不阻塞事件循环
+        request = await self._in_thread(self.service._prepare_request, keyword)
+        if request is None:
+            return _empty_result()
+        keys, cached = await self._in_thread(self.service._lookup_cache, [(keyword, "")], bypass_cache)
+        if cached[0] is not None:
+            return cached[0]
+        response = await self._request(*request)
+        result = self.service._parse_seo_response(response)
+        await self._in_thread(self.service._store_cache, keys, [result])
+        return result
+
+    async def generate_batch(self, items: Sequence[Tuple[str, str]],
+                             bypass_cache: bool = False) -> List[Dict[str, str]]:
+        """
+        一个请求生成多个关键词（返回 JSON 数组），已缓存的条目不再请求，缺失或无法解析的条目重新请求
+
+        Returns:
+            与 items 顺序一致的结果列表，失败的条目为空字符串
+        """
+        keys, cached = await self._in_thread(self.service._lookup_cache, items, bypass_cache)
+        results: Dict[int, Dict[str, str]] = {
+            index: result for index, result in enumerate(cached) if result is not None}
+        remaining = [index for index in range(len(items)) if index not in results]
+        missing = list(remaining)
+        for _ in range(1 + BATCH_REASK_ROUNDS):
+            if not remaining:
+                break
+            request = await self._in_thread(self.service._prepare_batch_request,
+                                            [items[index] for index in remaining])
+            if request is None:
+                break
+            response = await self._request(*request)
+            if response is None:
+                break
+            remaining = self.service._merge_batch_results(
+                self.service._parse_batch_response(response, len(remaining)), remaining, results)
+        if keys is not None:
+            await self._in_thread(self.service._store_cache, [keys[index] for index in missing],
+                                  [results.get(index, _empty_result()) for index in missing])
+        return [results.get(index, _empty_result()) for index in range(len(items))]
+
+    async def generate_many(self, items: Iterable[Tuple[str, str]], batch_size: int = 1
+                            ) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+        """
+        批量生成，按完成顺序返回结果
+
+        items 只会被逐批读取，同时进行的请求数不超过 concurrency，
+        输入很大（或是生成器）时也不会一次创建全部任务
+
+        Args:
+            items: (keyword, filename) 序列
+            batch_size: 每个请求包含的关键词数（大于 1 时使用 generate_batch）
+
+        Yields:
+            (items 中的序号, 包含 title 和 alt_text 的字典)
+        """
+        pending = _batched(enumerate(items), batch_size)
+        results: asyncio.Queue = asyncio.Queue()
+
+        async def worker() -> None:
+            # 所有 worker 共用一个迭代器，在事件循环中依次取出下一批
+            try:
+                for batch in pending:
+                    if batch_size == 1:
+                        index, (keyword, filename) = batch[0]
+                        await results.put((index, await self.generate(keyword, filename)))
+                        continue
+                    batch_results = await self.generate_batch([item for _, item in batch])
+                    for (index, _), result in zip(batch, batch_results):
+                        await results.put((index, result))
+            finally:
+                await results.put(None)
+
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.concurrency)]
+        try:
+            running = len(workers)
+            while running:
+                item = await results.get()
+                if item is None:
+                    running -= 1
+                else:
+                    yield item
+            # 传播 worker 中的异常
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+
+    def close(self) -> None:
+        """关闭线程池（以及自行创建的连接池，共用的 AI 响应缓存保持打开）"""
+        self._executor.shutdown(wait=False)
+        if self._owns_service:
+            self.service.session.close()
+
+    async def __aenter__(self) -> "AsyncAIService":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        self.close()
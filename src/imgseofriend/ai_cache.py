@@ -0,0 +1,188 @@
+"""
+AI 响应缓存
+按 API 地址 + 模型 + 系统提示词哈希 + 关键词（+ 批量请求中的文件名）缓存生成的 Title / Alt Text，
+重复的关键词和误点的 "Regenerate" 不再调用付费 API。
+
+条目保存在 SQLite 中，超过有效期（TTL）视为未命中，超出条目上限时按最近使用时间淘汰。
+
+用法:
+    imgseofriend ai-cache stats
+    imgseofriend ai-cache clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+# 默认缓存文件（与输出缓存同在 ~/.imgfriend/cache 下）
+DEFAULT_AI_CACHE_PATH = Path.home() / ".imgfriend" / "cache" / "ai.db"
+
+# 默认有效期（天）
+DEFAULT_AI_CACHE_TTL_DAYS = 30
+
+# 默认条目上限（每条只有几百字节）
+DEFAULT_AI_CACHE_MAX_ENTRIES = 20000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    alt_text TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def normalize_keyword(keyword: str) -> str:
+    """关键词归一化：忽略大小写和多余空白"""
+    return " ".join(keyword.lower().split())
+
+
+def make_ai_cache_key(api_base_url: str, model_name: str, system_prompt: str,
+                      keyword: str, filename: str = "") -> str:
+    """根据请求参数生成缓存键（filename 只在写入提示词时传入）"""
+    payload = json.dumps({
+        "url": api_base_url.rstrip("/"),
+        "model": model_name,
+        "prompt": hashlib.blake2b(system_prompt.encode(), digest_size=16).hexdigest(),
+        "keyword": normalize_keyword(keyword),
+        "filename": filename,
+    }, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+class AIResponseCache:
+    """
+    SQLite AI 响应缓存
+
+    每次读写都立即提交，多个进程可同时使用同一个缓存文件；线程安全
+    """
+
+    def __init__(self, path: Optional[Union[str, os.PathLike]] = None,
+                 ttl_days: float = DEFAULT_AI_CACHE_TTL_DAYS,
+                 max_entries: int = DEFAULT_AI_CACHE_MAX_ENTRIES):
+        self.path = Path(path) if path else DEFAULT_AI_CACHE_PATH
+        self.ttl_seconds = ttl_days * 24 * 3600
+        self.max_entries = max_entries
+
+        # 本次运行的命中统计
+        self.hits = 0
+        self.misses = 0
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, str]]:
+        """
+        查找缓存
+
+        Returns:
+            命中时返回 {"title", "alt_text"}，未命中或已过期返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT title, alt_text, created_at FROM responses WHERE key = ?",
+                                     (key,)).fetchone()
+            if row is None or now - row[2] > self.ttl_seconds:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            # 更新最近使用时间
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return {"title": row[0], "alt_text": row[1]}
+
+    def put(self, key: str, result: Dict[str, str]) -> None:
+        """写入生成结果（title 或 alt_text 为空的失败结果不缓存）"""
+        if not result.get("title") or not result.get("alt_text"):
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, title, alt_text, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, result["title"], result["alt_text"], now, now)
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        """超出条目上限时按最近使用时间淘汰，一次淘汰到上限的 90%"""
+        count = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count <= self.max_entries:
+            return
+        excess = count - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN "
+            "(SELECT key FROM responses ORDER BY last_used, rowid LIMIT ?)", (excess,)
+        )
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_days": self.ttl_seconds / (24 * 3600),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(prog="imgseofriend ai-cache",
+                                     description="Inspect or clear the AI response cache")
+    parser.add_argument("action", choices=["stats", "clear"])
+    parser.add_argument("--path", default=None, help=f"cache database (default: {DEFAULT_AI_CACHE_PATH})")
+    args = parser.parse_args(argv)
+
+    cache = AIResponseCache(args.path)
+    try:
+        if args.action == "clear":
+            cache.clear()
+            print(f"Cleared {cache.path}")
+            return 0
+
+        stats = cache.get_stats()
+        print(f"Cache file: {stats['path']}")
+        print(f"Entries: {stats['entries']}/{stats['max_entries']} (TTL {stats['ttl_days']:g} days)")
+        return 0
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
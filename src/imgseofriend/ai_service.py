@@ -1,29 +1,211 @@
 import requests
 import json
+import re
+import sqlite3
+import threading
 import time
-from typing import Dict, Optional, Any
-from .config_manager import ConfigManager
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Any, Sequence, Tuple
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from .ai_cache import AIResponseCache, make_ai_cache_key
+from .rate_limit import RateLimiter, estimate_tokens
+
+if TYPE_CHECKING:
+    # ConfigManager 基于 QSettings：只在未传入配置时导入，命令行和 asyncio 批量生成不依赖 PySide6
+    from .config_manager import ConfigManager
+
+# 连接池：每个主机保持的空闲连接数上限（同时运行的工作线程超过该值时临时新建连接）
+POOL_MAXSIZE = 16
+
+# 建立连接的超时时间（秒），读取超时见 AIService.timeout
+CONNECT_TIMEOUT = 5
+
+# 批量生成：每个请求包含的关键词数（系统提示词每批只发送一次）
+DEFAULT_BATCH_SIZE = 20
+
+# 批量生成：每个关键词预留的输出 token 数
+BATCH_TOKENS_PER_ITEM = 120
+
+# 批量生成：响应中缺失或无法解析的条目重新请求的次数
+BATCH_REASK_ROUNDS = 2
+
+# 批量生成：追加在系统提示词之后，覆盖其中"只返回一个 JSON 对象"的要求
+BATCH_SYSTEM_PROMPT_SUFFIX = (
+    "Batch Mode: this request covers several images. Ignore any instruction above to return a single "
+    "JSON object; respond ONLY with a valid JSON array containing one object per image, each with "
+    "\"id\", \"title\" and \"alt_text\"."
+)
+
+
+# 流式响应中 "title": " / "alt_text": " 的位置（值可能尚未结束）
+_PARTIAL_FIELD_RE = re.compile(r'"(title|alt_text)"\s*:\s*"')
+
+
+def _parse_partial_seo(content: str) -> Dict[str, str]:
+    """
+    从未完成的 JSON 文本中提取已到达的 title / alt_text
+
+    例如 '{"title": "Black Leather To' 返回 {"title": "Black Leather To"}；
+    末尾不完整的转义序列留到下一段文本到达后再解析
+    """
+    partial = {}
+    for match in _PARTIAL_FIELD_RE.finditer(content):
+        end = match.end()
+        while end < len(content) and content[end] != '"':
+            end += 2 if content[end] == "\\" else 1
+        raw = content[match.end():min(end, len(content))]
+        try:
+            value = json.loads(f'"{raw}"', strict=False)
+        except ValueError:
+            escape = raw.rfind("\\")
+            if escape == -1:
+                continue
+            try:
+                value = json.loads(f'"{raw[:escape]}"', strict=False)
+            except ValueError:
+                continue
+        partial[match.group(1)] = value
+    return partial
+
+
+def _make_retry() -> Retry:
+    """
+    连接层重试：只重试连接失败和网关错误（502/503/504），不重试读取超时
+    （请求可能已被处理并计费）；429 由 RateLimiter、其他错误由 _make_request_with_retry 处理
+
+    urllib3 默认对带 Retry-After 的 429 也会重试（且只接受整数秒），
+    关闭后所有 429 都返回给 _check_response，由 RateLimiter 统一等待
+    """
+    return Retry(
+        total=2,
+        connect=2,
+        read=0,
+        status=2,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({"POST"}),
+        respect_retry_after_header=False,
+        raise_on_status=False
+    )
 
 
 class AIService:
-    """AI 服务类，负责调用 LLM API 生成 SEO 数据"""
+    """
+    AI 服务类，负责调用 LLM API 生成 SEO 数据
+
+    所有请求通过同一个 requests.Session 发送，复用 keep-alive 连接（省去 DNS、TCP 和 TLS 握手）；
+    实例可在多个工作线程间共享，应用内通过 get_ai_service() 获取共享实例
+
+    指定 cache 且配置中启用了 AI 缓存时，相同的 API 地址、模型、系统提示词和关键词直接返回缓存结果
+
+    所有请求经过同一个 RateLimiter（每分钟请求数 / token 数配额、429 退避和自适应并发数）
+    """
     
-    def __init__(self, config_manager: Optional[ConfigManager] = None):
-        self.config_manager = config_manager or ConfigManager()
+    def __init__(self, config_manager: Optional["ConfigManager"] = None, pool_maxsize: int = POOL_MAXSIZE,
+                 cache: Optional[AIResponseCache] = None, rate_limiter: Optional[RateLimiter] = None):
+        if config_manager is None:
+            from .config_manager import ConfigManager
+            config_manager = ConfigManager()
+        self.config_manager = config_manager
         self.timeout = 30  # 请求超时时间（秒）
         self.max_retries = 3  # 最大重试次数
+        self._config_lock = threading.Lock()  # QSettings 不能在多个线程中同时读取
+        self.session = self._create_session(pool_maxsize)
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter(max_concurrency=pool_maxsize)
     
-    def _get_config(self) -> Dict[str, Any]:
-        """获取 AI 配置"""
+    @staticmethod
+    def _create_session(pool_maxsize: int) -> requests.Session:
+        """创建带连接池和连接层重试的会话"""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=_make_retry())
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["Connection"] = "keep-alive"
+        return session
+
+    def get_connection_stats(self) -> Dict[str, int]:
+        """
+        连接复用统计
+
+        Returns:
+            requests: 发出的 HTTP 请求数；connections: 新建的连接数（每个都需要握手）；
+            reused: 复用已有连接的请求数
+        """
+        request_count = 0
+        connection_count = 0
+        for adapter in set(self.session.adapters.values()):
+            if not isinstance(adapter, HTTPAdapter):
+                continue
+            pools = adapter.poolmanager.pools
+            for key in list(pools.keys()):
+                pool = pools.get(key)
+                if pool is not None:
+                    request_count += pool.num_requests
+                    connection_count += pool.num_connections
         return {
-            "api_base_url": self.config_manager.get_api_base_url(),
-            "api_key": self.config_manager.get_api_key(),
-            "model_name": self.config_manager.get_model_name(),
-            "system_prompt": self.config_manager.get_system_prompt()
+            "requests": request_count,
+            "connections": connection_count,
+            "reused": max(request_count - connection_count, 0)
         }
     
-    def _build_payload(self, keyword: str, system_prompt: str, model_name: str) -> Dict[str, Any]:
-        """构建 API 请求载荷"""
+    def close(self) -> None:
+        """关闭连接池和 AI 响应缓存"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def _get_config(self) -> Dict[str, Any]:
+        """获取 AI 配置"""
+        with self._config_lock:
+            return {
+                "api_base_url": self.config_manager.get_api_base_url(),
+                "api_key": self.config_manager.get_api_key(),
+                "model_name": self.config_manager.get_model_name(),
+                "system_prompt": self.config_manager.get_system_prompt()
+            }
+
+    def _get_cache(self) -> Optional[AIResponseCache]:
+        """获取 AI 响应缓存（未指定或在设置中关闭时返回 None）"""
+        if self.cache is None:
+            return None
+        with self._config_lock:
+            enabled = self.config_manager.get_ai_cache_enabled()
+        return self.cache if enabled else None
+
+    def _lookup_cache(self, items: Sequence[Tuple[str, str]], bypass_cache: bool = False
+                      ) -> Tuple[Optional[List[str]], List[Optional[Dict[str, str]]]]:
+        """
+        查找 AI 响应缓存
+
+        Args:
+            items: (keyword, filename) 序列（filename 只在写入提示词时传入）
+            bypass_cache: 不读取缓存（仍返回缓存键，生成后覆盖旧结果）
+
+        Returns:
+            (缓存键列表, 与 items 顺序一致的缓存结果，未命中为 None)；缓存关闭时缓存键列表为 None
+        """
+        cache = self._get_cache()
+        if cache is None:
+            return None, [None] * len(items)
+        config = self._get_config()
+        keys = [make_ai_cache_key(config["api_base_url"], config["model_name"], config["system_prompt"],
+                                  keyword, filename)
+                for keyword, filename in items]
+        if bypass_cache:
+            return keys, [None] * len(items)
+        return keys, [cache.get(key) for key in keys]
+
+    def _store_cache(self, keys: Optional[List[str]], results: Sequence[Dict[str, str]]) -> None:
+        """将生成结果写入 AI 响应缓存（_lookup_cache 返回的缓存键，失败的结果不写入）"""
+        if keys is None or self.cache is None:
+            return
+        for key, result in zip(keys, results):
+            self.cache.put(key, result)
+
+    def _build_payload(self, keyword: str, system_prompt: str, model_name: str,
+                       stream: bool = False) -> Dict[str, Any]:
+        """构建 API 请求载荷（stream 为 True 时以 SSE 逐段返回）"""
         user_prompt = f"Based on the keyword '{keyword}', generate a concise SEO Title and Alt Text. Output JSON only: {{\"title\": \"...\", \"alt_text\": \"...\"}}"
         
         return {
@@ -40,27 +222,107 @@ class AIService:
             ],
             "temperature": 0.7,
             "max_tokens": 200,
+            "stream": stream
+        }
+
+    @staticmethod
+    def _strip_code_fence(content: str) -> str:
+        """清理内容：移除 markdown 代码块标记"""
+        content = content.strip()
+
+        # 移除 ```json 和 ``` 标记
+        if content.startswith('```json'):
+            content = content[7:]  # 移除 ```json
+        if content.startswith('```'):
+            content = content[3:]   # 移除 ```
+        if content.endswith('```'):
+            content = content[:-3]  # 移除结尾的 ```
+
+        return content.strip()
+
+    def _build_batch_payload(self, items: Sequence[Tuple[str, str]], system_prompt: str,
+                             model_name: str) -> Dict[str, Any]:
+        """
+        构建批量请求载荷：多个关键词放在一条用户消息中，要求返回 JSON 数组
+
+        系统提示词（默认要求返回单个 JSON 对象）后追加 BATCH_SYSTEM_PROMPT_SUFFIX
+        """
+        lines = []
+        for number, (keyword, filename) in enumerate(items, 1):
+            line = f"{number}. keyword: '{keyword}'"
+            if filename:
+                line += f" (file: {filename})"
+            lines.append(line)
+        user_prompt = (
+            "For each numbered image below, generate a concise SEO Title and Alt Text based on its keyword.\n"
+            + "\n".join(lines)
+            + "\nOutput a JSON array only, one object per image: "
+              "[{\"id\": 1, \"title\": \"...\", \"alt_text\": \"...\"}]"
+        )
+
+        return {
+            "model": model_name,
+            "messages": [
+                {
+                    "role": "system",
+                    "content": f"{system_prompt.rstrip()}\n\n{BATCH_SYSTEM_PROMPT_SUFFIX}"
+                },
+                {
+                    "role": "user",
+                    "content": user_prompt
+                }
+            ],
+            "temperature": 0.7,
+            "max_tokens": BATCH_TOKENS_PER_ITEM * len(items),
             "stream": False
         }
     
+    def _parse_batch_response(self, response: Optional[requests.Response],
+                              count: int) -> Dict[int, Dict[str, str]]:
+        """
+        解析批量响应
+
+        Returns:
+            {条目序号（从 0 开始）: {"title", "alt_text"}}，只包含通过验证的条目
+        """
+        if response is None:
+            return {}
+        try:
+            content = self._strip_code_fence(response.json()["choices"][0]["message"]["content"])
+            entries = json.loads(content[content.find('['):content.rfind(']') + 1])
+        except (ValueError, KeyError, IndexError, TypeError) as e:
+            print(f"[AI_SERVICE] Error parsing batch response: {e}")
+            return {}
+        if not isinstance(entries, list):
+            return {}
+
+        # 缺少 id 但数量一致时按顺序对应
+        by_position = len(entries) == count
+        results = {}
+        for position, entry in enumerate(entries):
+            if not isinstance(entry, dict):
+                continue
+            number = entry.get("id", position + 1 if by_position else None)
+            if number is None:
+                continue
+            # 部分模型把 id 写成字符串（"1"）
+            try:
+                number = int(number)
+            except (TypeError, ValueError):
+                continue
+            title, alt_text = entry.get("title"), entry.get("alt_text")
+            if (not 1 <= number <= count
+                    or not isinstance(title, str) or not title.strip()
+                    or not isinstance(alt_text, str) or not alt_text.strip()):
+                continue
+            results[number - 1] = {"title": title, "alt_text": alt_text}
+        return results
+
     def _parse_response_from_response_data(self, response_data: Dict[str, Any]) -> Dict[str, str]:
         """从 API 响应数据中提取 title 和 alt_text"""
         try:
             if "choices" in response_data and len(response_data["choices"]) > 0:
-                content = response_data["choices"][0]["message"]["content"]
-                
-                # 清理内容：移除 markdown 代码块标记
-                content = content.strip()
-                
-                # 移除 ```json 和 ``` 标记
-                if content.startswith('```json'):
-                    content = content[7:]  # 移除 ```json
-                if content.startswith('```'):
-                    content = content[3:]   # 移除 ```
-                if content.endswith('```'):
-                    content = content[:-3]  # 移除结尾的 ```
-                
-                content = content.strip()
+                content = self._strip_code_fence(response_data["choices"][0]["message"]["content"])
                 
                 # 提取 JSON 部分
                 if '{' in content and '}' in content:
@@ -92,76 +354,96 @@ class AIService:
             print(f"[AI_SERVICE] Response text: {response_text[:500]}...")
             return {"title": "", "alt_text": ""}
     
-    def _make_request_with_retry(self, url: str, headers: Dict[str, str], 
-                                payload: Dict[str, Any]) -> Optional[requests.Response]:
-        """带重试机制的请求方法"""
+    def _post(self, url: str, headers: Dict[str, str], payload: Dict[str, Any],
+              timeout: Optional[float] = None) -> requests.Response:
+        """发送一次请求（连接层重试由会话的 urllib3 适配器处理；流式请求不预先读取响应体）"""
+        return self.session.post(url, headers=headers, json=payload, stream=bool(payload.get("stream")),
+                                 timeout=(CONNECT_TIMEOUT, timeout or self.timeout))
+
+    def _check_response(self, response: requests.Response, attempt: int) -> Optional[float]:
+        """
+        检查一次请求的结果
+
+        Returns:
+            0 表示成功；正数为重试前需要等待的秒数；None 表示不应重试
+        """
+        if response.status_code == 200:
+            self.rate_limiter.on_success(response.headers)
+            return 0
+        # 不使用的响应都要关闭：流式请求的响应体未读取，不关闭时连接不会归还连接池
+        try:
+            if response.status_code == 401:
+                print(f"[AI_SERVICE] Authentication failed (attempt {attempt + 1}): Invalid API Key")
+                return None  # 认证失败不重试
+            if response.status_code == 429:
+                # 按 Retry-After / 限流响应头等待（带随机等待），同时暂停其他请求并减少并发数
+                wait_time = max(self.rate_limiter.on_rate_limited(response.headers, attempt), 0.1)
+                print(f"[AI_SERVICE] Rate limited (attempt {attempt + 1}), waiting {wait_time:.1f}s...")
+                return wait_time
+            print(f"[AI_SERVICE] HTTP {response.status_code} (attempt {attempt + 1}): {response.text[:200]}")
+            return 1
+        finally:
+            response.close()
+
+    @staticmethod
+    def _describe_error(error: requests.exceptions.RequestException, attempt: int) -> str:
+        """请求异常的日志描述"""
+        if isinstance(error, requests.exceptions.Timeout):
+            return f"Request timeout (attempt {attempt + 1})"
+        if isinstance(error, requests.exceptions.ConnectionError):
+            return f"Connection error (attempt {attempt + 1})"
+        return f"Request exception (attempt {attempt + 1}): {error}"
+
+    def _make_request_with_retry(self, url: str, headers: Dict[str, str],
+                                 payload: Dict[str, Any],
+                                 hold_slot: bool = False) -> Optional[requests.Response]:
+        """
+        带重试机制的请求方法
+
+        hold_slot 为 True 时（流式请求）成功返回的响应仍占用 RateLimiter 的并发名额，
+        调用方读完或关闭响应后需调用 rate_limiter.release()
+        """
         last_error = None
+        tokens = estimate_tokens(payload)
         
         for attempt in range(self.max_retries):
+            time.sleep(self.rate_limiter.reserve(tokens))
+            self.rate_limiter.acquire()
+            wait_time: Optional[float] = 2
             try:
-                response = requests.post(
-                    url,
-                    headers=headers,
-                    json=payload,
-                    timeout=self.timeout
-                )
-                
-                if response.status_code == 200:
-                    return response
-                elif response.status_code == 401:
-                    print(f"[AI_SERVICE] Authentication failed (attempt {attempt + 1}): Invalid API Key")
-                    break  # 认证失败不重试
-                elif response.status_code == 429:
-                    wait_time = 2 ** attempt  # 指数退避
-                    print(f"[AI_SERVICE] Rate limited (attempt {attempt + 1}), waiting {wait_time}s...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"[AI_SERVICE] HTTP {response.status_code} (attempt {attempt + 1}): {response.text[:200]}")
-                    if attempt < self.max_retries - 1:
-                        time.sleep(1)
-                        
-            except requests.exceptions.Timeout:
-                last_error = f"Request timeout (attempt {attempt + 1})"
-                print(f"[AI_SERVICE] {last_error}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
-            except requests.exceptions.ConnectionError:
-                last_error = f"Connection error (attempt {attempt + 1})"
-                print(f"[AI_SERVICE] {last_error}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
+                response = self._post(url, headers, payload)
+                wait_time = self._check_response(response, attempt)
             except requests.exceptions.RequestException as e:
-                last_error = f"Request exception (attempt {attempt + 1}): {e}"
+                last_error = self._describe_error(e, attempt)
                 print(f"[AI_SERVICE] {last_error}")
-                if attempt < self.max_retries - 1:
-                    time.sleep(2)
+            finally:
+                if not (hold_slot and wait_time == 0):
+                    self.rate_limiter.release()
+            if wait_time == 0:
+                return response
+            if wait_time is None:
+                break
+            if attempt < self.max_retries - 1:
+                time.sleep(wait_time)
         
         print(f"[AI_SERVICE] All attempts failed. Last error: {last_error}")
         return None
     
-    def generate_seo_data(self, keyword: str, filename: str = "") -> Dict[str, str]:
-        """
-        生成 SEO 数据
-        
-        Args:
-            keyword: 目标关键词
-            filename: 文件名（可选，用于提供更多上下文）
-            
-        Returns:
-            包含 title 和 alt_text 的字典，失败时返回空字符串
-        """
+    def _prepare_request(self, keyword: str, stream: bool = False
+                         ) -> Optional[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+        """构建请求 (url, headers, payload)，配置不完整时返回 None"""
         # 获取配置
         config = self._get_config()
         
         # 验证必要配置
         if not config["api_key"].strip():
-            return {"title": "", "alt_text": ""}
+            return None
         
         if not config["api_base_url"].strip():
-            return {"title": "", "alt_text": ""}
+            return None
         
         if not config["model_name"].strip():
-            return {"title": "", "alt_text": ""}
+            return None
         
         # 构建 API 请求
         url = f"{config['api_base_url'].rstrip('/')}/chat/completions"
@@ -171,29 +453,177 @@ class AIService:
             "Authorization": f"Bearer {config['api_key']}"
         }
         
-        payload = self._build_payload(keyword, config["system_prompt"], config["model_name"])
+        payload = self._build_payload(keyword, config["system_prompt"], config["model_name"], stream)
+        return url, headers, payload
+
+    def _parse_seo_response(self, response: Optional[requests.Response]) -> Dict[str, str]:
+        """从成功的响应中提取并验证 SEO 数据"""
+        if response is None:
+            return {"title": "", "alt_text": ""}
         
-        # 发送请求
-        response = self._make_request_with_retry(url, headers, payload)
+        # 解析响应
+        try:
+            return self._parse_seo_response_data(response.json())
+        except Exception:
+            return {"title": "", "alt_text": ""}
+
+    def _parse_seo_response_data(self, response_data: Dict[str, Any]) -> Dict[str, str]:
+        """从响应数据中提取并验证 SEO 数据"""
+        # 提取 SEO 数据
+        seo_data = self._parse_response_from_response_data(response_data)
+
+        # 验证返回数据
+        if not isinstance(seo_data, dict) or "title" not in seo_data or "alt_text" not in seo_data:
+            return {"title": "", "alt_text": ""}
         
+        return seo_data
+
+    def _parse_stream_response(self, response: Optional[requests.Response],
+                               on_partial: Callable[[Dict[str, str]], None]) -> Dict[str, str]:
+        """
+        逐段读取流式响应（SSE），title / alt_text 每次变化时以已到达的部分调用 on_partial
+
+        服务端不支持流式输出（返回普通 JSON）时按非流式响应解析
+        """
         if response is None:
             return {"title": "", "alt_text": ""}
+        if not response.headers.get("Content-Type", "").startswith("text/event-stream"):
+            return self._parse_seo_response(response)
         
-        # 解析响应
+        content = ""
+        partial: Dict[str, str] = {}
         try:
-            response_data = response.json()
-            
-            # 提取 SEO 数据
-            seo_data = self._parse_response_from_response_data(response_data)
-            
-            # 验证返回数据
-            if not isinstance(seo_data, dict) or "title" not in seo_data or "alt_text" not in seo_data:
-                return {"title": "", "alt_text": ""}
-            
-            return seo_data
+            # 按字节分行后再解码（text/event-stream 未声明编码时 requests 会按 ISO-8859-1 解码）
+            for raw_line in response.iter_lines():
+                line = raw_line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or [{}]
+                delta = (choices[0].get("delta") or {}).get("content")
+                if not delta:
+                    continue
+                content += delta
+                current = _parse_partial_seo(content)
+                if current != partial:
+                    partial = current
+                    on_partial(dict(partial))
+        except (requests.exceptions.RequestException, ValueError, AttributeError) as e:
+            print(f"[AI_SERVICE] Error reading stream: {e}")
+            return {"title": "", "alt_text": ""}
+        finally:
+            response.close()
+
+        return self._parse_seo_response_data({"choices": [{"message": {"content": content}}]})
+
+    def generate_seo_data(self, keyword: str, filename: str = "",
+                          bypass_cache: bool = False,
+                          on_partial: Optional[Callable[[Dict[str, str]], None]] = None) -> Dict[str, str]:
+        """
+        生成 SEO 数据
+
+        Args:
+            keyword: 目标关键词
+            filename: 文件名（可选，用于提供更多上下文）
+            bypass_cache: 忽略缓存的结果重新生成（新结果仍写入缓存）
+            on_partial: 指定时使用流式输出，生成过程中以已到达的 title / alt_text 调用
+                （在发送请求的线程中调用，命中缓存时不调用）
             
-        except Exception:
+        Returns:
+            包含 title 和 alt_text 的字典，失败时返回空字符串
+        """
+        request = self._prepare_request(keyword, stream=on_partial is not None)
+        if request is None:
             return {"title": "", "alt_text": ""}
+
+        # 单个关键词的提示词不包含文件名，缓存键也不包含
+        keys, cached = self._lookup_cache([(keyword, "")], bypass_cache)
+        if cached[0] is not None:
+            return cached[0]
+
+        # 发送请求（流式请求读完响应体后才释放并发名额）
+        streaming = on_partial is not None
+        response = self._make_request_with_retry(*request, hold_slot=streaming)
+        if on_partial is not None:
+            try:
+                result = self._parse_stream_response(response, on_partial)
+            finally:
+                if response is not None:
+                    self.rate_limiter.release()
+        else:
+            result = self._parse_seo_response(response)
+        self._store_cache(keys, [result])
+        return result
+
+    def _prepare_batch_request(self, items: Sequence[Tuple[str, str]]
+                               ) -> Optional[Tuple[str, Dict[str, str], Dict[str, Any]]]:
+        """构建批量请求 (url, headers, payload)，配置不完整时返回 None"""
+        request = self._prepare_request("")
+        if request is None:
+            return None
+        url, headers, payload = request
+        system_prompt = payload["messages"][0]["content"]
+        return url, headers, self._build_batch_payload(items, system_prompt, payload["model"])
+
+    def generate_seo_batch(self, items: Sequence[Tuple[str, str]],
+                           batch_size: int = DEFAULT_BATCH_SIZE,
+                           bypass_cache: bool = False) -> List[Dict[str, str]]:
+        """
+        批量生成 SEO 数据：每 batch_size 个关键词合并为一个请求，系统提示词每批只发送一次
+
+        已缓存的条目不再请求；响应中缺失或无法解析的条目单独组成一批重新请求（最多 BATCH_REASK_ROUNDS 次）
+
+        Args:
+            items: (keyword, filename) 序列
+            batch_size: 每个请求包含的关键词数
+            bypass_cache: 忽略缓存的结果重新生成
+
+        Returns:
+            与 items 顺序一致的结果列表，失败的条目为空字符串
+        """
+        keys, cached = self._lookup_cache(items, bypass_cache)
+        missing = [index for index, result in enumerate(cached) if result is None]
+        generated = self._generate_batches([items[index] for index in missing], batch_size)
+
+        # 未命中缓存的条目随后替换为生成结果
+        results = [result or {} for result in cached]
+        for index, result in zip(missing, generated):
+            results[index] = result
+        if keys is not None:
+            self._store_cache([keys[index] for index in missing], generated)
+        return results
+
+    def _generate_batches(self, items: Sequence[Tuple[str, str]], batch_size: int) -> List[Dict[str, str]]:
+        """按 batch_size 分批请求（不使用缓存）"""
+        results: List[Dict[str, str]] = []
+        for start in range(0, len(items), batch_size):
+            chunk = items[start:start + batch_size]
+            remaining = list(range(len(chunk)))
+            chunk_results: Dict[int, Dict[str, str]] = {}
+            for _ in range(1 + BATCH_REASK_ROUNDS):
+                request = self._prepare_batch_request([chunk[index] for index in remaining])
+                if request is None:
+                    break
+                response = self._make_request_with_retry(*request)
+                if response is None:
+                    break
+                remaining = self._merge_batch_results(
+                    self._parse_batch_response(response, len(remaining)), remaining, chunk_results)
+                if not remaining:
+                    break
+            results.extend(chunk_results.get(index, {"title": "", "alt_text": ""})
+                           for index in range(len(chunk)))
+        return results
+
+    @staticmethod
+    def _merge_batch_results(parsed: Dict[int, Dict[str, str]], remaining: List[int],
+                             results: Dict[int, Dict[str, str]]) -> List[int]:
+        """将一轮批量请求的结果按原序号合并，返回仍需重新请求的序号"""
+        for position, result in parsed.items():
+            results[remaining[position]] = result
+        return [index for index in remaining if index not in results]
     
     def test_connection(self) -> Dict[str, Any]:
         """
@@ -250,7 +680,8 @@ class AIService:
                 "temperature": 0.1
             }
             
-            response = requests.post(url, headers=headers, json=test_payload, timeout=10)
+            response = self.session.post(url, headers=headers, json=test_payload,
+                                         timeout=(CONNECT_TIMEOUT, 10))
             
             if response.status_code == 200:
                 result["success"] = True
@@ -261,4 +692,30 @@ class AIService:
         except Exception as e:
             result["message"] = f"Connection failed: {str(e)}"
         
-        return result
\ No newline at end of file
+        return result
+
+
+_shared_service: Optional[AIService] = None
+_shared_lock = threading.Lock()
+
+
+def get_ai_service(config_manager: Optional["ConfigManager"] = None) -> AIService:
+    """
+    获取进程内共享的 AIService（首次调用时创建，之后忽略 config_manager）
+
+    所有工作线程共用同一个连接池和 AI 响应缓存，连续生成时不再重复建立连接
+    """
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            try:
+                cache = AIResponseCache()
+            except (OSError, sqlite3.Error) as e:
+                print(f"[AI_SERVICE] AI cache unavailable: {e}")
+                cache = None
+            _shared_service = AIService(config_manager, cache=cache)
+            _shared_service.rate_limiter.set_limits(
+                _shared_service.config_manager.get_rate_limit_rpm() or None,
+                _shared_service.config_manager.get_rate_limit_tpm() or None
+            )
+        return _shared_service
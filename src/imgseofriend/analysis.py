@@ -0,0 +1,151 @@
+"""
+图片内容分析
+使用 NumPy 向量化计算，在已 resize 的图片上执行，耗时为毫秒级
+包括自动质量使用的复杂度，以及编码前后的 SSIM 对比
+"""
+
+import io
+import math
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+# 自动质量的取值范围：平坦图片（纯色背景的棚拍）取下限，细节丰富的纹理取上限
+AUTO_QUALITY_RANGE = (65, 90)
+
+# 复杂度锚点：低于下限视为平坦，高于上限视为高细节，中间按对数插值
+COMPLEXITY_LOW = 0.002
+COMPLEXITY_HIGH = 0.06
+
+# SSIM 在缩小到长边不超过该值的亮度平面上计算（单张图片耗时为毫秒级）
+SSIM_MAX_SIDE = 256
+
+# SSIM 局部统计窗口边长（均值窗口，积分图计算）
+SSIM_WINDOW = 7
+
+# 批处理摘要中列出 SSIM 低于该值的输出（压缩痕迹通常开始可见）
+DEFAULT_MIN_SSIM = 0.95
+
+# SSIM 稳定常数（像素值范围 0-255）
+_SSIM_C1 = (0.01 * 255) ** 2
+_SSIM_C2 = (0.03 * 255) ** 2
+
+
+def _luma_array(img: Image.Image) -> np.ndarray:
+    """获取亮度通道的 float32 数组"""
+    return np.asarray(img.convert('L'), dtype=np.float32)
+
+
+def is_fully_opaque(img: Image.Image) -> bool:
+    """检查 alpha 通道是否全部不透明（只复制 alpha 通道，不分配完整图片缓冲区）"""
+    alpha = np.asarray(img.getchannel('A'))
+    return bool(alpha.min() == 255)
+
+
+def compute_complexity(img: Image.Image) -> float:
+    """
+    计算图片复杂度：亮度梯度能量（相邻像素差的绝对值均值，归一化到 0-1）
+
+    纯色或平滑渐变接近 0，普通照片约 0.02-0.05，噪点和细密纹理可超过 0.1
+    """
+    luma = _luma_array(img)
+    if luma.shape[0] < 2 or luma.shape[1] < 2:
+        return 0.0
+    dx = np.abs(np.diff(luma, axis=1)).mean()
+    dy = np.abs(np.diff(luma, axis=0)).mean()
+    return float((dx + dy) / 2 / 255)
+
+
+def quality_for_complexity(complexity: float,
+                           quality_range: Tuple[int, int] = AUTO_QUALITY_RANGE) -> int:
+    """按复杂度映射编码质量（对数插值，不做试编码）"""
+    low, high = quality_range
+    if complexity <= COMPLEXITY_LOW:
+        return low
+    if complexity >= COMPLEXITY_HIGH:
+        return high
+    ratio = math.log(complexity / COMPLEXITY_LOW) / math.log(COMPLEXITY_HIGH / COMPLEXITY_LOW)
+    return round(low + ratio * (high - low))
+
+
+def get_auto_quality(img: Image.Image) -> Tuple[int, float]:
+    """
+    根据图片内容选择编码质量
+
+    Returns:
+        (质量, 复杂度)
+    """
+    complexity = compute_complexity(img)
+    return quality_for_complexity(complexity), complexity
+
+
+def _ssim_size(size: Tuple[int, int], max_side: int = SSIM_MAX_SIDE) -> Tuple[int, int]:
+    """计算 SSIM 亮度平面的尺寸（保持宽高比，不放大）"""
+    scale = max(size) / max_side
+    if scale <= 1:
+        return size
+    return max(round(size[0] / scale), 1), max(round(size[1] / scale), 1)
+
+
+def _luma_plane(img: Image.Image, size: Tuple[int, int]) -> np.ndarray:
+    """
+    缩小到指定尺寸并转换为亮度平面（float64）
+
+    带透明通道的图片先合成到白色背景，透明区域中被编码器丢弃的颜色不参与比较
+    """
+    has_alpha = 'A' in img.getbands() or 'transparency' in img.info
+    small = img.convert('RGBA' if has_alpha else 'RGB')
+    if small.size != size:
+        small = small.resize(size, Image.Resampling.BOX)
+    if has_alpha:
+        small = Image.alpha_composite(Image.new('RGBA', size, (255, 255, 255, 255)), small)
+    return np.asarray(small.convert('L'), dtype=np.float64)
+
+
+def _box_mean(plane: np.ndarray, window: int) -> np.ndarray:
+    """窗口均值（积分图，只保留完整窗口）"""
+    integral = np.pad(plane, ((1, 0), (1, 0))).cumsum(axis=0).cumsum(axis=1)
+    total: np.ndarray = (integral[window:, window:] - integral[:-window, window:]
+                         - integral[window:, :-window] + integral[:-window, :-window])
+    return total / (window * window)
+
+
+def structural_similarity(reference: np.ndarray, candidate: np.ndarray,
+                          window: int = SSIM_WINDOW) -> float:
+    """
+    计算两个相同尺寸亮度平面的 SSIM（各窗口结果的均值）
+
+    1.0 表示完全相同；高质量有损压缩通常在 0.97 以上，低于 0.95 时压缩痕迹一般肉眼可见
+    """
+    if reference.shape != candidate.shape:
+        raise ValueError(f"SSIM planes differ in shape: {reference.shape} != {candidate.shape}")
+    window = min(window, *reference.shape)
+
+    mu_x = _box_mean(reference, window)
+    mu_y = _box_mean(candidate, window)
+    var_x = _box_mean(reference * reference, window) - mu_x * mu_x
+    var_y = _box_mean(candidate * candidate, window) - mu_y * mu_y
+    cov = _box_mean(reference * candidate, window) - mu_x * mu_y
+
+    numerator = (2 * mu_x * mu_y + _SSIM_C1) * (2 * cov + _SSIM_C2)
+    denominator = (mu_x * mu_x + mu_y * mu_y + _SSIM_C1) * (var_x + var_y + _SSIM_C2)
+    return float(np.mean(numerator / denominator))
+
+
+def get_ssim_reference(img: Image.Image, max_side: int = SSIM_MAX_SIDE) -> np.ndarray:
+    """获取编码前图片的 SSIM 参考亮度平面（同一图片的多个格式共用）"""
+    return _luma_plane(img, _ssim_size(img.size, max_side))
+
+
+def compute_ssim(reference: np.ndarray, data: bytes) -> float:
+    """
+    解码编码结果，按参考平面的尺寸计算 SSIM
+
+    完整解码后与参考平面同样用 BOX 缩小（JPEG 不使用 draft 的 DCT 缩小解码，
+    否则两边的缩小方式不同，SSIM 明显偏低）
+    """
+    size = (reference.shape[1], reference.shape[0])
+    with Image.open(io.BytesIO(data)) as decoded:
+        candidate = _luma_plane(decoded, size)
+    return structural_similarity(reference, candidate)
@@ -5,12 +5,30 @@ Image SEO Optimizer - Main Application
 """
 
 import sys
-from PySide6.QtWidgets import QApplication
-from .main_window import MainWindow
 
 
 def main():
     """主函数"""
+    # 命令行子命令：无界面运行，不加载 Qt
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from .batch import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        from .cache import main as cache_main
+        sys.exit(cache_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "ai-cache":
+        from .ai_cache import main as ai_cache_main
+        sys.exit(ai_cache_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "watch":
+        from .watch import main as watch_main
+        sys.exit(watch_main(sys.argv[2:]))
+    if len(sys.argv) > 1 and sys.argv[1] == "metrics":
+        from .metrics import main as metrics_main
+        sys.exit(metrics_main(sys.argv[2:]))
+
+    from PySide6.QtWidgets import QApplication
+    from .main_window import MainWindow
+
     app = QApplication(sys.argv)
     
     # 设置应用程序信息
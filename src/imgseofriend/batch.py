@@ -0,0 +1,421 @@
+"""
+Image SEO Optimizer - 批处理命令行
+无界面地对整个目录树执行 resize + 格式转换（默认 WebP），并使用进程池并行处理
+
+用法:
+    imgseofriend batch <src> <dst> [--width 1200] [--quality 80] [--workers N]
+    imgseofriend batch <src> <dst> --profile balanced              # 更快的编码档位
+    imgseofriend batch <src> <dst> --target-kb 150                 # 每张图片不超过 150KB
+    imgseofriend batch <src> <dst> --auto-quality                  # 按图片复杂度自动选择质量
+    imgseofriend batch <src> <dst> --formats webp,avif             # 同时输出多种格式
+    imgseofriend batch <src> <dst> --widths 500,750,900,1200   # 生成 srcset 变体
+
+源文件和处理参数都未变化的图片按输出目录中的处理清单（SQLite）跳过，--no-manifest 关闭
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .analysis import DEFAULT_MIN_SSIM
+from .cache import DEFAULT_CACHE_MAX_SIZE_MB, OutputCache, hash_source
+from .core import (
+    DEFAULT_ENCODE_PROFILE, ENCODE_PROFILES, ImageResult, format_filesize, get_base_name,
+    is_image_file, process_image, process_variants
+)
+from .encoders import DEFAULT_OUTPUT_FORMAT, ENCODERS, get_encoder
+from .manifest import MANIFEST_FILENAME, Manifest, get_job_settings, make_settings_key
+from .metrics import JobMetrics
+from .naming import DirectoryNameIndex
+
+
+class BatchReport:
+    """批处理统计结果"""
+
+    def __init__(self, min_ssim: float = DEFAULT_MIN_SSIM):
+        self.min_ssim = min_ssim  # SSIM 低于该值的输出在摘要中列出
+        self.processed = 0
+        self.skipped = 0  # 按处理清单跳过的未变化图片
+        self.cache_hits = 0
+        self.failures: List[Tuple[str, str]] = []  # (source, error_message)
+        self.original_bytes = 0
+        self.processed_bytes = 0
+        self.encode_passes = 0
+        self.ssim_values: List[float] = []
+        self.low_ssim: List[Tuple[str, float]] = []  # (processed_path, ssim)
+        self.elapsed = 0.0
+
+    def add_results(self, results: List[ImageResult]) -> None:
+        """记录一张成功处理的图片（srcset 模式下包含多个变体）"""
+        self.processed += 1
+        if all(result.from_cache for result in results):
+            self.cache_hits += 1
+        self.original_bytes += results[0].original_filesize
+        self.processed_bytes += sum(result.processed_filesize for result in results)
+        self.encode_passes += sum(result.encode_passes for result in results)
+        for result in results:
+            if result.ssim is None:
+                continue
+            self.ssim_values.append(result.ssim)
+            if result.ssim < self.min_ssim:
+                self.low_ssim.append((result.processed_path, result.ssim))
+
+    def add_failure(self, source: str, error_message: str) -> None:
+        """记录一张处理失败的图片"""
+        self.failures.append((source, error_message))
+
+    def get_images_per_second(self) -> float:
+        """获取处理速度（张/秒）"""
+        if self.elapsed <= 0:
+            return 0.0
+        return self.processed / self.elapsed
+
+    def get_bytes_saved(self) -> int:
+        """获取节省的字节数"""
+        return self.original_bytes - self.processed_bytes
+
+    def format_summary(self) -> str:
+        """生成统计摘要"""
+        lines = [
+            f"Processed: {self.processed} images in {self.elapsed:.1f}s "
+            f"({self.get_images_per_second():.1f} images/sec)",
+            f"Size: {format_filesize(self.original_bytes)} -> "
+            f"{format_filesize(self.processed_bytes)} "
+            f"(saved {format_filesize(max(self.get_bytes_saved(), 0))})",
+            f"Unchanged (skipped): {self.skipped}",
+            f"Cache hits: {self.cache_hits}/{self.processed}",
+            f"Encode passes: {self.encode_passes} "
+            f"({self.encode_passes / self.processed if self.processed else 0:.1f} per image)",
+        ]
+        if self.ssim_values:
+            lines.append(f"SSIM: min {min(self.ssim_values):.3f}, "
+                         f"mean {sum(self.ssim_values) / len(self.ssim_values):.3f}, "
+                         f"{len(self.low_ssim)} below {self.min_ssim}")
+            for path, ssim in sorted(self.low_ssim, key=lambda item: item[1]):
+                lines.append(f"  {path}: {ssim:.3f}")
+        lines.append(f"Failures: {len(self.failures)}")
+        for source, error_message in self.failures:
+            lines.append(f"  {source}: {error_message}")
+        return "\n".join(lines)
+
+
+def collect_images(src: str) -> List[Path]:
+    """递归收集目录下所有支持的图片"""
+    images = []
+    for root, dirs, files in os.walk(src):
+        dirs.sort()
+        for name in sorted(files):
+            if is_image_file(name):
+                images.append(Path(root) / name)
+    return images
+
+
+def plan_outputs(images: List[Path], src: str, dst: str,
+                 extensions: Sequence[str] = (".webp",),
+                 indexes: Optional[Dict[Path, DirectoryNameIndex]] = None) -> List[Tuple[str, str]]:
+    """
+    为每张图片分配输出路径，保持源目录结构
+
+    输出路径在主进程中统一分配，避免多个进程同时写入同名文件
+    （例如 photo.jpg 和 photo.png 都会生成 photo.webp）。
+    输出多种格式时，所有扩展名共享同一个文件主名，返回第一个格式的路径
+
+    indexes 可传入已记录了其他保留文件名的目录索引
+    """
+    if indexes is None:
+        indexes = {}
+    jobs = []
+
+    for image_path in images:
+        output_dir = Path(dst) / image_path.parent.relative_to(src)
+        if output_dir not in indexes:
+            indexes[output_dir] = DirectoryNameIndex(str(output_dir))
+
+        # 只在内存中占用：文件名由主进程统一分配，工作进程直接写入
+        base_name = get_base_name(str(image_path), "")
+        output_path = indexes[output_dir].reserve_group(base_name, extensions, "", claim_on_disk=False)[0]
+
+        jobs.append((str(image_path), output_path))
+
+    return jobs
+
+
+# 工作进程内的输出缓存（由 _init_worker 创建）
+_worker_cache: Optional[OutputCache] = None
+
+
+def _init_worker(cache_dir: Optional[str], cache_max_size_mb: Optional[int]) -> None:
+    """工作进程初始化"""
+    global _worker_cache
+    if cache_max_size_mb is not None:
+        _worker_cache = OutputCache(cache_dir, max_size_mb=cache_max_size_mb)
+
+
+def _process_job(job: Tuple[str, str, int, int, Optional[List[int]], str, Optional[int], bool, bool,
+                            List[str], bool]
+                 ) -> Tuple[str, List[ImageResult], str, str, Dict]:
+    """
+    进程池任务：处理单张图片
+
+    Returns:
+        (source, results, error_message, 源文件内容哈希（不使用清单时为空）, 阶段计时)
+    """
+    (source, output_path, target_width, quality, widths,
+     profile, target_filesize, auto_quality, keep_alpha, output_formats, with_hash) = job
+    metrics = JobMetrics(source, "srcset" if widths else "image_only")
+    try:
+        output_dir = Path(output_path).parent
+        output_dir.mkdir(parents=True, exist_ok=True)
+        if widths:
+            results = []
+            for output_format in output_formats:
+                results.extend(process_variants(source, "", widths, quality,
+                                                output_directory=str(output_dir),
+                                                base_name=Path(output_path).stem, profile=profile,
+                                                keep_alpha=keep_alpha, output_format=output_format,
+                                                metrics=metrics))
+        else:
+            result = process_image(source, "", target_width, quality, output_path=output_path,
+                                   cache=_worker_cache, profile=profile,
+                                   target_filesize=target_filesize, auto_quality=auto_quality,
+                                   keep_alpha=keep_alpha, output_formats=output_formats,
+                                   metrics=metrics)
+            results = [result] + result.alternates
+        # 清单中记录内容哈希，之后只有修改时间变化时可确认内容未变；
+        # 使用输出缓存时复用计算缓存键时得到的哈希，不再重复读取源文件
+        source_hash = ""
+        if with_hash:
+            source_hash = results[0].source_hash or hash_source(source)
+        return source, results, "", source_hash, metrics.to_dict()
+    except Exception as e:
+        metrics.ok = False
+        return source, [], str(e), "", metrics.to_dict()
+
+
+def run_batch(src: str, dst: str, target_width: int, quality: int,
+              workers: Optional[int] = None, verbose: bool = False,
+              widths: Optional[List[int]] = None,
+              use_cache: bool = True, cache_dir: Optional[str] = None,
+              cache_max_size_mb: int = DEFAULT_CACHE_MAX_SIZE_MB,
+              profile: str = DEFAULT_ENCODE_PROFILE,
+              target_filesize: Optional[int] = None,
+              auto_quality: bool = False,
+              keep_alpha: bool = False,
+              output_formats: Sequence[str] = (DEFAULT_OUTPUT_FORMAT,),
+              use_manifest: bool = True,
+              manifest_path: Optional[str] = None,
+              min_ssim: float = DEFAULT_MIN_SSIM) -> BatchReport:
+    """
+    批量处理目录树
+
+    Args:
+        src: 源目录
+        dst: 输出目录
+        target_width: 目标宽度
+        quality: 输出质量
+        workers: 进程数（默认使用全部 CPU 核心）
+        verbose: 是否逐张打印处理结果
+        widths: srcset 宽度列表（可选，指定后每张图片一次解码生成全部宽度）
+        use_cache: 是否使用输出缓存（srcset 模式不使用缓存）
+        cache_dir: 缓存目录（可选）
+        cache_max_size_mb: 缓存容量上限（MB）
+        profile: 编码档位（fast / balanced / max_compression）
+        target_filesize: 目标文件大小（字节，可选，指定后为每张图片搜索不超过该大小的最高质量，srcset 模式不支持）
+        auto_quality: 是否按图片复杂度自动选择质量（srcset 模式不支持）
+        keep_alpha: 是否保留透明度（False 时透明区域合成到白色背景）
+        output_formats: 输出格式列表（webp / avif / jxl / jpeg，多个格式在每个进程内并行编码）
+        use_manifest: 是否使用处理清单跳过源文件和参数都未变化的图片
+        manifest_path: 处理清单路径（默认为输出目录下的 .imgseofriend-manifest.db）
+        min_ssim: SSIM 低于该值的输出在统计结果中列出
+
+    Returns:
+        BatchReport 统计结果
+    """
+    report = BatchReport(min_ssim)
+    start_time = time.perf_counter()
+
+    images = collect_images(src)
+    output_formats = list(dict.fromkeys(output_formats))
+    extensions = [get_encoder(name).extension for name in output_formats]
+
+    settings = get_job_settings(target_width, quality, widths, profile, target_filesize,
+                                auto_quality, keep_alpha, output_formats)
+    manifest = None
+    planned: List[Tuple[str, str]] = []
+    signatures: Dict[str, Tuple[int, int]] = {}
+    indexes: Dict[Path, DirectoryNameIndex] = {}
+    if use_manifest:
+        manifest = Manifest(manifest_path or os.path.join(dst, MANIFEST_FILENAME))
+        images, planned = _filter_unchanged(manifest, images, make_settings_key(settings), widths,
+                                            signatures, indexes, report)
+
+    planned += plan_outputs(images, src, dst, extensions, indexes)
+    output_paths = dict(planned)
+    with_hash = manifest is not None
+    jobs = [(source, output_path, target_width, quality, widths,
+             profile, target_filesize, auto_quality, keep_alpha, output_formats, with_hash)
+            for source, output_path in planned]
+
+    if jobs:
+        workers = workers or os.cpu_count() or 1
+        # 每个进程一次领取多个任务，减少进程间通信开销
+        chunksize = max(1, min(32, len(jobs) // (workers * 4)))
+
+        initargs = (cache_dir, cache_max_size_mb if use_cache else None)
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=initargs) as executor:
+            for source, results, error_message, source_hash, metrics in executor.map(
+                    _process_job, jobs, chunksize=chunksize):
+                if results:
+                    report.add_results(results)
+                    if manifest is not None:
+                        size, mtime_ns = signatures[source]
+                        manifest.record(source, size, mtime_ns, source_hash, settings,
+                                        output_paths[source],
+                                        [result.processed_path for result in results],
+                                        metrics=metrics)
+                    if verbose:
+                        outputs = ", ".join(result.processed_path for result in results)
+                        passes = sum(result.encode_passes for result in results)
+                        scores = ", ".join(f"{result.ssim:.3f}" for result in results if result.ssim is not None)
+                        print(f"[BATCH] {source} -> {outputs} ({passes} encode passes, SSIM {scores or 'n/a'})")
+                else:
+                    report.add_failure(source, error_message)
+                    if verbose:
+                        print(f"[BATCH] {source} failed: {error_message}")
+
+    if manifest is not None:
+        manifest.close()
+
+    report.elapsed = time.perf_counter() - start_time
+    return report
+
+
+def _filter_unchanged(manifest: Manifest, images: List[Path], settings_key: str,
+                      widths: Optional[List[int]], signatures: Dict[str, Tuple[int, int]],
+                      indexes: Dict[Path, DirectoryNameIndex],
+                      report: BatchReport) -> Tuple[List[Path], List[Tuple[str, str]]]:
+    """
+    按处理清单过滤图片（每张图片一次主键查询）
+
+    Returns:
+        (需要分配新输出路径的图片, 沿用上次输出路径重新处理的 (source, output_path) 列表)
+    """
+    new_images = []
+    reprocess = []
+    for image_path in images:
+        stat = image_path.stat()
+        source = str(image_path)
+        signatures[source] = (stat.st_size, stat.st_mtime_ns)
+        entry = manifest.get(source)
+        if manifest.is_current(entry, stat.st_size, stat.st_mtime_ns, settings_key):
+            report.skipped += 1
+            continue
+        if entry is None:
+            new_images.append(image_path)
+            continue
+
+        # 源文件或参数变化：覆盖上次的输出，文件名保持不变
+        output_dir = Path(entry.output_path).parent
+        if output_dir not in indexes:
+            indexes[output_dir] = DirectoryNameIndex(str(output_dir))
+        for path in entry.outputs:
+            indexes[output_dir].add(Path(path).name)
+            if widths:
+                # srcset 变体按文件主名重新占用，先删除旧的变体
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+        indexes[output_dir].add(Path(entry.output_path).name)
+        reprocess.append((source, entry.output_path))
+    return new_images, reprocess
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(
+        prog="imgseofriend batch",
+        description="Resize and convert a whole directory tree to WebP (or AVIF, JPEG XL, JPEG)"
+    )
+    parser.add_argument("src", help="source directory")
+    parser.add_argument("dst", help="output directory")
+    parser.add_argument("--width", type=int, default=1200, help="target width in px (default: 1200)")
+    parser.add_argument("--widths", default=None,
+                        help="comma-separated srcset widths, e.g. 500,750,900,1200 (overrides --width)")
+    parser.add_argument("--quality", type=int, default=80, help="output quality 1-100 (default: 80)")
+    parser.add_argument("--formats", default=DEFAULT_OUTPUT_FORMAT,
+                        help=f"comma-separated output formats from: {', '.join(ENCODERS)} "
+                             f"(default: {DEFAULT_OUTPUT_FORMAT})")
+    parser.add_argument("--keep-alpha", action="store_true",
+                        help="keep transparency instead of flattening onto white")
+    parser.add_argument("--auto-quality", action="store_true",
+                        help="pick the quality per image from its detail level instead of --quality")
+    parser.add_argument("--target-kb", type=int, default=None,
+                        help="search the highest quality that keeps each image under this size in KB")
+    parser.add_argument("--profile", choices=list(ENCODE_PROFILES), default=DEFAULT_ENCODE_PROFILE,
+                        help=f"encoder speed/size trade-off (default: {DEFAULT_ENCODE_PROFILE})")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes (default: all cores)")
+    parser.add_argument("--no-cache", action="store_true", help="always re-encode, ignoring the output cache")
+    parser.add_argument("--cache-dir", default=None, help="output cache directory")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_SIZE_MB,
+                        help=f"output cache size limit in MB (default: {DEFAULT_CACHE_MAX_SIZE_MB})")
+    parser.add_argument("--no-manifest", action="store_true",
+                        help="reprocess every image instead of skipping unchanged ones")
+    parser.add_argument("--manifest", default=None,
+                        help=f"manifest database (default: <dst>/{MANIFEST_FILENAME})")
+    parser.add_argument("--min-ssim", type=float, default=DEFAULT_MIN_SSIM,
+                        help=f"list outputs with SSIM below this value (default: {DEFAULT_MIN_SSIM})")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every processed file")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src):
+        parser.error(f"source directory not found: {args.src}")
+    if args.width <= 0:
+        parser.error("width must be greater than 0")
+    if not 1 <= args.quality <= 100:
+        parser.error("quality must be between 1 and 100")
+    if args.target_kb is not None and args.target_kb <= 0:
+        parser.error("target size must be greater than 0")
+
+    output_formats = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+    if not output_formats:
+        parser.error("at least one output format is required")
+    for name in output_formats:
+        try:
+            get_encoder(name)
+        except ValueError as e:
+            parser.error(str(e))
+
+    widths = None
+    if args.widths:
+        try:
+            widths = [int(width) for width in args.widths.split(",") if width.strip()]
+        except ValueError:
+            parser.error(f"invalid widths: {args.widths}")
+        if not widths or any(width <= 0 for width in widths):
+            parser.error("widths must be positive integers")
+        if args.target_kb:
+            parser.error("--target-kb cannot be combined with --widths")
+        if args.auto_quality:
+            parser.error("--auto-quality cannot be combined with --widths")
+
+    report = run_batch(args.src, args.dst, args.width, args.quality,
+                       workers=args.workers, verbose=args.verbose, widths=widths,
+                       use_cache=not args.no_cache, cache_dir=args.cache_dir,
+                       cache_max_size_mb=args.cache_max_mb, profile=args.profile,
+                       target_filesize=args.target_kb * 1024 if args.target_kb else None,
+                       auto_quality=args.auto_quality, keep_alpha=args.keep_alpha,
+                       output_formats=output_formats, use_manifest=not args.no_manifest,
+                       manifest_path=args.manifest, min_ssim=args.min_ssim)
+    print(report.format_summary())
+
+    return 1 if report.failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ Before/After 图片对比组件
 
 import os
 from pathlib import Path
+from typing import Optional
 
 from PySide6.QtWidgets import QWidget, QLabel, QVBoxLayout, QHBoxLayout
 from PySide6.QtCore import Qt, QRect, QSize, Signal
@@ -36,6 +37,7 @@ class BeforeAfterWidget(QWidget):
         self.after_size = None     # After 图片文件大小
         self.before_dimensions = None   # Before 图片尺寸 (width, height)
         self.after_dimensions = None     # After 图片尺寸 (width, height)
+        self.after_ssim = None  # After 图片与 resize 后原图的 SSIM（由处理结果提供）
         self.divider_position = 0.5  # 分割线位置 (0.0 - 1.0)
         self.dragging = False
         self.show_before = True  # 控制显示哪张图片
@@ -197,6 +199,7 @@ class BeforeAfterWidget(QWidget):
                 self.after_size = None
                 self.before_dimensions = None
                 self.after_dimensions = None
+                self.after_ssim = None
                 self.current_image_path = before_path
                 self.update()
                 
@@ -232,12 +235,13 @@ class BeforeAfterWidget(QWidget):
             pass
         return False
     
-    def set_after_image(self, path: str):
-        """设置 After 图片"""
+    def set_after_image(self, path: str, ssim: Optional[float] = None) -> bool:
+        """设置 After 图片（ssim 为处理结果中的 SSIM，显示在压缩比例旁）"""
         try:
             self.after_pixmap = self.load_image_with_orientation(path)
             if not self.after_pixmap.isNull():
                 self.after_path = path
+                self.after_ssim = ssim
                 # 异步获取文件大小和尺寸信息，避免阻塞主线程
                 self.after_size = None  # 先设为 None
                 self.after_dimensions = None  # 先设为 None
@@ -409,6 +413,8 @@ class BeforeAfterWidget(QWidget):
                         compression_ratio = ((self.before_size - self.after_size) / self.before_size) * 100
                         if compression_ratio > 0:
                             compression_text = f"📉 {compression_ratio:.1f}% smaller"
+                            if self.after_ssim is not None:
+                                compression_text += f" · SSIM {self.after_ssim:.3f}"
                             compression_width = painter.fontMetrics().horizontalAdvance(compression_text)
                             painter.setPen(QPen(QColor(76, 175, 80, 200), 1))  # 绿色
                             painter.drawText((rect.width() - compression_width) // 2, bottom_y, compression_text)
@@ -0,0 +1,217 @@
+"""
+输出缓存
+按 源文件内容哈希 + 目标宽度 + 质量 + 编码参数 缓存生成的 WebP，
+相同任务直接读取缓存数据，跳过解码和编码
+
+用法:
+    imgseofriend cache stats
+    imgseofriend cache clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# 默认缓存目录（与配置目录 ~/.imgfriend 相同）
+DEFAULT_CACHE_DIR = Path.home() / ".imgfriend" / "cache" / "output"
+
+# 默认缓存上限（MB）
+DEFAULT_CACHE_MAX_SIZE_MB = 512
+
+# 读取源文件时的块大小
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_source(source: Union[str, os.PathLike, bytes]) -> str:
+    """计算源图片内容哈希"""
+    digest = hashlib.blake2b(digest_size=20)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    else:
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_cache_key(source_hash: str, target_width: int, quality: int,
+                   encoder_settings: Dict[str, Any]) -> str:
+    """根据源内容和处理参数生成缓存键"""
+    payload = json.dumps({
+        "source": source_hash,
+        "width": target_width,
+        "quality": quality,
+        "encoder": encoder_settings,
+    }, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=20).hexdigest()
+
+
+class OutputCache:
+    """
+    基于内容寻址的输出缓存
+
+    文件按键的前两位分目录存放，最近使用时间记录在文件 mtime 上，
+    超出容量上限时按 LRU 淘汰最久未使用的条目。
+    """
+
+    def __init__(self, cache_dir: Optional[Union[str, os.PathLike]] = None,
+                 max_size_mb: int = DEFAULT_CACHE_MAX_SIZE_MB):
+        self.cache_dir = Path(cache_dir) if cache_dir else DEFAULT_CACHE_DIR
+        self.max_bytes = max_size_mb * 1024 * 1024
+
+        # 本次运行的命中统计
+        self.hits = 0
+        self.misses = 0
+
+        # 缓存条目大小（首次写入时扫描）
+        self._sizes: Optional[Dict[Path, int]] = None
+        self._lock = threading.Lock()
+
+    def _entry_path(self, key: str, extension: str = ".webp") -> Path:
+        """获取缓存条目路径"""
+        return self.cache_dir / key[:2] / f"{key}{extension}"
+
+    def get(self, key: str, extension: str = ".webp") -> Optional[bytes]:
+        """
+        查找缓存
+
+        Returns:
+            命中时返回缓存的文件数据，未命中返回 None
+        """
+        entry = self._entry_path(key, extension)
+        try:
+            data = entry.read_bytes()
+            # 更新 mtime 作为最近使用时间
+            os.utime(entry)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return data
+
+    def put(self, key: str, data: bytes, extension: str = ".webp") -> None:
+        """将生成的数据写入缓存（失败时只打印日志）"""
+        entry = self._entry_path(key, extension)
+        try:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再替换，避免并发进程读到写了一半的条目
+            fd, tmp_path = tempfile.mkstemp(dir=entry.parent, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, entry)
+            except BaseException:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+                raise
+        except OSError as e:
+            print(f"[CACHE] Failed to store {key}: {e}")
+            return
+
+        with self._lock:
+            sizes = self._scan()
+            sizes[entry] = len(data)
+            self._evict(sizes)
+
+    def _scan(self) -> Dict[Path, int]:
+        """扫描缓存目录，获取全部条目大小"""
+        if self._sizes is None:
+            self._sizes = {path: size for path, size, _ in self._list_entries()}
+        return self._sizes
+
+    def _list_entries(self) -> List[Tuple[Path, int, float]]:
+        """列出缓存条目 (path, size, mtime)"""
+        entries: List[Tuple[Path, int, float]] = []
+        if not self.cache_dir.exists():
+            return entries
+        for shard in os.scandir(self.cache_dir):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                entries.append((Path(entry.path), stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self, sizes: Dict[Path, int]) -> None:
+        """超出容量时按最近使用时间淘汰，一次淘汰到上限的 90%，避免频繁扫描"""
+        total = sum(sizes.values())
+        if total <= self.max_bytes:
+            return
+
+        target = self.max_bytes * 0.9
+        entries = sorted(self._list_entries(), key=lambda item: item[2])
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                pass
+            total -= size
+            sizes.pop(path, None)
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            for path, _, _ in self._list_entries():
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._sizes = {}
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        entries = self._list_entries()
+        lookups = self.hits + self.misses
+        return {
+            "cache_dir": str(self.cache_dir),
+            "entries": len(entries),
+            "total_bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    from .core import format_filesize
+
+    parser = argparse.ArgumentParser(prog="imgseofriend cache", description="Inspect or clear the output cache")
+    parser.add_argument("action", choices=["stats", "clear"])
+    parser.add_argument("--cache-dir", default=None, help=f"cache directory (default: {DEFAULT_CACHE_DIR})")
+    args = parser.parse_args(argv)
+
+    cache = OutputCache(args.cache_dir)
+    if args.action == "clear":
+        cache.clear()
+        print(f"Cleared {cache.cache_dir}")
+        return 0
+
+    stats = cache.get_stats()
+    print(f"Cache directory: {stats['cache_dir']}")
+    print(f"Entries: {stats['entries']}")
+    print(f"Size: {format_filesize(stats['total_bytes'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
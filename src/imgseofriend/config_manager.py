@@ -1,5 +1,5 @@
 from PySide6.QtCore import QSettings
-from typing import Optional
+from typing import List, Optional
 import os
 from pathlib import Path
 import json
@@ -118,6 +118,22 @@ class ConfigManager:
         """获取模型名称"""
         return self.settings.value("api/model_name", "deepseek-chat")
     
+    def save_rate_limit_rpm(self, requests_per_minute: int) -> None:
+        """保存每分钟请求数上限（0 表示按服务端限流响应头自动调整）"""
+        self.settings.setValue("api/rate_limit_rpm", requests_per_minute)
+
+    def get_rate_limit_rpm(self) -> int:
+        """获取每分钟请求数上限（0 表示按服务端限流响应头自动调整）"""
+        return int(self.settings.value("api/rate_limit_rpm", 0))
+
+    def save_rate_limit_tpm(self, tokens_per_minute: int) -> None:
+        """保存每分钟 token 数上限（0 表示按服务端限流响应头自动调整）"""
+        self.settings.setValue("api/rate_limit_tpm", tokens_per_minute)
+
+    def get_rate_limit_tpm(self) -> int:
+        """获取每分钟 token 数上限（0 表示按服务端限流响应头自动调整）"""
+        return int(self.settings.value("api/rate_limit_tpm", 0))
+
     def save_system_prompt(self, prompt: str):
         """保存系统提示词"""
         self.settings.setValue("api/system_prompt", prompt)
@@ -164,6 +180,16 @@ Output Format:
 }"""
         return self.settings.value("api/system_prompt", default_prompt)
     
+    def save_ai_cache_enabled(self, enabled: bool) -> None:
+        """保存是否启用 AI 响应缓存"""
+        self.settings.setValue("api/cache_enabled", enabled)
+
+    def get_ai_cache_enabled(self) -> bool:
+        """获取是否启用 AI 响应缓存"""
+        value = self.settings.value("api/cache_enabled", True)
+        # QSettings 在部分平台上会把布尔值存成字符串
+        return str(value).lower() in ("true", "1")
+
     def save_output_width(self, width: int):
         """保存输出宽度"""
         self.settings.setValue("output/width", width)
@@ -180,6 +206,55 @@ Output Format:
         """获取输出质量"""
         return int(self.settings.value("output/quality", 80))
     
+    def save_auto_quality(self, enabled: bool) -> None:
+        """保存是否按图片复杂度自动选择质量"""
+        self.settings.setValue("output/auto_quality", enabled)
+
+    def get_auto_quality(self) -> bool:
+        """获取是否按图片复杂度自动选择质量"""
+        value = self.settings.value("output/auto_quality", False)
+        # QSettings 在部分平台上会把布尔值存成字符串
+        return str(value).lower() in ("true", "1")
+
+    def save_keep_alpha(self, enabled: bool) -> None:
+        """保存是否保留透明度（否则合成到白色背景）"""
+        self.settings.setValue("output/keep_alpha", enabled)
+
+    def get_keep_alpha(self) -> bool:
+        """获取是否保留透明度"""
+        value = self.settings.value("output/keep_alpha", False)
+        # QSettings 在部分平台上会把布尔值存成字符串
+        return str(value).lower() in ("true", "1")
+
+    def save_output_formats(self, formats: List[str]) -> None:
+        """保存输出格式列表（webp / avif / jxl / jpeg）"""
+        self.settings.setValue("output/formats", ",".join(formats))
+
+    def get_output_formats(self) -> List[str]:
+        """获取输出格式列表（默认只输出 WebP）"""
+        value = self.settings.value("output/formats", "webp")
+        # QSettings 可能把单个值或列表原样返回
+        if isinstance(value, (list, tuple)):
+            value = ",".join(value)
+        formats = [name.strip() for name in str(value).split(",") if name.strip()]
+        return formats or ["webp"]
+
+    def save_encode_profile(self, profile: str) -> None:
+        """保存编码档位（fast / balanced / max_compression）"""
+        self.settings.setValue("output/encode_profile", profile)
+
+    def get_encode_profile(self) -> str:
+        """获取编码档位"""
+        return str(self.settings.value("output/encode_profile", "max_compression"))
+
+    def save_target_filesize(self, size_kb: int) -> None:
+        """保存目标文件大小（KB，0 表示使用固定质量）"""
+        self.settings.setValue("output/target_filesize_kb", size_kb)
+
+    def get_target_filesize(self) -> int:
+        """获取目标文件大小（KB，0 表示使用固定质量）"""
+        return int(self.settings.value("output/target_filesize_kb", 0))
+
     def save_output_directory(self, path: str):
         """保存输出目录"""
         self.settings.setValue("output/directory", path)
@@ -188,16 +263,53 @@ Output Format:
         """获取输出目录"""
         return self.settings.value("output/directory", "")
     
+    def save_cache_enabled(self, enabled: bool) -> None:
+        """保存是否启用输出缓存"""
+        self.settings.setValue("output/cache_enabled", enabled)
+
+    def get_cache_enabled(self) -> bool:
+        """获取是否启用输出缓存"""
+        value = self.settings.value("output/cache_enabled", True)
+        # QSettings 在部分平台上会把布尔值存成字符串
+        return str(value).lower() in ("true", "1")
+
+    def save_cache_max_size(self, size_mb: int) -> None:
+        """保存输出缓存容量上限（MB）"""
+        self.settings.setValue("output/cache_max_size_mb", size_mb)
+
+    def get_cache_max_size(self) -> int:
+        """获取输出缓存容量上限（MB）"""
+        return int(self.settings.value("output/cache_max_size_mb", 512))
+
+    def save_metrics_log(self, path: str) -> None:
+        """保存阶段计时日志路径（空字符串表示不记录）"""
+        self.settings.setValue("output/metrics_log", path)
+
+    def get_metrics_log(self) -> str:
+        """获取阶段计时日志路径（JSON Lines，支持 ~，空字符串表示不记录）"""
+        return os.path.expanduser(str(self.settings.value("output/metrics_log", "")))
+
     def get_all_config(self) -> dict:
         """获取所有配置"""
         return {
             "api_base_url": self.get_api_base_url(),
             "api_key": self.get_api_key(),
             "model_name": self.get_model_name(),
+            "rate_limit_rpm": self.get_rate_limit_rpm(),
+            "rate_limit_tpm": self.get_rate_limit_tpm(),
             "system_prompt": self.get_system_prompt(),
+            "ai_cache_enabled": self.get_ai_cache_enabled(),
             "output_width": self.get_output_width(),
             "output_quality": self.get_output_quality(),
-            "output_directory": self.get_output_directory()
+            "auto_quality": self.get_auto_quality(),
+            "keep_alpha": self.get_keep_alpha(),
+            "encode_profile": self.get_encode_profile(),
+            "output_formats": self.get_output_formats(),
+            "target_filesize_kb": self.get_target_filesize(),
+            "output_directory": self.get_output_directory(),
+            "cache_enabled": self.get_cache_enabled(),
+            "cache_max_size_mb": self.get_cache_max_size(),
+            "metrics_log": self.get_metrics_log()
         }
     
     def save_all_config(self, config: dict):
@@ -208,11 +320,33 @@ Output Format:
             self.save_api_key(config["api_key"])
         if "model_name" in config:
             self.save_model_name(config["model_name"])
+        if "rate_limit_rpm" in config:
+            self.save_rate_limit_rpm(config["rate_limit_rpm"])
+        if "rate_limit_tpm" in config:
+            self.save_rate_limit_tpm(config["rate_limit_tpm"])
         if "system_prompt" in config:
             self.save_system_prompt(config["system_prompt"])
+        if "ai_cache_enabled" in config:
+            self.save_ai_cache_enabled(config["ai_cache_enabled"])
         if "output_width" in config:
             self.save_output_width(config["output_width"])
         if "output_quality" in config:
             self.save_output_quality(config["output_quality"])
+        if "auto_quality" in config:
+            self.save_auto_quality(config["auto_quality"])
+        if "keep_alpha" in config:
+            self.save_keep_alpha(config["keep_alpha"])
+        if "encode_profile" in config:
+            self.save_encode_profile(config["encode_profile"])
+        if "output_formats" in config:
+            self.save_output_formats(config["output_formats"])
+        if "target_filesize_kb" in config:
+            self.save_target_filesize(config["target_filesize_kb"])
         if "output_directory" in config:
-            self.save_output_directory(config["output_directory"])
\ No newline at end of file
+            self.save_output_directory(config["output_directory"])
+        if "cache_enabled" in config:
+            self.save_cache_enabled(config["cache_enabled"])
+        if "cache_max_size_mb" in config:
+            self.save_cache_max_size(config["cache_max_size_mb"])
+        if "metrics_log" in config:
+            self.save_metrics_log(config["metrics_log"])
\ No newline at end of file
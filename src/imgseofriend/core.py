@@ -0,0 +1,1020 @@
+"""
+图片处理核心流水线
+不依赖 Qt 和 ConfigManager，可在批处理进程或服务中直接调用
+
+输入可以是文件路径、bytes 或文件对象；结果为普通对象，可在进程间传递
+"""
+
+import io
+import math
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import numpy as np
+from PIL import Image
+from .analysis import compute_ssim, get_auto_quality, get_ssim_reference, is_fully_opaque
+from .cache import OutputCache, hash_source, make_cache_key
+from .encoders import ENCODE_PROFILES  # noqa: F401  批处理、监视和设置对话框从 core 导入
+from .encoders import DEFAULT_OUTPUT_FORMAT, get_encode_profile, get_encoder
+from .metrics import JobMetrics, measure
+from .naming import get_name_index
+
+# 默认输出文件夹名称
+OUTPUT_FOLDER_NAME = "image-optimized"
+
+# 支持的输入图片格式
+SUPPORTED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.webp', '.heif', '.heic'}
+
+# 进度回调：接收一条进度消息
+ProgressCallback = Callable[[str], None]
+
+# 图片来源：文件路径、原始字节或二进制文件对象
+ImageSource = Union[str, os.PathLike, bytes, BinaryIO]
+
+# 默认编码档位（与旧版本固定使用 method=6 的输出一致）
+DEFAULT_ENCODE_PROFILE = "max_compression"
+
+# 目标文件大小模式：允许结果比目标小多少（比例），落在区间内即停止搜索
+DEFAULT_SIZE_TOLERANCE = 0.1
+
+# 目标文件大小模式的质量搜索范围
+MIN_SEARCH_QUALITY = 10
+MAX_SEARCH_QUALITY = 100
+
+# 大小-质量模型：输出文件大小的对数与质量近似线性，斜率约为每个质量点 0.03
+SIZE_MODEL_LOG_SLOPE = 0.03
+
+# 响应式图片（srcset）默认宽度阶梯，与界面预设宽度一致
+DEFAULT_VARIANT_WIDTHS = (500, 750, 900, 1200)
+
+# 降低解码分辨率时允许的最大缩小倍数（JPEG DCT 域缩放支持 1/2、1/4、1/8）
+MAX_REDUCTION_FACTOR = 8
+
+# 支持 Image.reduce 的颜色模式
+REDUCIBLE_MODES = ('RGB', 'RGBA', 'L', 'LA')
+
+_heif_registered = False
+
+
+class ImageResult:
+    """图片处理结果类"""
+
+    def __init__(self, original_path: str, processed_path: str,
+                 original_size: Tuple[int, int], processed_size: Tuple[int, int],
+                 original_filesize: int, processed_filesize: int,
+                 from_cache: bool = False, quality: Optional[int] = None,
+                 encode_passes: int = 1, ssim: Optional[float] = None,
+                 source_hash: Optional[str] = None):
+        self.original_path = original_path
+        self.processed_path = processed_path
+        self.original_size = original_size  # (width, height)
+        self.processed_size = processed_size  # (width, height)
+        self.original_filesize = original_filesize  # bytes
+        self.processed_filesize = processed_filesize  # bytes
+        self.from_cache = from_cache  # 是否直接使用了输出缓存
+        self.quality = quality  # 实际使用的编码质量（缓存命中时可能未知）
+        self.encode_passes = encode_passes  # 编码次数（目标文件大小模式下为搜索次数，缓存命中为 0）
+        self.ssim = ssim  # 与编码前（已 resize）图片的 SSIM（缓存命中或无法解码输出时为 None）
+        self.source_hash = source_hash  # 源文件内容哈希（使用输出缓存时顺带计算，否则为 None）
+        self.alternates: List["ImageResult"] = []  # 同一次处理生成的其他格式（文件主名相同）
+
+    def get_compression_ratio(self) -> float:
+        """获取压缩比例"""
+        if self.original_filesize == 0:
+            return 0
+        return (1 - self.processed_filesize / self.original_filesize) * 100
+
+    def get_size_info(self) -> str:
+        """获取尺寸信息字符串"""
+        return (f"Original: {self.original_size[0]}x{self.original_size[1]}, "
+                f"{format_filesize(self.original_filesize)}")
+
+    def get_quality_info(self) -> str:
+        """获取压缩比例和 SSIM 信息字符串"""
+        info = f"{self.get_compression_ratio():.1f}% smaller"
+        if self.ssim is not None:
+            info += f", SSIM {self.ssim:.3f}"
+        return info
+
+
+class EncodedImage:
+    """内存中的转换结果（不写入磁盘）"""
+
+    def __init__(self, data: bytes, original_size: Tuple[int, int],
+                 processed_size: Tuple[int, int], original_filesize: int,
+                 from_cache: bool = False, quality: Optional[int] = None,
+                 encode_passes: int = 1, output_format: str = DEFAULT_OUTPUT_FORMAT,
+                 ssim: Optional[float] = None, source_hash: Optional[str] = None):
+        self.data = data
+        self.original_size = original_size  # (width, height)
+        self.processed_size = processed_size  # (width, height)
+        self.original_filesize = original_filesize  # bytes
+        self.from_cache = from_cache  # 是否直接使用了输出缓存
+        self.quality = quality  # 实际使用的编码质量（缓存命中时可能未知）
+        self.encode_passes = encode_passes  # 编码次数（目标文件大小模式下为搜索次数，缓存命中为 0）
+        self.output_format = output_format  # 输出格式名称（见 encoders.ENCODERS）
+        self.ssim = ssim  # 与编码前图片的 SSIM（缓存命中时为 None）
+        self.source_hash = source_hash  # 源文件内容哈希（使用输出缓存时顺带计算，否则为 None）
+
+    @property
+    def processed_filesize(self) -> int:
+        """处理后大小（字节）"""
+        return len(self.data)
+
+    @property
+    def extension(self) -> str:
+        """输出文件扩展名"""
+        return get_encoder(self.output_format).extension
+
+
+def _emit(progress: Optional[ProgressCallback], message: str) -> None:
+    """发送进度消息（未设置回调时忽略）"""
+    if progress:
+        progress(message)
+
+
+def is_image_file(file_path: str) -> bool:
+    """检查是否为支持的图片格式"""
+    if not file_path:
+        return False
+    return Path(file_path).suffix.lower() in SUPPORTED_EXTENSIONS
+
+
+def ensure_output_directory(image_path: str, output_directory: Optional[str] = None) -> str:
+    """确保输出目录存在"""
+    if output_directory:
+        output_dir = Path(output_directory)
+    else:
+        # 在原图片路径下创建 image-optimized 文件夹
+        output_dir = Path(image_path).parent / OUTPUT_FOLDER_NAME
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    return str(output_dir)
+
+
+def get_base_name(image_path: str, keyword: str) -> str:
+    """根据关键词生成输出文件主名（无扩展名），无关键词时使用原文件名"""
+    if not keyword or keyword.strip() == "":
+        return Path(image_path).stem or "optimized"
+
+    # 清理关键词作为文件名
+    clean_keyword = "".join(c for c in keyword if c.isalnum() or c in (' ', '-', '_')).strip()
+    clean_keyword = clean_keyword.replace(' ', '-').lower()
+
+    if not clean_keyword:
+        clean_keyword = "optimized"
+    return clean_keyword
+
+
+def get_output_filename(image_path: str, keyword: str,
+                        output_directory: Optional[str] = None) -> str:
+    """生成输出文件名，处理重名冲突（只查询，不占用文件名）"""
+    output_dir = ensure_output_directory(image_path, output_directory)
+    base_name = get_base_name(image_path, keyword)
+    return get_name_index(output_dir).next_free(base_name)
+
+
+def reserve_output_path(output_dir: str, base_name: str, extension: str = ".webp") -> str:
+    """
+    占用一个不冲突的输出文件名（base.webp、base-1.webp ...）
+
+    文件名由目录索引分配（见 naming 模块），并通过 O_EXCL 创建空文件占位，
+    多个线程或进程同时写入同一目录时也不会互相覆盖；
+    之后由 write_atomic 用 os.replace 替换为最终内容。
+    """
+    return get_name_index(output_dir).reserve(base_name, extension)
+
+
+def _create_temp_file(directory: str) -> Tuple[int, str]:
+    """
+    在 directory 中创建临时文件，返回 (fd, 路径)
+
+    不使用 mkstemp（固定 0600 权限）：以 0o666 创建，由系统按当前 umask 设置正常权限，
+    不需要读取 umask（os.umask 会临时修改整个进程的 umask）
+    """
+    while True:
+        path = os.path.join(directory, f".{uuid.uuid4().hex}.tmp")
+        try:
+            return os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY | getattr(os, "O_BINARY", 0), 0o666), path
+        except FileExistsError:
+            continue
+
+
+def write_atomic(data: bytes, output_path: str) -> None:
+    """先写入同目录下的临时文件，再用 os.replace 原子替换，读者不会看到写了一半的文件"""
+    output_dir = os.path.dirname(output_path) or "."
+    fd, tmp_path = _create_temp_file(output_dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def get_variant_filenames(output_dir: str, base_name: str, widths: Iterable[int],
+                          extension: str = ".webp") -> List[str]:
+    """
+    占用一组响应式图片文件名（name-500w.webp ...），处理重名冲突
+
+    同一组变体使用相同的序号，保证 srcset 中的文件名一致
+    """
+    suffixes = [f"-{width}w" for width in widths]
+    return get_name_index(output_dir).reserve_group(base_name, suffixes, extension)
+
+
+def get_srcset(results: List[ImageResult], url_prefix: str = "") -> str:
+    """根据变体结果生成 srcset 属性值"""
+    return ", ".join(f"{url_prefix}{Path(result.processed_path).name} {result.processed_size[0]}w"
+                     for result in results)
+
+
+def calculate_target_size(size: Tuple[int, int], target_width: int) -> Tuple[int, int]:
+    """计算新尺寸（保持宽高比，不放大）"""
+    width, height = size
+    if width > target_width:
+        ratio = target_width / width
+        return (target_width, int(height * ratio))
+    return size
+
+
+def register_heif() -> None:
+    """按需注册 HEIF 图片格式支持（导入 pillow_heif 较慢，首次打开图片时才加载）"""
+    global _heif_registered
+    if _heif_registered:
+        return
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+    _heif_registered = True
+
+
+def _source_name(source: ImageSource) -> str:
+    """获取图片来源的文件路径（bytes 来源返回空字符串）"""
+    if isinstance(source, (str, os.PathLike)):
+        return os.fspath(source)
+    return str(getattr(source, "name", "") or "")
+
+
+def open_image(source: ImageSource) -> Tuple[Image.Image, int]:
+    """打开图片，返回 (image, 原始文件大小)"""
+    register_heif()
+
+    if isinstance(source, (str, os.PathLike)):
+        return Image.open(source), os.path.getsize(source)
+
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        data = bytes(source)
+        return Image.open(io.BytesIO(data)), len(data)
+
+    # 文件对象：通过 seek 获取大小
+    position = source.tell()
+    source.seek(0, os.SEEK_END)
+    filesize = source.tell() - position
+    source.seek(position)
+    return Image.open(source), filesize
+
+
+def get_reduction_factor(size: Tuple[int, int], target_size: Tuple[int, int],
+                         max_factor: int = MAX_REDUCTION_FACTOR) -> int:
+    """选择最大的 2 的幂次缩小倍数，且缩小后宽高仍不小于目标尺寸"""
+    factor = 1
+    while (factor * 2 <= max_factor
+           and size[0] // (factor * 2) >= target_size[0]
+           and size[1] // (factor * 2) >= target_size[1]):
+        factor *= 2
+    return factor
+
+
+def reduce_for_target(img: Image.Image, target_size: Tuple[int, int]) -> Image.Image:
+    """
+    降低解码分辨率，减少大图缩小时的解码时间和内存
+
+    JPEG 在解码前使用 draft 模式直接解码出 1/2、1/4 或 1/8 尺寸；
+    其他格式使用 Image.reduce 做整数倍缩小。缩小后仍不小于目标尺寸，
+    最终尺寸由之后的 LANCZOS resize 决定。
+    """
+    factor = get_reduction_factor(img.size, target_size)
+    if factor == 1:
+        return img
+
+    if img.format == 'JPEG':
+        # draft 只能在 load() 之前调用，会原地修改解码参数
+        img.draft(None, target_size)
+        return img
+
+    if img.mode in REDUCIBLE_MODES:
+        return img.reduce(factor)
+
+    return img
+
+
+def _to_resizable_mode(img: Image.Image) -> Image.Image:
+    """
+    转换为可插值缩放的模式
+
+    调色板图片按是否有透明色转为 RGBA 或 RGB；alpha 全部不透明时直接丢弃 alpha，
+    缩放时少处理一个通道，也省去 RGBA 缩放时的预乘转换
+    """
+    if img.mode == 'P':
+        img = img.convert('RGBA' if 'transparency' in img.info else 'RGB')
+    elif img.mode == 'PA':
+        img = img.convert('RGBA')
+
+    if img.mode in ('RGBA', 'LA') and is_fully_opaque(img):
+        img = img.convert('RGB' if img.mode == 'RGBA' else 'L')
+    return img
+
+
+def flatten_alpha(img: Image.Image, keep_alpha: bool = False) -> Image.Image:
+    """处理 alpha 通道：keep_alpha 为 True 时保留透明度（WebP 原生支持），否则合成到白色背景"""
+    if img.mode not in ('RGBA', 'LA') or keep_alpha:
+        return img
+
+    background = Image.new('RGB', img.size, (255, 255, 255))
+    background.paste(img.convert('RGBA') if img.mode == 'LA' else img, mask=img.getchannel('A'))
+    return background
+
+
+def _pixel_bytes(img: Image.Image) -> int:
+    """图片像素缓冲区大小（字节，按每通道 8 位估算）"""
+    return img.width * img.height * len(img.getbands())
+
+
+def prepare_image(img: Image.Image, target_width: int,
+                  reduced_decode: bool = True, keep_alpha: bool = False,
+                  metrics: Optional[JobMetrics] = None) -> Image.Image:
+    """
+    缩放到目标宽度并处理 alpha 通道，返回新图片（不修改原图）
+
+    白色背景合成在缩小之后进行，只在目标尺寸上分配背景缓冲区
+
+    Args:
+        img: 已打开的图片
+        target_width: 目标宽度
+        reduced_decode: 是否先降低解码分辨率再做 LANCZOS resize
+        keep_alpha: 是否保留透明度（False 时透明区域合成到白色背景）
+        metrics: 阶段计时（可选，记录 decode / convert / resize）
+    """
+    new_size = calculate_target_size(img.size, target_width)
+
+    with measure(metrics, "decode") as record:
+        if reduced_decode and new_size != img.size:
+            img = reduce_for_target(img, new_size)
+        img.load()
+        record["bytes"] = _pixel_bytes(img)
+
+    with measure(metrics, "convert") as record:
+        img = _to_resizable_mode(img)
+        record["bytes"] = _pixel_bytes(img)
+
+    # Resize 图片（RGBA 按预乘 alpha 插值，透明边缘不会发黑）
+    with measure(metrics, "resize") as record:
+        if new_size != img.size:
+            img = img.resize(new_size, Image.Resampling.LANCZOS)
+        record["bytes"] = _pixel_bytes(img)
+
+    with measure(metrics, "convert") as record:
+        img = flatten_alpha(img, keep_alpha)
+        record["bytes"] = _pixel_bytes(img)
+    return img
+
+
+def get_encoder_settings(profile: str = DEFAULT_ENCODE_PROFILE,
+                         reduced_decode: bool = True, keep_alpha: bool = False,
+                         output_format: str = DEFAULT_OUTPUT_FORMAT) -> Dict[str, Any]:
+    """获取影响输出结果的编码参数（用于缓存键）"""
+    settings = {"reduced_decode": reduced_decode, "keep_alpha": keep_alpha}
+    settings.update(get_encoder(output_format).get_settings(profile))
+    return settings
+
+
+def encode_image(img: Image.Image, quality: int, profile: str = DEFAULT_ENCODE_PROFILE,
+                 output_format: str = DEFAULT_OUTPUT_FORMAT) -> bytes:
+    """按编码档位将图片编码为指定格式（格式不支持透明度时合成到白色背景）"""
+    encoder = get_encoder(output_format)
+    if not encoder.supports_alpha:
+        flattened = flatten_alpha(img)
+        try:
+            return encoder.encode(flattened, quality, profile)
+        finally:
+            if flattened is not img:
+                flattened.close()
+    return encoder.encode(img, quality, profile)
+
+
+def _measure_ssim(reference: np.ndarray, data: bytes, metrics: Optional[JobMetrics],
+                  **fields: Any) -> Optional[float]:
+    """解码编码结果并计算 SSIM（输出无法解码时返回 None，不影响处理结果）"""
+    with measure(metrics, "ssim", **fields) as record:
+        try:
+            score = compute_ssim(reference, data)
+        except Exception as e:
+            print(f"[SSIM] Failed to decode output: {e}")
+            return None
+        record["ssim"] = round(score, 4)
+    return score
+
+
+def _predict_quality(points: List[Tuple[int, int]], target_bytes: int, low: int, high: int) -> int:
+    """
+    按大小-质量模型预测达到目标大小的质量
+
+    有上下两个已知点时在两点之间按对数大小插值，只有一个点时使用模型斜率外推，
+    结果限制在当前搜索区间 [low, high] 内
+    """
+    below = max((point for point in points if point[1] <= target_bytes), default=None)
+    above = min((point for point in points if point[1] > target_bytes), default=None)
+
+    if below and above and above[1] > below[1]:
+        ratio = (math.log(target_bytes) - math.log(below[1])) / (math.log(above[1]) - math.log(below[1]))
+        quality = below[0] + ratio * (above[0] - below[0])
+    else:
+        quality_point, size = below or above or points[-1]
+        quality = quality_point + (math.log(target_bytes) - math.log(size)) / SIZE_MODEL_LOG_SLOPE
+
+    return min(max(int(quality), low), high)
+
+
+def encode_to_target_size(img: Image.Image, target_bytes: int,
+                          profile: str = DEFAULT_ENCODE_PROFILE,
+                          seed_quality: int = 80,
+                          tolerance: float = DEFAULT_SIZE_TOLERANCE,
+                          output_format: str = DEFAULT_OUTPUT_FORMAT) -> Tuple[bytes, int, int]:
+    """
+    在内存中搜索不超过目标文件大小的最高质量
+
+    从 seed_quality 开始，每次编码后按结果缩小质量区间，并用大小-质量模型预测下一个尝试值
+    （预测连续偏向同一侧时改用二分），结果落在 [target * (1 - tolerance), target] 内即停止
+
+    Args:
+        img: 已 resize 的图片
+        target_bytes: 目标文件大小（字节）
+        profile: 编码档位
+        seed_quality: 第一次尝试的质量
+        tolerance: 允许比目标小的比例
+        output_format: 输出格式
+
+    Returns:
+        (编码数据, 质量, 编码次数)；最低质量仍超过目标时返回最低质量的结果
+    """
+    low, high = MIN_SEARCH_QUALITY, MAX_SEARCH_QUALITY
+    quality = min(max(seed_quality, low), high)
+    points: List[Tuple[int, int]] = []
+    best = None  # 不超过目标的最高质量结果 (data, quality)
+    smallest = None  # 超过目标的最低质量结果 (data, quality)
+
+    while True:
+        data = encode_image(img, quality, profile, output_format)
+        size = len(data)
+        points.append((quality, size))
+
+        if size <= target_bytes:
+            if best is None or quality > best[1]:
+                best = (data, quality)
+            if size >= target_bytes * (1 - tolerance):
+                break
+            low = quality + 1
+        else:
+            if smallest is None or quality < smallest[1]:
+                smallest = (data, quality)
+            high = quality - 1
+
+        if low > high:
+            break
+        # 连续两次落在目标同一侧说明模型预测偏差较大，退回二分以保证收敛速度
+        if len(points) >= 2 and (points[-1][1] > target_bytes) == (points[-2][1] > target_bytes):
+            quality = (low + high) // 2
+        else:
+            quality = _predict_quality(points, target_bytes, low, high)
+
+    data, quality = best or smallest or (data, quality)
+    return data, quality, len(points)
+
+
+def _load_cached(source: ImageSource, target_width: int, data: bytes,
+                 output_format: str, source_hash: Optional[str] = None) -> EncodedImage:
+    """根据缓存命中的数据构建结果（只读取原图头部信息，不解码）"""
+    source_img, original_filesize = open_image(source)
+    with source_img:
+        original_size = source_img.size
+
+    return EncodedImage(
+        data=data,
+        original_size=original_size,
+        processed_size=calculate_target_size(original_size, target_width),
+        original_filesize=original_filesize,
+        from_cache=True,
+        quality=None,
+        encode_passes=0,
+        output_format=output_format,
+        source_hash=source_hash
+    )
+
+
+def convert_image(source: ImageSource, target_width: int, quality: int,
+                  progress: Optional[ProgressCallback] = None,
+                  cache: Optional[OutputCache] = None,
+                  profile: str = DEFAULT_ENCODE_PROFILE,
+                  target_filesize: Optional[int] = None,
+                  auto_quality: bool = False,
+                  keep_alpha: bool = False,
+                  output_format: str = DEFAULT_OUTPUT_FORMAT,
+                  metrics: Optional[JobMetrics] = None) -> EncodedImage:
+    """
+    在内存中完成 resize 和格式转换，不写入磁盘
+
+    Args:
+        source: 图片路径、bytes 或文件对象
+        target_width: 目标宽度
+        quality: 输出质量（目标文件大小模式下作为搜索起点）
+        progress: 进度回调（可选）
+        cache: 输出缓存（可选，相同源内容和参数时直接复用已生成的文件）
+        profile: 编码档位（fast / balanced / max_compression）
+        target_filesize: 目标文件大小（字节，可选，指定后搜索不超过该大小的最高质量）
+        auto_quality: 是否按图片复杂度自动选择质量（忽略 quality，目标文件大小模式下作为搜索起点）
+        keep_alpha: 是否保留透明度（False 时透明区域合成到白色背景）
+        output_format: 输出格式（webp / avif / jxl / jpeg）
+        metrics: 阶段计时（可选）
+
+    Returns:
+        EncodedImage，失败时抛出异常
+    """
+    return convert_image_formats(source, target_width, quality, [output_format], progress=progress,
+                                 cache=cache, profile=profile, target_filesize=target_filesize,
+                                 auto_quality=auto_quality, keep_alpha=keep_alpha,
+                                 metrics=metrics)[0]
+
+
+def convert_image_formats(source: ImageSource, target_width: int, quality: int,
+                          output_formats: Sequence[str],
+                          progress: Optional[ProgressCallback] = None,
+                          cache: Optional[OutputCache] = None,
+                          profile: str = DEFAULT_ENCODE_PROFILE,
+                          target_filesize: Optional[int] = None,
+                          auto_quality: bool = False,
+                          keep_alpha: bool = False,
+                          metrics: Optional[JobMetrics] = None) -> List[EncodedImage]:
+    """
+    只解码和 resize 一次，在内存中编码为多种格式
+
+    多个格式在线程池中并行编码（Pillow 编码器执行时释放 GIL），参数含义同 convert_image
+
+    Returns:
+        EncodedImage 列表，顺序与 output_formats 一致，失败时抛出异常
+    """
+    get_encode_profile(profile)
+    output_formats = list(dict.fromkeys(output_formats))
+    if not output_formats:
+        raise ValueError("At least one output format is required")
+    encoders = {name: get_encoder(name) for name in output_formats}
+
+    encoded: Dict[str, EncodedImage] = {}
+
+    # 查找输出缓存（文件对象来源不缓存）
+    cache_keys: Dict[str, str] = {}
+    source_hash = None
+    if cache is not None and isinstance(source, (str, os.PathLike, bytes, bytearray, memoryview)):
+        _emit(progress, "Checking cache...")
+        with measure(metrics, "cache") as record:
+            source_hash = hash_source(source)
+            for name in output_formats:
+                encoder_settings = get_encoder_settings(profile, keep_alpha=keep_alpha, output_format=name)
+                if target_filesize:
+                    encoder_settings["target_filesize"] = target_filesize
+                if auto_quality:
+                    encoder_settings["auto_quality"] = True
+                cache_keys[name] = make_cache_key(source_hash, target_width, quality, encoder_settings)
+                data = cache.get(cache_keys[name], encoders[name].extension)
+                if data is not None:
+                    encoded[name] = _load_cached(source, target_width, data, name, source_hash)
+                    record["bytes"] = record.get("bytes", 0) + len(data)
+            record["hits"] = len(encoded)
+
+        if len(encoded) == len(output_formats):
+            _emit(progress, "Loaded from cache!")
+            return [encoded[name] for name in output_formats]
+
+    missing = [name for name in output_formats if name not in encoded]
+
+    _emit(progress, "Loading image...")
+
+    with measure(metrics, "open") as record:
+        source_img, original_filesize = open_image(source)
+        record["bytes"] = original_filesize
+    with source_img:
+        original_size = source_img.size
+
+        _emit(progress, "Processing image...")
+        img = prepare_image(source_img, target_width, keep_alpha=keep_alpha, metrics=metrics)
+
+        if auto_quality:
+            with measure(metrics, "analyze"):
+                quality, complexity = get_auto_quality(img)
+            _emit(progress, f"Auto quality: {quality} (complexity {complexity:.3f})")
+
+        # SSIM 参考平面：所有格式共用
+        with measure(metrics, "ssim") as record:
+            reference = get_ssim_reference(img)
+            record["bytes"] = reference.nbytes
+
+        def encode(name: str) -> Tuple[bytes, int, int, Optional[float]]:
+            """编码单个格式，返回 (数据, 质量, 编码次数, SSIM)"""
+            label = encoders[name].label
+            with measure(metrics, "encode", format=name) as record:
+                if target_filesize:
+                    _emit(progress, f"Encoding {label} (target {format_filesize(target_filesize)})...")
+                    data, used_quality, encode_passes = encode_to_target_size(
+                        img, target_filesize, profile, seed_quality=quality, output_format=name)
+                    _emit(progress, f"{label}: quality {used_quality} after {encode_passes} encode passes")
+                else:
+                    _emit(progress, f"Encoding {label}...")
+                    data, used_quality, encode_passes = encode_image(img, quality, profile, name), quality, 1
+                record["bytes"] = len(data)
+                record["passes"] = encode_passes
+            return data, used_quality, encode_passes, _measure_ssim(reference, data, metrics, format=name)
+
+        try:
+            if len(missing) == 1:
+                outputs = [encode(missing[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                    outputs = list(executor.map(encode, missing))
+        finally:
+            processed_size = img.size
+            if img is not source_img:
+                img.close()
+
+    for name, (data, used_quality, encode_passes, ssim) in zip(missing, outputs):
+        if cache is not None and name in cache_keys:
+            cache.put(cache_keys[name], data, encoders[name].extension)
+        encoded[name] = EncodedImage(
+            data=data,
+            original_size=original_size,
+            processed_size=processed_size,
+            original_filesize=original_filesize,
+            quality=used_quality,
+            encode_passes=encode_passes,
+            output_format=name,
+            ssim=ssim,
+            source_hash=source_hash
+        )
+
+    return [encoded[name] for name in output_formats]
+
+
+def save_encoded(encoded: EncodedImage, image_path: str = "",
+                 output_directory: Optional[str] = None,
+                 base_name: Optional[str] = None,
+                 keyword: str = "",
+                 output_path: Optional[str] = None,
+                 metrics: Optional[JobMetrics] = None) -> ImageResult:
+    """
+    将内存中的转换结果一次性原子写入磁盘
+
+    Args:
+        encoded: convert_image 的结果
+        image_path: 原图路径（用于默认输出目录和文件名）
+        output_directory: 输出目录（可选，默认在原图旁创建 image-optimized）
+        base_name: 文件主名（可选，默认由 keyword 或原文件名生成），重名时自动添加序号
+        keyword: 关键词，用于生成输出文件名
+        output_path: 指定输出路径（可选，指定后直接覆盖写入该路径）
+        metrics: 阶段计时（可选，记录 write）
+
+    Returns:
+        ImageResult
+    """
+    return save_encoded_formats([encoded], image_path, output_directory=output_directory,
+                                base_name=base_name, keyword=keyword, output_path=output_path,
+                                metrics=metrics)[0]
+
+
+def _write_encoded(encoded_list: List[EncodedImage], output_paths: List[str],
+                   metrics: Optional[JobMetrics]) -> None:
+    """逐个原子写入编码结果"""
+    for encoded, path in zip(encoded_list, output_paths):
+        with measure(metrics, "write", format=encoded.output_format) as record:
+            write_atomic(encoded.data, path)
+            record["bytes"] = encoded.processed_filesize
+
+
+def save_encoded_formats(encoded_list: List[EncodedImage], image_path: str = "",
+                         output_directory: Optional[str] = None,
+                         base_name: Optional[str] = None,
+                         keyword: str = "",
+                         output_path: Optional[str] = None,
+                         metrics: Optional[JobMetrics] = None) -> List[ImageResult]:
+    """
+    将同一图片的多种格式以相同的文件主名写入磁盘（name.webp、name.avif ...）
+
+    参数含义同 save_encoded；指定 output_path 时各格式替换其扩展名后覆盖写入
+
+    Returns:
+        ImageResult 列表，顺序与 encoded_list 一致；第一个结果的 alternates 包含其余格式
+    """
+    extensions = [encoded.extension for encoded in encoded_list]
+    if output_path:
+        output_paths = [str(Path(output_path).with_suffix(extension)) for extension in extensions]
+        _write_encoded(encoded_list, output_paths, metrics)
+    else:
+        if not output_directory and not image_path:
+            raise ValueError("output_path or output_directory is required for in-memory sources")
+        output_dir = ensure_output_directory(image_path, output_directory)
+        if base_name is None:
+            base_name = get_base_name(image_path, keyword)
+
+        # 扩展名作为后缀组，所有格式共享同一个序号
+        output_paths = get_name_index(output_dir).reserve_group(base_name, extensions, "")
+        try:
+            _write_encoded(encoded_list, output_paths, metrics)
+        except BaseException:
+            # 释放占位文件
+            for path in output_paths:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+            raise
+
+    results = [ImageResult(
+        original_path=image_path,
+        processed_path=path,
+        original_size=encoded.original_size,
+        processed_size=encoded.processed_size,
+        original_filesize=encoded.original_filesize,
+        processed_filesize=encoded.processed_filesize,
+        from_cache=encoded.from_cache,
+        quality=encoded.quality,
+        encode_passes=encoded.encode_passes,
+        ssim=encoded.ssim,
+        source_hash=encoded.source_hash
+    ) for encoded, path in zip(encoded_list, output_paths)]
+    results[0].alternates = results[1:]
+    return results
+
+
+def process_image(source: ImageSource, keyword: str, target_width: int, quality: int,
+                  output_directory: Optional[str] = None,
+                  output_path: Optional[str] = None,
+                  progress: Optional[ProgressCallback] = None,
+                  cache: Optional[OutputCache] = None,
+                  profile: str = DEFAULT_ENCODE_PROFILE,
+                  target_filesize: Optional[int] = None,
+                  auto_quality: bool = False,
+                  keep_alpha: bool = False,
+                  output_formats: Sequence[str] = (DEFAULT_OUTPUT_FORMAT,),
+                  metrics: Optional[JobMetrics] = None) -> ImageResult:
+    """
+    处理图片：resize 和格式转换，并保存到磁盘
+
+    图片先在内存中编码，然后一次性原子写入不冲突的文件名
+
+    Args:
+        source: 图片路径、bytes 或文件对象
+        keyword: 关键词，用于生成输出文件名
+        target_width: 目标宽度
+        quality: 输出质量
+        output_directory: 输出目录（可选，默认在原图旁创建 image-optimized）
+        output_path: 指定输出路径（可选，指定后忽略 keyword 和 output_directory，其他格式替换扩展名）
+        progress: 进度回调（可选）
+        cache: 输出缓存（可选，相同源内容和参数时直接复用已生成的文件）
+        profile: 编码档位（fast / balanced / max_compression）
+        target_filesize: 目标文件大小（字节，可选，指定后 quality 作为质量搜索起点）
+        auto_quality: 是否按图片复杂度自动选择质量
+        keep_alpha: 是否保留透明度（False 时透明区域合成到白色背景）
+        output_formats: 输出格式列表（多个格式并行编码，文件主名相同）
+        metrics: 阶段计时（可选，记录 open / decode / convert / resize / encode / write 等阶段）
+
+    Returns:
+        第一个格式的 ImageResult（其余格式在 alternates 中），失败时抛出异常
+    """
+    image_path = _source_name(source)
+    if not output_path and not output_directory and not image_path:
+        raise ValueError("output_path or output_directory is required for in-memory sources")
+
+    encoded_list = convert_image_formats(source, target_width, quality, output_formats,
+                                         progress=progress, cache=cache, profile=profile,
+                                         target_filesize=target_filesize,
+                                         auto_quality=auto_quality, keep_alpha=keep_alpha,
+                                         metrics=metrics)
+
+    _emit(progress, "Saving output...")
+    results = save_encoded_formats(encoded_list, image_path, output_directory=output_directory,
+                                   keyword=keyword, output_path=output_path, metrics=metrics)
+
+    _emit(progress, "Image processing completed!")
+    return results[0]
+
+
+def process_variants(source: ImageSource, keyword: str, widths: Iterable[int], quality: int,
+                     output_directory: Optional[str] = None,
+                     base_name: Optional[str] = None,
+                     progress: Optional[ProgressCallback] = None,
+                     reduced_decode: bool = True,
+                     profile: str = DEFAULT_ENCODE_PROFILE,
+                     keep_alpha: bool = False,
+                     output_format: str = DEFAULT_OUTPUT_FORMAT,
+                     metrics: Optional[JobMetrics] = None) -> List[ImageResult]:
+    """
+    只解码一次，生成多个宽度的响应式图片（srcset 金字塔）
+
+    从最大宽度开始，每一级都由上一级缩小得到，文件名为 name-<宽度>w.<扩展名>。
+    大于原图宽度的档位会被跳过（不放大）；若全部大于原图，则按原图宽度输出一张。
+
+    Args:
+        source: 图片路径、bytes 或文件对象
+        keyword: 关键词，用于生成输出文件名
+        widths: 目标宽度列表
+        quality: WebP 输出质量
+        output_directory: 输出目录（可选，默认在原图旁创建 image-optimized）
+        base_name: 指定文件主名（可选，指定后忽略 keyword）
+        progress: 进度回调（可选）
+        reduced_decode: 是否按最大宽度降低解码分辨率
+        profile: 编码档位（fast / balanced / max_compression）
+        keep_alpha: 是否保留透明度（False 时透明区域合成到白色背景）
+        output_format: 输出格式（webp / avif / jxl / jpeg）
+        metrics: 阶段计时（可选）
+
+    Returns:
+        按宽度从小到大排列的 ImageResult 列表，失败时抛出异常
+    """
+    get_encode_profile(profile)
+    encoder = get_encoder(output_format)
+    image_path = _source_name(source)
+    if not output_directory and not image_path:
+        raise ValueError("output_directory is required for in-memory sources")
+
+    widths = sorted({width for width in widths if width > 0}, reverse=True)
+    if not widths:
+        raise ValueError("At least one target width is required")
+
+    _emit(progress, "Loading image...")
+
+    with measure(metrics, "open") as record:
+        source_img, original_filesize = open_image(source)
+        record["bytes"] = original_filesize
+    with source_img:
+        original_size = source_img.size
+
+        # 跳过大于原图的档位
+        ladder = [width for width in widths if width <= original_size[0]] or [original_size[0]]
+
+        output_dir = ensure_output_directory(image_path, output_directory)
+        if base_name is None:
+            base_name = get_base_name(image_path, keyword)
+        output_paths = get_variant_filenames(output_dir, base_name, ladder, encoder.extension)
+
+        try:
+            results = _encode_ladder(source_img, image_path, original_filesize, ladder,
+                                     output_paths, quality, progress, reduced_decode, profile,
+                                     keep_alpha, output_format, metrics)
+        except BaseException:
+            # 释放占位文件，不留下不完整的变体组
+            for output_path in output_paths:
+                try:
+                    os.unlink(output_path)
+                except OSError:
+                    pass
+            raise
+
+    _emit(progress, "Image processing completed!")
+
+    results.reverse()
+    return results
+
+
+def _encode_ladder(source_img: Image.Image, image_path: str, original_filesize: int,
+                   ladder: List[int], output_paths: List[str], quality: int,
+                   progress: Optional[ProgressCallback], reduced_decode: bool,
+                   profile: str, keep_alpha: bool, output_format: str,
+                   metrics: Optional[JobMetrics]) -> List[ImageResult]:
+    """从大到小逐级缩小并编码，返回按宽度从大到小排列的结果"""
+    original_size = source_img.size
+
+    _emit(progress, "Processing image...")
+    level = prepare_image(source_img, ladder[0], reduced_decode=reduced_decode, keep_alpha=keep_alpha,
+                          metrics=metrics)
+
+    results = []
+    for width, output_path in zip(ladder, output_paths):
+        new_size = calculate_target_size(original_size, width)
+        if new_size != level.size:
+            with measure(metrics, "resize", width=width) as record:
+                previous = level
+                level = previous.resize(new_size, Image.Resampling.LANCZOS)
+                if previous is not source_img:
+                    previous.close()
+                record["bytes"] = _pixel_bytes(level)
+
+        _emit(progress, f"Saving {width}w {get_encoder(output_format).label}...")
+        with measure(metrics, "encode", format=output_format, width=width) as record:
+            data = encode_image(level, quality, profile, output_format)
+            record["bytes"] = len(data)
+        with measure(metrics, "ssim", width=width) as record:
+            reference = get_ssim_reference(level)
+            record["bytes"] = reference.nbytes
+        ssim = _measure_ssim(reference, data, metrics, format=output_format, width=width)
+        with measure(metrics, "write", format=output_format, width=width) as record:
+            write_atomic(data, output_path)
+            record["bytes"] = len(data)
+
+        results.append(ImageResult(
+            original_path=image_path,
+            processed_path=output_path,
+            original_size=original_size,
+            processed_size=level.size,
+            original_filesize=original_filesize,
+            processed_filesize=len(data),
+            quality=quality,
+            ssim=ssim
+        ))
+
+    if level is not source_img:
+        level.close()
+
+    return results
+
+
+def rename_processed_image(result: ImageResult, title: str,
+                           metrics: Optional[JobMetrics] = None) -> str:
+    """
+    根据标题重命名输出文件（重名时自动添加序号），更新 result 并返回新路径
+
+    其他格式（result.alternates）一起重命名，保持文件主名相同
+    """
+    with measure(metrics, "rename") as record:
+        new_path = _rename_group(result, normalize_filename(title))
+        record["bytes"] = sum(item.processed_filesize for item in [result] + result.alternates)
+    return new_path
+
+
+def _rename_group(result: ImageResult, new_filename: str) -> str:
+    """将 result 及其其他格式重命名为 new_filename，返回主文件的新路径"""
+    group = [result] + result.alternates
+    current_paths = [Path(item.processed_path) for item in group]
+    if current_paths[0].stem == new_filename:
+        return str(current_paths[0])
+
+    name_index = get_name_index(str(current_paths[0].parent))
+    new_paths = name_index.reserve_group(new_filename, [path.suffix for path in current_paths], "")
+    renamed = 0
+    try:
+        for current_path, new_path in zip(current_paths, new_paths):
+            os.replace(current_path, new_path)
+            renamed += 1
+    except BaseException:
+        # 已重命名的文件恢复原名，释放其余占位文件
+        for current_path, new_path in zip(current_paths[:renamed], new_paths):
+            os.replace(new_path, current_path)
+        for new_path in new_paths:
+            try:
+                os.unlink(new_path)
+            except OSError:
+                pass
+        raise
+
+    for item, current_path, new_path in zip(group, current_paths, new_paths):
+        name_index.discard(current_path.name)
+        item.processed_path = new_path
+    return new_paths[0]
+
+
+def normalize_filename(title: str) -> str:
+    """标准化文件名"""
+    # 强制转换为小写
+    normalized = title.lower()
+
+    # 空格和特殊字符替换为短横线
+    # 只保留字母、数字和短横线
+    normalized = re.sub(r'[^a-z0-9\s-]', '-', normalized)
+
+    # 空格替换为短横线
+    normalized = normalized.replace(' ', '-')
+
+    # 保持连续的短横线为单个
+    normalized = re.sub(r'-+', '-', normalized)
+
+    # 移除首尾的短横线
+    normalized = normalized.strip('-')
+
+    # 如果结果为空，使用默认名称
+    if not normalized:
+        normalized = "optimized-image"
+
+    return normalized
+
+
+def format_filesize(size_bytes: int) -> str:
+    """格式化文件大小"""
+    if size_bytes < 1024:
+        return f"{size_bytes}B"
+    elif size_bytes < 1024 * 1024:
+        return f"{size_bytes / 1024:.1f}KB"
+    else:
+        return f"{size_bytes / (1024 * 1024):.1f}MB"
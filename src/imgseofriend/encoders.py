@@ -0,0 +1,196 @@
+"""
+输出编码器注册表
+每种输出格式声明扩展名、编码参数和各编码档位下的速度参数，
+core 模块按名称查找编码器，新增格式只需调用 register_encoder
+"""
+
+import io
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, features
+
+# 默认输出格式
+DEFAULT_OUTPUT_FORMAT = "webp"
+
+
+class EncodeProfile:
+    """
+    编码档位：在编码速度和文件大小之间取舍
+
+    质量由设置中的 Quality 决定，档位只控制编码器的努力程度和线程数，
+    各编码器对应的具体参数见 Encoder.profile_options
+    """
+
+    def __init__(self, name: str, label: str, max_threads: Optional[int] = None):
+        self.name = name
+        self.label = label
+        self.max_threads = max_threads  # 单个编码器的线程数（仅对支持的编码器生效，None 为编码器默认）
+
+
+# Fast 面向大批量处理，批处理已按 CPU 核心数开进程，单个编码器再开多线程只会争抢核心；
+# Max Compression 编码最慢，使用编码器默认（全部核心）以缩短单张图片的耗时
+ENCODE_PROFILES = {
+    "fast": EncodeProfile("fast", "Fast", max_threads=1),
+    "balanced": EncodeProfile("balanced", "Balanced", max_threads=2),
+    "max_compression": EncodeProfile("max_compression", "Max Compression"),
+}
+
+
+def get_encode_profile(name: str) -> EncodeProfile:
+    """根据名称获取编码档位"""
+    try:
+        return ENCODE_PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Unknown encode profile: {name}")
+
+
+class Encoder:
+    """输出编码器基类"""
+
+    name = ""  # 注册名称（配置和命令行使用）
+    label = ""  # 界面显示名称
+    pil_format = ""  # Pillow 保存格式
+    extension = ""  # 输出文件扩展名
+    supports_alpha = True  # 是否支持透明度（不支持时由调用方合成到白色背景）
+    options: Dict[str, Any] = {}  # 固定编码参数
+    profile_options: Dict[str, Dict[str, Any]] = {}  # 各编码档位的速度参数
+    threads_option: Optional[str] = None  # 线程数参数名（编码器不支持多线程时为 None）
+
+    def is_available(self) -> bool:
+        """当前环境是否支持该格式"""
+        return bool(features.check(self.pil_format.lower()))
+
+    def get_options(self, quality: int, profile: str) -> Dict[str, Any]:
+        """获取 Pillow 保存参数"""
+        encode_profile = get_encode_profile(profile)
+        options = {"quality": quality}
+        options.update(self.options)
+        options.update(self.profile_options.get(encode_profile.name, {}))
+        if self.threads_option and encode_profile.max_threads is not None:
+            options[self.threads_option] = encode_profile.max_threads
+        return options
+
+    def get_settings(self, profile: str) -> Dict[str, Any]:
+        """获取影响输出结果的参数（用于缓存键，不含线程数）"""
+        settings = {"format": self.pil_format, "profile": profile}
+        settings.update(self.options)
+        settings.update(self.profile_options.get(profile, {}))
+        return settings
+
+    def encode(self, img: Image.Image, quality: int, profile: str) -> bytes:
+        """编码为字节数据（不写入元数据以减小文件大小）"""
+        buffer = io.BytesIO()
+        img.save(buffer, self.pil_format, **self.get_options(quality, profile))
+        return buffer.getvalue()
+
+
+class WebPEncoder(Encoder):
+    """WebP 编码器（method 0-6，越大越慢、文件越小）"""
+
+    name = "webp"
+    label = "WebP"
+    pil_format = "WebP"
+    extension = ".webp"
+    profile_options = {
+        "fast": {"method": 2},
+        "balanced": {"method": 4},
+        "max_compression": {"method": 6},
+    }
+
+
+class AvifEncoder(Encoder):
+    """AVIF 编码器（speed 0-10，越小越慢；低于 6 时耗时成倍增加而文件几乎不再变小）"""
+
+    name = "avif"
+    label = "AVIF"
+    pil_format = "AVIF"
+    extension = ".avif"
+    options = {"subsampling": "4:2:0"}
+    profile_options = {
+        "fast": {"speed": 8},
+        "balanced": {"speed": 7},
+        "max_compression": {"speed": 6},
+    }
+    threads_option = "max_threads"
+
+
+class JxlEncoder(Encoder):
+    """JPEG XL 编码器（需要安装 pillow-jxl-plugin，effort 1-9，越大越慢、文件越小）"""
+
+    name = "jxl"
+    label = "JPEG XL"
+    pil_format = "JXL"
+    extension = ".jxl"
+    # 不对 JPEG 源做无损重打包，始终按 resize 后的像素编码
+    options = {"lossless_jpeg": False}
+    profile_options = {
+        "fast": {"effort": 3},
+        "balanced": {"effort": 5},
+        "max_compression": {"effort": 7},
+    }
+    threads_option = "num_threads"
+
+    def is_available(self) -> bool:
+        """导入 pillow_jxl 时注册 JXL 格式"""
+        try:
+            import pillow_jxl  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+
+class JpegEncoder(Encoder):
+    """优化的渐进式 JPEG 编码器（兼容不支持新格式的客户端）"""
+
+    name = "jpeg"
+    label = "JPEG"
+    pil_format = "JPEG"
+    extension = ".jpg"
+    supports_alpha = False
+    profile_options = {
+        "fast": {"progressive": False, "optimize": False},
+        "balanced": {"progressive": True, "optimize": False},
+        "max_compression": {"progressive": True, "optimize": True},
+    }
+
+    def is_available(self) -> bool:
+        """JPEG 由 Pillow 内置的 libjpeg 支持"""
+        return bool(features.check("jpg"))
+
+
+ENCODERS: Dict[str, Encoder] = {}
+
+# 各格式的可用性检查结果（检查可能需要导入插件，只执行一次）
+_availability: Dict[str, bool] = {}
+
+
+def register_encoder(encoder: Encoder) -> None:
+    """注册编码器（同名时覆盖）"""
+    ENCODERS[encoder.name] = encoder
+    _availability.pop(encoder.name, None)
+
+
+def _is_available(name: str) -> bool:
+    """检查格式是否可用（结果缓存）"""
+    if name not in _availability:
+        _availability[name] = ENCODERS[name].is_available()
+    return _availability[name]
+
+
+for _encoder in (WebPEncoder(), AvifEncoder(), JxlEncoder(), JpegEncoder()):
+    register_encoder(_encoder)
+
+
+def get_encoder(name: str) -> Encoder:
+    """根据名称获取编码器，格式未注册或当前环境不支持时抛出 ValueError"""
+    encoder = ENCODERS.get(name)
+    if encoder is None:
+        raise ValueError(f"Unknown output format: {name}")
+    if not _is_available(name):
+        raise ValueError(f"Output format not supported in this environment: {encoder.label}")
+    return encoder
+
+
+def get_available_formats() -> List[str]:
+    """获取当前环境支持的输出格式名称"""
+    return [name for name in ENCODERS if _is_available(name)]
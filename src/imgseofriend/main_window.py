@@ -17,6 +17,7 @@ from PySide6.QtWidgets import (
 from PySide6.QtCore import Qt, QMimeData, QUrl, Signal, QTimer, QPoint
 from PySide6.QtGui import QPixmap, QDragEnterEvent, QDropEvent, QFont, QFocusEvent
 
+from .ai_service import get_ai_service
 from .config_manager import ConfigManager
 
 
@@ -39,6 +40,7 @@ class CustomWidthLineEdit(QLineEdit):
         super().mousePressEvent(event)
 from .settings_dialog import SettingsDialog
 from .worker import ImageWorker, ImageResult
+from .core import DEFAULT_VARIANT_WIDTHS, get_srcset
 from .before_after_widget import BeforeAfterWidget
 
 
@@ -530,6 +532,8 @@ class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.config_manager = ConfigManager()
+        # 所有工作线程共用一个 AIService（保持 keep-alive 连接）
+        self.ai_service = get_ai_service(self.config_manager)
         self.current_worker = None
         self.current_image_result = None
         self.current_ai_result = None
@@ -747,6 +751,13 @@ class MainWindow(QMainWindow):
         
         form_layout.addLayout(button_layout)
         
+        # 响应式图片按钮：一次生成全部宽度
+        self.process_srcset_button = QPushButton("Process All Widths (srcset)")
+        self.process_srcset_button.setObjectName("processSrcsetButton")
+        self.process_srcset_button.clicked.connect(self.process_srcset)
+        self.process_srcset_button.setEnabled(False)
+        form_layout.addWidget(self.process_srcset_button)
+
         return form_layout
     
     def create_result_section(self) -> QWidget:
@@ -770,6 +781,7 @@ class MainWindow(QMainWindow):
         # Regenerate AI 按钮
         self.regenerate_button = QPushButton("Regenerate AI 🔄")
         self.regenerate_button.setObjectName("regenerateButton")
+        self.regenerate_button.setToolTip("Shift+Click to ignore cached AI results")
         self.regenerate_button.clicked.connect(self.regenerate_ai)
         result_layout.addWidget(self.regenerate_button)
         
@@ -804,6 +816,7 @@ class MainWindow(QMainWindow):
         # 创建工作线程
         self.current_worker = ImageWorker(
             image_path=self.image_display.current_image_path,
+            config_manager=self.config_manager,
             keyword=keyword,
             target_width=target_width,
             process_mode="image_only"
@@ -839,6 +852,7 @@ class MainWindow(QMainWindow):
         # 创建工作线程
         self.current_worker = ImageWorker(
             image_path=self.image_display.current_image_path,
+            config_manager=self.config_manager,
             keyword=keyword,
             target_width=target_width,
             process_mode="with_ai"
@@ -846,12 +860,91 @@ class MainWindow(QMainWindow):
         
         # 连接信号
         self.current_worker.finished.connect(self.on_processing_finished)
+        self.current_worker.ai_partial.connect(self.on_ai_partial)
+        self.current_worker.error.connect(self.on_processing_error)
+        self.current_worker.progress.connect(self.on_progress_updated)
+
+        # 启动线程
+        self.current_worker.start()
+
+    def process_srcset(self) -> None:
+        """一次解码生成所有预设宽度（及自定义宽度）的响应式图片"""
+        if not self.image_display.current_image_path:
+            QMessageBox.warning(self, "Warning", "Please drag and drop an image first!")
+            return
+
+        # 与 batch --widths 一致：响应式图片不支持目标文件大小和自动质量
+        if self.config_manager.get_target_filesize() > 0:
+            QMessageBox.warning(self, "Warning",
+                                "Target file size cannot be combined with srcset. Disable it in Settings first.")
+            return
+        if self.config_manager.get_auto_quality():
+            QMessageBox.warning(self, "Warning",
+                                "Auto quality cannot be combined with srcset. Disable it in Settings first.")
+            return
+
+        keyword = self.keyword_input.get_keyword() or ""
+
+        target_widths = list(DEFAULT_VARIANT_WIDTHS)
+        if self.width_custom.isChecked():
+            custom_width = self.get_target_width()
+            if custom_width is None:
+                return  # 自定义宽度无效
+            target_widths.append(custom_width)
+
+        # 禁用控件，显示进度
+        self.set_processing_state(True)
+
+        # 创建工作线程
+        self.current_worker = ImageWorker(
+            image_path=self.image_display.current_image_path,
+            config_manager=self.config_manager,
+            keyword=keyword,
+            target_width=max(target_widths),
+            process_mode="srcset",
+            target_widths=target_widths
+        )
+
+        # 连接信号
+        self.current_worker.variants_finished.connect(self.on_variants_finished)
         self.current_worker.error.connect(self.on_processing_error)
         self.current_worker.progress.connect(self.on_progress_updated)
         
         # 启动线程
         self.current_worker.start()
     
+    def on_variants_finished(self, results: list) -> None:
+        """响应式图片生成完成"""
+        # 使用最大宽度的图片作为 After 对比
+        largest = results[-1]
+        self.current_image_result = largest
+        self.image_display.set_after_image(largest.processed_path, largest.ssim)
+
+        # 之前的 AI 结果与这组变体无关；"Regenerate AI" 只会重命名其中一个文件，srcset 结果不提供
+        self.current_ai_result = None
+        self.title_input.clear()
+        self.alt_text_input.clear()
+        self.result_section.setVisible(False)
+
+        # 恢复控件状态
+        self.set_processing_state(False)
+
+        # srcset 模式只生成第一个输出格式，且不使用输出缓存
+        notes = []
+        output_formats = self.config_manager.get_output_formats()
+        if len(output_formats) > 1:
+            notes.append(f"Only {output_formats[0]} variants are generated; "
+                         f"{', '.join(output_formats[1:])} skipped.")
+        if self.config_manager.get_cache_enabled():
+            notes.append("Variants are always re-encoded (output cache not used).")
+
+        QMessageBox.information(
+            self,
+            "srcset",
+            f"Generated {len(results)} variants:\n\n{get_srcset(results)}"
+            + "".join(f"\n\n{note}" for note in notes)
+        )
+
     def process_image(self):
         """处理图片（保持向后兼容）"""
         self.process_with_ai()
@@ -868,7 +961,7 @@ class MainWindow(QMainWindow):
         self.current_ai_result = ai_result
         
         # 设置 After 图片（处理后的图片）
-        success = self.image_display.set_after_image(image_result.processed_path)
+        success = self.image_display.set_after_image(image_result.processed_path, image_result.ssim)
         
         if success:
             # 更新提示文本
@@ -934,6 +1027,7 @@ class MainWindow(QMainWindow):
     def set_processing_state(self, processing: bool):
         """设置处理状态"""
         self.process_image_only_button.setEnabled(not processing)
+        self.process_srcset_button.setEnabled(not processing)
         self.process_with_ai_button.setEnabled(not processing)
         self.settings_button.setEnabled(not processing)
         self.keyword_input.setEnabled(not processing)
@@ -960,7 +1054,7 @@ class MainWindow(QMainWindow):
             self.progress_bar.setValue(0)
     
     def regenerate_ai(self):
-        """重新生成AI数据"""
+        """重新生成AI数据（不重新处理图片；按住 Shift 点击时忽略 AI 缓存）"""
         if not self.current_image_result or not self.current_ai_result:
             return
         
@@ -968,34 +1062,45 @@ class MainWindow(QMainWindow):
         if not keyword:
             return
         
-        # 获取原始图片路径和选中的宽度
-        target_width = self.get_target_width()
-        if target_width is None:
-            return  # 自定义宽度无效
-        
         # 禁用控件
         self.set_processing_state(True)
         
-        # 创建工作线程（只重新生成AI数据）
+        # 创建工作线程（只重新生成AI数据，复用已处理的图片）
         self.current_worker = ImageWorker(
             image_path=self.image_display.current_image_path,
+            config_manager=self.config_manager,
             keyword=keyword,
-            target_width=target_width,
-            process_mode="with_ai"
+            target_width=self.current_image_result.processed_size[0],
+            process_mode="ai_only",
+            image_result=self.current_image_result,
+            bypass_ai_cache=bool(QApplication.keyboardModifiers() & Qt.ShiftModifier)
         )
         
         # 连接信号
         self.current_worker.finished.connect(self.on_regenerate_finished)
+        self.current_worker.ai_partial.connect(self.on_ai_partial)
         self.current_worker.error.connect(self.on_processing_error)
         self.current_worker.progress.connect(self.on_progress_updated)
         
         # 启动线程
         self.current_worker.start()
     
+    def on_ai_partial(self, partial: dict) -> None:
+        """流式生成中逐段填入 Title / Alt Text（完成后由 finished 信号填入最终结果）"""
+        self.result_section.setVisible(True)
+        if "title" in partial:
+            self.title_input.setText(partial["title"])
+        if "alt_text" in partial:
+            self.alt_text_input.setPlainText(partial["alt_text"])
+
     def on_regenerate_finished(self, image_result: ImageResult, ai_result: dict):
         """重新生成完成"""
+        self.current_image_result = image_result
         self.current_ai_result = ai_result
         
+        # 输出文件已按新 Title 重命名
+        self.image_display.after_path = image_result.processed_path
+
         # 更新AI数据
         self.title_input.setText(ai_result.get('title', ''))
         self.alt_text_input.setPlainText(ai_result.get('alt_text', ''))
@@ -1023,6 +1128,7 @@ class MainWindow(QMainWindow):
         self.alt_text_input.clear()
         self.file_name_input.clear()
         self.process_image_only_button.setEnabled(False)
+        self.process_srcset_button.setEnabled(False)
         self.process_with_ai_button.setEnabled(False)
     
     def open_output_folder(self):
@@ -1096,6 +1202,7 @@ class MainWindow(QMainWindow):
             self.current_worker.quit()
             self.current_worker.wait()
         
+        self.ai_service.close()
         event.accept()
     
     # 拖拽事件处理方法
@@ -1181,6 +1288,7 @@ class MainWindow(QMainWindow):
             
             # 启用处理按钮
             self.process_image_only_button.setEnabled(True)
+            self.process_srcset_button.setEnabled(True)
             self.process_with_ai_button.setEnabled(True)
         else:
             QMessageBox.warning(self, "Error", f"Failed to load image: {image_path}")
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""
+处理清单
+用 SQLite 记录每个源文件（路径 + 大小 + 修改时间 + 内容哈希）生成了哪些输出、
+使用的处理参数、AI Title / Alt Text 和各阶段耗时。
+
+批处理和监视文件夹按源路径做一次主键查询即可判断是否需要重新处理：
+源文件和影响输出的参数都未变化、输出文件仍存在时直接跳过。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from .cache import hash_source
+from .core import get_encoder_settings
+
+# 清单文件名（位于输出目录）
+MANIFEST_FILENAME = ".imgseofriend-manifest.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    source_hash TEXT,
+    settings_key TEXT NOT NULL,
+    settings TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    outputs TEXT NOT NULL,
+    title TEXT,
+    alt_text TEXT,
+    metrics TEXT,
+    processed_at REAL NOT NULL
+)
+"""
+
+
+def get_job_settings(target_width: int, quality: int,
+                     widths: Optional[Sequence[int]] = None,
+                     profile: str = "max_compression",
+                     target_filesize: Optional[int] = None,
+                     auto_quality: bool = False,
+                     keep_alpha: bool = False,
+                     output_formats: Sequence[str] = ("webp",)) -> Dict[str, Any]:
+    """获取影响输出结果的处理参数（参数变化时需要重新编码）"""
+    return {
+        "width": target_width if not widths else None,
+        "widths": sorted(widths) if widths else None,
+        "quality": quality,
+        "target_filesize": target_filesize,
+        "auto_quality": auto_quality,
+        "encoders": [get_encoder_settings(profile, keep_alpha=keep_alpha, output_format=name)
+                     for name in output_formats],
+    }
+
+
+def make_settings_key(settings: Dict[str, Any]) -> str:
+    """根据处理参数生成比较用的键"""
+    payload = json.dumps(settings, sort_keys=True)
+    return hashlib.blake2b(payload.encode(), digest_size=16).hexdigest()
+
+
+class ManifestEntry:
+    """清单中的一条记录"""
+
+    def __init__(self, source: str, size: int, mtime_ns: int, source_hash: Optional[str],
+                 settings_key: str, settings: Dict[str, Any], output_path: str, outputs: List[str],
+                 title: Optional[str] = None, alt_text: Optional[str] = None,
+                 metrics: Optional[Dict[str, Any]] = None, processed_at: float = 0.0):
+        self.source = source
+        self.size = size
+        self.mtime_ns = mtime_ns
+        self.source_hash = source_hash  # 源文件内容哈希（大小不变而修改时间变化时用于确认内容）
+        self.settings_key = settings_key
+        self.settings = settings
+        self.output_path = output_path  # 分配给该源文件的输出路径（重新处理时沿用）
+        self.outputs = outputs  # 实际生成的全部文件（多格式、srcset 变体）
+        self.title = title
+        self.alt_text = alt_text
+        self.metrics = metrics  # 阶段计时（JobMetrics.to_dict()）
+        self.processed_at = processed_at
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "ManifestEntry":
+        """从数据库行构建"""
+        return cls(
+            source=row["source"],
+            size=row["size"],
+            mtime_ns=row["mtime_ns"],
+            source_hash=row["source_hash"],
+            settings_key=row["settings_key"],
+            settings=json.loads(row["settings"]),
+            output_path=row["output_path"],
+            outputs=json.loads(row["outputs"]),
+            title=row["title"],
+            alt_text=row["alt_text"],
+            metrics=json.loads(row["metrics"]) if row["metrics"] else None,
+            processed_at=row["processed_at"]
+        )
+
+    def outputs_exist(self) -> bool:
+        """输出文件是否都还存在"""
+        return bool(self.outputs) and all(os.path.exists(path) for path in self.outputs)
+
+
+class Manifest:
+    """
+    SQLite 处理清单
+
+    写入在事务中累积，调用 commit() 或 close() 时提交；线程安全
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            # WAL：批处理写入时其他进程仍可读取
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(_SCHEMA)
+            self._conn.commit()
+
+    @staticmethod
+    def _key(source: str) -> str:
+        """源文件的主键（绝对路径）"""
+        return os.path.abspath(source)
+
+    def get(self, source: str) -> Optional[ManifestEntry]:
+        """按源路径查询记录"""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM outputs WHERE source = ?",
+                                     (self._key(source),)).fetchone()
+        return ManifestEntry.from_row(row) if row else None
+
+    def is_current(self, entry: Optional[ManifestEntry], size: int, mtime_ns: int,
+                   settings_key: str) -> bool:
+        """
+        判断记录是否仍然有效（get() 的结果，无需再次查询）
+
+        源文件大小、修改时间和处理参数都与记录一致，且输出文件仍存在时有效；
+        只有修改时间变化（例如复制或 touch）时比较内容哈希，内容相同则更新修改时间后视为有效
+        """
+        if entry is None or entry.settings_key != settings_key or entry.size != size:
+            return False
+        if entry.mtime_ns != mtime_ns:
+            try:
+                if not entry.source_hash or hash_source(entry.source) != entry.source_hash:
+                    return False
+            except OSError:
+                return False
+            with self._lock:
+                self._conn.execute("UPDATE outputs SET mtime_ns = ? WHERE source = ?",
+                                   (mtime_ns, entry.source))
+            entry.mtime_ns = mtime_ns
+        return entry.outputs_exist()
+
+    def record(self, source: str, size: int, mtime_ns: int, source_hash: Optional[str],
+               settings: Dict[str, Any], output_path: str, outputs: List[str],
+               title: Optional[str] = None, alt_text: Optional[str] = None,
+               metrics: Optional[Dict[str, Any]] = None) -> None:
+        """记录一次成功的处理（同一源文件覆盖旧记录）"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO outputs (source, size, mtime_ns, source_hash, settings_key, "
+                "settings, output_path, outputs, title, alt_text, metrics, processed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (self._key(source), size, mtime_ns, source_hash, make_settings_key(settings),
+                 json.dumps(settings, sort_keys=True), output_path, json.dumps(outputs),
+                 title, alt_text, json.dumps(metrics) if metrics else None, time.time())
+            )
+
+    def update_seo(self, source: str, title: str, alt_text: str, outputs: List[str]) -> None:
+        """更新 AI 生成的 Title / Alt Text 和重命名后的输出路径"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE outputs SET title = ?, alt_text = ?, output_path = ?, outputs = ? WHERE source = ?",
+                (title, alt_text, outputs[0], json.dumps(outputs), self._key(source))
+            )
+
+    def remove(self, source: str) -> None:
+        """删除记录（不删除输出文件）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM outputs WHERE source = ?", (self._key(source),))
+
+    def sources(self, prefix: str = "") -> List[str]:
+        """列出已记录的源路径（可按目录前缀过滤）"""
+        with self._lock:
+            if prefix:
+                prefix = os.path.join(os.path.abspath(prefix), "")
+                rows = self._conn.execute(
+                    "SELECT source FROM outputs WHERE substr(source, 1, ?) = ?", (len(prefix), prefix)
+                ).fetchall()
+            else:
+                rows = self._conn.execute("SELECT source FROM outputs").fetchall()
+        return [row["source"] for row in rows]
+
+    def commit(self) -> None:
+        """提交累积的写入"""
+        with self._lock:
+            self._conn.commit()
+
+    def close(self) -> None:
+        """提交并关闭"""
+        with self._lock:
+            self._conn.commit()
+            self._conn.close()
+
+    def __enter__(self) -> "Manifest":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,185 @@
+"""
+处理阶段计时
+每个任务记录各阶段（open、decode、convert、resize、encode、write、ai、rename ...）的耗时和字节数，
+可追加写入 JSON Lines 日志，之后按阶段汇总 p50 / p95
+
+用法:
+    imgseofriend metrics <log.jsonl>
+"""
+
+import argparse
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator, List, Optional
+
+# 进程内同时写入同一日志文件时串行化
+_log_lock = threading.Lock()
+
+
+class JobMetrics:
+    """
+    单个任务的阶段计时
+
+    阶段按完成顺序记录；多格式并行编码时可在多个线程中同时记录（线程安全）
+    """
+
+    def __init__(self, job: str = "", mode: str = ""):
+        self.job = job  # 任务标识（通常为源图片路径）
+        self.mode = mode  # 处理模式（image_only / with_ai / ...）
+        self.started_at = time.time()
+        self.stages: List[Dict[str, Any]] = []
+        self.ok = True
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name: str, **fields: Any) -> Iterator[Dict[str, Any]]:
+        """
+        计时一个阶段
+
+        返回的记录可在代码块中补充字段，例如 record["bytes"] = len(data)
+        """
+        record: Dict[str, Any] = {"stage": name, "bytes": 0}
+        record.update(fields)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            with self._lock:
+                self.stages.append(record)
+
+    def add(self, name: str, seconds: float, nbytes: int = 0, **fields: Any) -> None:
+        """记录在别处计时的阶段"""
+        record = {"stage": name, "bytes": nbytes, "ms": round(seconds * 1000, 3)}
+        record.update(fields)
+        with self._lock:
+            self.stages.append(record)
+
+    def get_stage_totals(self) -> Dict[str, float]:
+        """按阶段汇总耗时（ms，同名阶段累加）"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for record in self.stages:
+                totals[record["stage"]] = totals.get(record["stage"], 0.0) + record["ms"]
+        return totals
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典（wall_ms 为任务开始至今的总耗时）"""
+        with self._lock:
+            stages = [dict(record) for record in self.stages]
+        return {
+            "job": self.job,
+            "mode": self.mode,
+            "started_at": self.started_at,
+            "wall_ms": round((time.perf_counter() - self._start) * 1000, 3),
+            "ok": self.ok,
+            "stages": stages,
+        }
+
+
+def measure(metrics: Optional[JobMetrics], name: str, **fields: Any) -> ContextManager[Dict[str, Any]]:
+    """计时一个阶段（metrics 为 None 时不计时，返回的记录可照常写入）"""
+    if metrics is None:
+        return nullcontext({})
+    return metrics.stage(name, **fields)
+
+
+def append_jsonl(path: str, record: Dict[str, Any]) -> None:
+    """将一条记录追加到 JSON Lines 日志（失败时只打印日志）"""
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+    except OSError as e:
+        print(f"[METRICS] Failed to write {path}: {e}")
+
+
+def read_jsonl(path: str) -> List[Dict[str, Any]]:
+    """读取 JSON Lines 日志（跳过无法解析的行）"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return records
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """最近秩法百分位数（values 不能为空）"""
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def summarize(records: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
+    """
+    按阶段汇总多个任务的耗时
+
+    每个任务中同名阶段先累加（例如多格式编码），再计算各阶段的 p50 / p95
+
+    Returns:
+        {stage: {"count", "p50_ms", "p95_ms", "total_ms", "bytes"}}，另含 "wall" 表示整个任务
+    """
+    per_stage: Dict[str, List[float]] = {}
+    stage_bytes: Dict[str, int] = {}
+    for record in records:
+        job_totals: Dict[str, float] = {}
+        for item in record.get("stages", []):
+            job_totals[item["stage"]] = job_totals.get(item["stage"], 0.0) + item.get("ms", 0.0)
+            stage_bytes[item["stage"]] = stage_bytes.get(item["stage"], 0) + item.get("bytes", 0)
+        job_totals["wall"] = record.get("wall_ms", 0.0)
+        for name, ms in job_totals.items():
+            per_stage.setdefault(name, []).append(ms)
+
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": percentile(values, 0.5),
+            "p95_ms": percentile(values, 0.95),
+            "total_ms": sum(values),
+            "bytes": stage_bytes.get(name, 0),
+        }
+        for name, values in per_stage.items()
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口：按阶段汇总计时日志"""
+    from .core import format_filesize
+
+    parser = argparse.ArgumentParser(prog="imgseofriend metrics",
+                                     description="Summarize per-stage timings from a JSON-lines metrics log")
+    parser.add_argument("log", help="metrics log written by the worker (JSON lines)")
+    args = parser.parse_args(argv)
+
+    try:
+        records = read_jsonl(args.log)
+    except OSError as e:
+        parser.error(str(e))
+    if not records:
+        print("No records")
+        return 0
+
+    failed = sum(1 for record in records if not record.get("ok", True))
+    print(f"{len(records)} jobs ({failed} failed)")
+    print(f"{'stage':<12} {'count':>6} {'p50 ms':>10} {'p95 ms':>10} {'total s':>9} {'bytes':>12}")
+    summary = summarize(records)
+    # 整个任务的耗时放在最后
+    summary["wall"] = summary.pop("wall")
+    for name, stats in summary.items():
+        print(f"{name:<12} {stats['count']:>6} {stats['p50_ms']:>10.1f} {stats['p95_ms']:>10.1f} "
+              f"{stats['total_ms'] / 1000:>9.2f} {format_filesize(int(stats['bytes'])):>12}")
+    return 0
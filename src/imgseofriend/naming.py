@@ -0,0 +1,146 @@
+"""
+输出文件名索引
+每个输出目录只用一次 os.scandir 建立内存索引，之后分配不冲突的文件名（name、name-1、name-2 ...）
+不再逐个 stat 探测，目录中有成千上万个同名前缀文件时也是常数时间
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+
+def create_exclusive(path: str) -> bool:
+    """以独占方式创建空文件占用文件名，文件已存在时返回 False"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o666)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+class DirectoryNameIndex:
+    """
+    单个目录的文件名索引
+
+    - 创建时扫描一次目录，记录已有文件名
+    - 每个 (主名, 后缀组) 记录下一个待尝试的序号，序号只增不减，
+      因此分配的总探测次数与文件数成正比（均摊常数时间）
+    - 分配时用 O_EXCL 创建占位文件，其他进程同时写入同一目录也不会冲突
+    - 线程安全
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._names: Set[str] = set()
+        self._next_counter: Dict[Tuple[str, Tuple[str, ...], str], int] = {}
+        self._lock = threading.Lock()
+
+        if os.path.isdir(directory):
+            with os.scandir(directory) as entries:
+                self._names = {entry.name for entry in entries}
+
+    @staticmethod
+    def _format_name(base_name: str, counter: int, suffix: str, extension: str) -> str:
+        """生成文件名：base[-counter]suffix.ext"""
+        stem = base_name if counter == 0 else f"{base_name}-{counter}"
+        return f"{stem}{suffix}{extension}"
+
+    def _find_free(self, base_name: str, suffixes: Tuple[str, ...], extension: str) -> Tuple[int, List[str]]:
+        """从记录的序号开始查找一组在索引中都空闲的文件名"""
+        key = (base_name, suffixes, extension)
+        counter = self._next_counter.get(key, 0)
+        while True:
+            names = [self._format_name(base_name, counter, suffix, extension) for suffix in suffixes]
+            if not any(name in self._names for name in names):
+                self._next_counter[key] = counter
+                return counter, names
+            counter += 1
+
+    def next_free(self, base_name: str, extension: str = ".webp") -> str:
+        """返回下一个空闲的文件路径（不占用）"""
+        with self._lock:
+            _, names = self._find_free(base_name, ("",), extension)
+        return os.path.join(self.directory, names[0])
+
+    def reserve(self, base_name: str, extension: str = ".webp", claim_on_disk: bool = True) -> str:
+        """
+        占用一个不冲突的文件名
+
+        Args:
+            base_name: 文件主名
+            extension: 扩展名
+            claim_on_disk: 是否创建占位文件（False 时只在内存中占用，适合由同一进程统一分配的场景）
+
+        Returns:
+            占用的文件路径
+        """
+        return self.reserve_group(base_name, ("",), extension, claim_on_disk)[0]
+
+    def reserve_group(self, base_name: str, suffixes: Sequence[str], extension: str = ".webp",
+                      claim_on_disk: bool = True) -> List[str]:
+        """
+        占用一组共享同一序号的文件名（如 name-500w.webp、name-750w.webp）
+
+        Returns:
+            占用的文件路径列表，顺序与 suffixes 一致
+        """
+        suffixes = tuple(suffixes)
+        key = (base_name, suffixes, extension)
+
+        with self._lock:
+            while True:
+                counter, names = self._find_free(base_name, suffixes, extension)
+                paths = [os.path.join(self.directory, name) for name in names]
+
+                claimed = []
+                if claim_on_disk:
+                    for path in paths:
+                        if not create_exclusive(path):
+                            break
+                        claimed.append(path)
+
+                # 所有文件名都占用成功
+                if not claim_on_disk or len(claimed) == len(paths):
+                    self._names.update(names)
+                    self._next_counter[key] = counter + 1
+                    return paths
+
+                # 磁盘上已有索引之外创建的文件：释放已占用的，记录冲突的文件名后重试
+                for path in claimed:
+                    os.unlink(path)
+                self._names.add(names[len(claimed)])
+
+    def add(self, name: str) -> None:
+        """记录在索引之外写入的文件名"""
+        with self._lock:
+            self._names.add(name)
+
+    def discard(self, name: str) -> None:
+        """记录已删除或已重命名的文件名（序号不回退，释放的文件名不会被重新分配）"""
+        with self._lock:
+            self._names.discard(name)
+
+
+_indexes: Dict[str, DirectoryNameIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_name_index(directory: str) -> DirectoryNameIndex:
+    """获取目录的文件名索引（每个进程每个目录只建立一次）"""
+    key = os.path.realpath(directory)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = DirectoryNameIndex(directory)
+            _indexes[key] = index
+        return index
+
+
+def clear_name_indexes(directory: Optional[str] = None) -> None:
+    """丢弃已建立的索引（目录被外部修改后可调用以重新扫描）"""
+    with _indexes_lock:
+        if directory is None:
+            _indexes.clear()
+        else:
+            _indexes.pop(os.path.realpath(directory), None)
@@ -0,0 +1,338 @@
+"""
+AI 请求限流
+所有 AI 请求共用一个 RateLimiter：按每分钟请求数和每分钟 token 数两个令牌桶排队，
+根据服务端返回的限流响应头（Retry-After、x-ratelimit-*、anthropic-ratelimit-*）调整配额和等待时间，
+并按 429 自适应调整同时进行的请求数（遇到 429 减半，之后每次成功逐步恢复）。
+
+RateLimiter 只计算需要等待的时间，不自行等待：同步调用使用 time.sleep，
+asyncio 中使用 asyncio.sleep，等待期间不占用线程。
+"""
+
+import math
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+
+# 未收到 Retry-After 等响应头时 429 的退避基数和上限（秒）
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+
+# 按响应头等待时额外加入的随机等待比例（避免所有工作线程同时恢复请求）
+RETRY_JITTER = 0.2
+
+# 两次并发数减半之间的最短间隔（秒）：同一波请求的多个 429 只减半一次
+DECREASE_INTERVAL = 1.0
+
+# 各服务商的限流响应头（{} 为 requests 或 tokens）
+_HEADER_FORMATS = (
+    # OpenAI 兼容服务
+    ("x-ratelimit-limit-{}", "x-ratelimit-remaining-{}", "x-ratelimit-reset-{}"),
+    # Anthropic
+    ("anthropic-ratelimit-{}-limit", "anthropic-ratelimit-{}-remaining", "anthropic-ratelimit-{}-reset"),
+)
+
+_DURATION_RE = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def parse_reset(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """
+    解析限流响应头中的等待时间（秒）
+
+    支持秒数（"2"、"0.5"）、时长（"1s"、"6m0s"、"20ms"）、
+    RFC 3339 时间（"2024-01-01T00:00:30Z"）和 HTTP 日期
+    """
+    if not value:
+        return None
+    value = value.strip()
+    now = time.time() if now is None else now
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    compact = value.replace(" ", "")
+    parts = _DURATION_RE.findall(compact)
+    if parts and "".join(number + unit for number, unit in parts) == compact:
+        return sum(float(number) * _DURATION_UNITS[unit] for number, unit in parts)
+    try:
+        moment = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            moment = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max(moment.timestamp() - now, 0.0)
+
+
+def estimate_tokens(payload: Dict[str, Any]) -> int:
+    """估算一次请求消耗的 token 数（提示词按 4 个字符 1 个 token，加上输出上限）"""
+    prompt_chars = sum(len(message.get("content") or "") for message in payload.get("messages", []))
+    return math.ceil(prompt_chars / 4) + int(payload.get("max_tokens") or 0)
+
+
+class TokenBucket:
+    """
+    每分钟配额的令牌桶（rate_per_minute 为 None 时不限制）
+
+    reserve() 立即扣除令牌（余额可以为负），返回需要等待的时间，请求按调用顺序排队
+    """
+
+    def __init__(self, rate_per_minute: Optional[float] = None):
+        self.rate_per_minute = rate_per_minute
+        self.tokens = float(rate_per_minute or 0)
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        """按经过的时间补充令牌（最多补满一分钟的配额）"""
+        if self.rate_per_minute:
+            self.tokens = min(self.tokens + (now - self.updated) * self.rate_per_minute / 60,
+                              self.rate_per_minute)
+        self.updated = now
+
+    def set_rate(self, rate_per_minute: Optional[float], now: float) -> None:
+        """修改每分钟配额"""
+        self._refill(now)
+        if rate_per_minute and not self.rate_per_minute:
+            self.tokens = float(rate_per_minute)
+        self.rate_per_minute = rate_per_minute
+        if rate_per_minute:
+            self.tokens = min(self.tokens, rate_per_minute)
+
+    def sync_remaining(self, remaining: float, now: float) -> None:
+        """与服务端报告的剩余配额对齐（只会减少本地余额）"""
+        self._refill(now)
+        self.tokens = min(self.tokens, remaining)
+
+    def reserve(self, amount: float, now: float) -> float:
+        """扣除令牌，返回需要等待的秒数"""
+        if not self.rate_per_minute:
+            return 0.0
+        self._refill(now)
+        self.tokens -= amount
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens * 60 / self.rate_per_minute
+
+
+class RateLimiter:
+    """
+    AI 请求的共享限流器（线程安全）
+
+    用法:
+        time.sleep(limiter.reserve(estimate_tokens(payload)))
+        with limiter.slot():
+            response = send()
+        limiter.on_success(response.headers)  # 或 wait = limiter.on_rate_limited(response.headers, attempt)
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_concurrency: int = 16, rng: Optional[random.Random] = None):
+        """
+        Args:
+            requests_per_minute: 每分钟请求数上限（None 表示只使用服务端报告的配额）
+            tokens_per_minute: 每分钟 token 数上限（同上）
+            max_concurrency: 同时进行的请求数上限
+            rng: 随机等待使用的随机数生成器
+        """
+        self.max_concurrency = max_concurrency
+        self._configured = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+        self._buckets = {"requests": TokenBucket(requests_per_minute),
+                         "tokens": TokenBucket(tokens_per_minute)}
+        self._concurrency = float(max_concurrency)  # 自适应并发数（取整后使用）
+        self._in_flight = 0
+        self._blocked_until = 0.0  # 收到 429 后所有请求暂停到该时间（time.monotonic()）
+        self._last_decrease = -math.inf
+        self._rate_limited = 0
+        self._random = rng or random.Random()
+        self._condition = threading.Condition()
+        self._waiters: List[Callable[[], None]] = []  # try_acquire 失败后等待唤醒的回调
+
+    @property
+    def concurrency(self) -> int:
+        """当前允许同时进行的请求数"""
+        return max(int(self._concurrency), 1)
+
+    def set_limits(self, requests_per_minute: Optional[float] = None,
+                   tokens_per_minute: Optional[float] = None) -> None:
+        """修改配置的配额（None 表示只使用服务端报告的配额）"""
+        now = time.monotonic()
+        with self._condition:
+            self._configured = {"requests": requests_per_minute, "tokens": tokens_per_minute}
+            for kind, bucket in self._buckets.items():
+                bucket.set_rate(self._configured[kind], now)
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        预约一次请求（1 个请求 + tokens 个 token）
+
+        Returns:
+            发送前需要等待的秒数
+        """
+        now = time.monotonic()
+        with self._condition:
+            wait = max(self._buckets["requests"].reserve(1, now),
+                       self._buckets["tokens"].reserve(tokens, now),
+                       self._blocked_until - now)
+        return max(wait, 0.0)
+
+    def try_acquire(self, on_available: Optional[Callable[[], None]] = None) -> bool:
+        """
+        不等待地占用一个并发名额（用于 asyncio），成功后需调用 release()
+
+        Args:
+            on_available: 名额不足时登记的回调，之后有名额释放或并发数恢复时调用一次
+                （在调用 release() 等方法的线程中执行，asyncio 中应使用 loop.call_soon_threadsafe）
+        """
+        with self._condition:
+            if self._in_flight >= self.concurrency:
+                if on_available is not None:
+                    self._waiters.append(on_available)
+                return False
+            self._in_flight += 1
+            return True
+
+    def _take_waiters(self) -> List[Callable[[], None]]:
+        """取出所有登记的唤醒回调（需持有锁，回调在释放锁后调用）"""
+        waiters, self._waiters = self._waiters, []
+        return waiters
+
+    def acquire(self) -> None:
+        """占用一个并发名额（名额不足时阻塞）"""
+        with self._condition:
+            while self._in_flight >= self.concurrency:
+                self._condition.wait()
+            self._in_flight += 1
+
+    def release(self) -> None:
+        """释放并发名额"""
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+            waiters = self._take_waiters()
+        for callback in waiters:
+            callback()
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """在并发名额内发送请求"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _update_from_headers(self, headers: Mapping[str, str], now: float) -> None:
+        """根据服务端的限流响应头调整配额（配置了上限时取较小值）"""
+        for kind, bucket in self._buckets.items():
+            for limit_name, remaining_name, reset_name in _HEADER_FORMATS:
+                limit = _parse_number(headers.get(limit_name.format(kind)))
+                remaining = _parse_number(headers.get(remaining_name.format(kind)))
+                if limit is None and remaining is None:
+                    continue
+                if limit:
+                    configured = self._configured[kind]
+                    bucket.set_rate(min(limit, configured) if configured else limit, now)
+                if remaining is not None:
+                    bucket.sync_remaining(remaining, now)
+                    if remaining < 1:
+                        reset = parse_reset(headers.get(reset_name.format(kind)))
+                        if reset:
+                            self._blocked_until = max(self._blocked_until, now + reset)
+                break
+
+    def on_success(self, headers: Mapping[str, str]) -> None:
+        """请求成功：更新配额，并发数逐步恢复（每个并发周期加 1）"""
+        now = time.monotonic()
+        waiters: List[Callable[[], None]] = []
+        with self._condition:
+            self._update_from_headers(headers, now)
+            if self._concurrency < self.max_concurrency:
+                self._concurrency = min(self._concurrency + 1 / self._concurrency, self.max_concurrency)
+                self._condition.notify_all()
+                waiters = self._take_waiters()
+        for callback in waiters:
+            callback()
+
+    def on_rate_limited(self, headers: Mapping[str, str], attempt: int) -> float:
+        """
+        收到 429：并发数减半，按响应头计算所有请求的暂停时间
+
+        Retry-After（或 retry-after-ms、限流重置时间）存在时等待该时间并加入少量随机等待，
+        否则使用带随机等待的指数退避（full jitter）
+
+        Returns:
+            本次请求重试前需要等待的秒数
+        """
+        now = time.monotonic()
+        with self._condition:
+            self._rate_limited += 1
+            self._update_from_headers(headers, now)
+            if now - self._last_decrease >= DECREASE_INTERVAL:
+                self._concurrency = max(self._concurrency / 2, 1.0)
+                self._last_decrease = now
+
+            retry_after = self._retry_after(headers)
+            if retry_after is not None:
+                wait = retry_after * (1 + self._random.uniform(0, RETRY_JITTER))
+            else:
+                wait = self._random.uniform(0, min(BACKOFF_BASE * 2 ** (attempt + 1), BACKOFF_MAX))
+            self._blocked_until = max(self._blocked_until, now + wait)
+            return max(self._blocked_until - now, 0.0)
+
+    def _retry_after(self, headers: Mapping[str, str]) -> Optional[float]:
+        """
+        429 响应建议的等待时间（秒），依次查看 retry-after-ms、Retry-After 和限流重置时间
+
+        限流重置时间只取剩余配额为 0 的配额（例如只有请求数用完时不等待 token 配额的重置），
+        无法判断是哪个配额时取最短的重置时间
+        """
+        retry_after_ms = _parse_number(headers.get("retry-after-ms"))
+        if retry_after_ms is not None:
+            return retry_after_ms / 1000
+        retry_after = parse_reset(headers.get("retry-after"))
+        if retry_after is not None:
+            return retry_after
+        resets = []
+        exhausted = []
+        for _, remaining_name, reset_name in _HEADER_FORMATS:
+            for kind in self._buckets:
+                reset = parse_reset(headers.get(reset_name.format(kind)))
+                if reset is None:
+                    continue
+                resets.append(reset)
+                remaining = _parse_number(headers.get(remaining_name.format(kind)))
+                if remaining is not None and remaining < 1:
+                    exhausted.append(reset)
+        if exhausted:
+            return max(exhausted)
+        return min(resets) if resets else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取限流统计"""
+        with self._condition:
+            return {
+                "concurrency": self.concurrency,
+                "in_flight": self._in_flight,
+                "rate_limited": self._rate_limited,
+                "requests_per_minute": self._buckets["requests"].rate_per_minute,
+                "tokens_per_minute": self._buckets["tokens"].rate_per_minute,
+                "blocked_for": max(self._blocked_until - time.monotonic(), 0.0),
+            }
+
+
+def _parse_number(value: Optional[str]) -> Optional[float]:
+    """解析数值响应头（无法解析时返回 None）"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
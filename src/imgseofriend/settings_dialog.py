@@ -1,20 +1,26 @@
 from PySide6.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QFormLayout, 
                                QLineEdit, QPushButton, QTextEdit, QMessageBox,
-                               QGroupBox, QLabel, QSpinBox, QSlider)
+                               QGroupBox, QLabel, QSpinBox, QSlider, QCheckBox, QComboBox)
+import threading
 from PySide6.QtCore import Qt, Signal
 from PySide6.QtGui import QFont
 from .config_manager import ConfigManager
-from .ai_service import AIService
+from .ai_service import AIService, get_ai_service
+from .cache import OutputCache
+from .core import ENCODE_PROFILES, format_filesize
+from .encoders import DEFAULT_OUTPUT_FORMAT, ENCODERS
 
 
 class SettingsDialog(QDialog):
     """设置对话框"""
     
     settings_changed = Signal()
+    cache_stats_ready = Signal(dict)  # 后台线程统计完输出缓存后发出
     
     def __init__(self, parent=None):
         super().__init__(parent)
         self.config_manager = ConfigManager()
+        self.cache_stats_ready.connect(self.on_cache_stats_ready)
         self.init_ui()
         self.load_settings()
     
@@ -50,6 +56,25 @@ class SettingsDialog(QDialog):
         self.model_name_input.setMinimumWidth(400)  # 加倍宽度
         api_layout.addRow("Model Name:", self.model_name_input)
         
+        # Rate Limit（0 表示按服务端返回的限流响应头自动调整）
+        rate_limit_layout = QHBoxLayout()
+
+        self.rate_limit_rpm_input = QSpinBox()
+        self.rate_limit_rpm_input.setRange(0, 100000)
+        self.rate_limit_rpm_input.setSuffix(" requests/min")
+        self.rate_limit_rpm_input.setSpecialValueText("Auto")
+        rate_limit_layout.addWidget(self.rate_limit_rpm_input)
+
+        self.rate_limit_tpm_input = QSpinBox()
+        self.rate_limit_tpm_input.setRange(0, 100000000)
+        self.rate_limit_tpm_input.setSingleStep(1000)
+        self.rate_limit_tpm_input.setSuffix(" tokens/min")
+        self.rate_limit_tpm_input.setSpecialValueText("Auto")
+        rate_limit_layout.addWidget(self.rate_limit_tpm_input)
+
+        rate_limit_layout.addStretch()
+        api_layout.addRow("Rate Limit:", rate_limit_layout)
+
         api_group.setLayout(api_layout)
         layout.addWidget(api_group)
         
@@ -64,6 +89,21 @@ class SettingsDialog(QDialog):
         self.system_prompt_input.setPlaceholderText("You are an SEO assistant.")
         prompt_layout.addRow("System Prompt:", self.system_prompt_input)
         
+        # AI Cache（相同的模型、提示词和关键词复用之前的生成结果）
+        ai_cache_layout = QHBoxLayout()
+
+        self.ai_cache_enabled_checkbox = QCheckBox("Reuse AI results for repeated keywords")
+        ai_cache_layout.addWidget(self.ai_cache_enabled_checkbox)
+
+        self.ai_cache_stats_label = QLabel()
+        ai_cache_layout.addWidget(self.ai_cache_stats_label)
+
+        self.clear_ai_cache_button = QPushButton("Clear")
+        self.clear_ai_cache_button.clicked.connect(self.clear_ai_cache)
+        ai_cache_layout.addWidget(self.clear_ai_cache_button)
+
+        prompt_layout.addRow("AI Cache:", ai_cache_layout)
+
         prompt_group.setLayout(prompt_layout)
         layout.addWidget(prompt_group)
         
@@ -94,7 +134,72 @@ class SettingsDialog(QDialog):
         quality_layout.addWidget(self.output_quality_slider)
         quality_layout.addWidget(self.output_quality_label)
         
-        output_layout.addRow("WebP Quality:", quality_layout)
+        # 按图片复杂度自动选择质量时禁用滑块
+        self.auto_quality_checkbox = QCheckBox("Auto")
+        self.auto_quality_checkbox.setToolTip("Pick the quality per image from its level of detail")
+        self.auto_quality_checkbox.toggled.connect(
+            lambda checked: self.output_quality_slider.setEnabled(not checked)
+        )
+        quality_layout.addWidget(self.auto_quality_checkbox)
+
+        output_layout.addRow("Output Quality:", quality_layout)
+
+        # Output Formats（可多选，多个格式并行编码，文件主名相同）
+        formats_layout = QHBoxLayout()
+        self.output_format_checkboxes = {}
+        for name, encoder in ENCODERS.items():
+            checkbox = QCheckBox(encoder.label)
+            if not encoder.is_available():
+                checkbox.setEnabled(False)
+                checkbox.setToolTip(f"{encoder.label} is not supported in this environment")
+            self.output_format_checkboxes[name] = checkbox
+            formats_layout.addWidget(checkbox)
+        formats_layout.addStretch()
+        output_layout.addRow("Output Formats:", formats_layout)
+
+        # Encode Profile（编码速度与文件大小的取舍）
+        self.encode_profile_combo = QComboBox()
+        for name, profile in ENCODE_PROFILES.items():
+            self.encode_profile_combo.addItem(profile.label, name)
+        output_layout.addRow("Encode Profile:", self.encode_profile_combo)
+
+        # Target File Size（0 表示使用固定质量）
+        self.target_filesize_input = QSpinBox()
+        self.target_filesize_input.setRange(0, 100000)
+        self.target_filesize_input.setSuffix(" KB")
+        self.target_filesize_input.setSpecialValueText("Off (use Output Quality)")
+        self.target_filesize_input.setToolTip("Search the highest quality that keeps the output under this size")
+        output_layout.addRow("Target File Size:", self.target_filesize_input)
+
+        # Transparency（保留透明度或合成到白色背景）
+        self.keep_alpha_checkbox = QCheckBox("Keep transparency (otherwise flatten onto white)")
+        output_layout.addRow("Transparency:", self.keep_alpha_checkbox)
+
+        # Output Cache
+        cache_layout = QHBoxLayout()
+
+        self.cache_enabled_checkbox = QCheckBox("Reuse cached outputs")
+        cache_layout.addWidget(self.cache_enabled_checkbox)
+
+        self.cache_max_size_input = QSpinBox()
+        self.cache_max_size_input.setRange(16, 100000)
+        self.cache_max_size_input.setSuffix(" MB")
+        cache_layout.addWidget(self.cache_max_size_input)
+
+        self.cache_stats_label = QLabel()
+        cache_layout.addWidget(self.cache_stats_label)
+
+        self.clear_cache_button = QPushButton("Clear")
+        self.clear_cache_button.clicked.connect(self.clear_cache)
+        cache_layout.addWidget(self.clear_cache_button)
+
+        output_layout.addRow("Output Cache:", cache_layout)
+
+        # Metrics Log（每个任务的阶段计时追加为 JSON Lines，留空不记录）
+        self.metrics_log_input = QLineEdit()
+        self.metrics_log_input.setPlaceholderText("Off (e.g. ~/.imgfriend/metrics.jsonl)")
+        self.metrics_log_input.setToolTip("Append per-stage timings of every job to this JSON-lines file")
+        output_layout.addRow("Metrics Log:", self.metrics_log_input)
         
         output_group.setLayout(output_layout)
         layout.addWidget(output_group)
@@ -127,20 +232,110 @@ class SettingsDialog(QDialog):
         self.api_base_url_input.setText(self.config_manager.get_api_base_url())
         self.api_key_input.setText(self.config_manager.get_api_key())
         self.model_name_input.setText(self.config_manager.get_model_name())
+        self.rate_limit_rpm_input.setValue(self.config_manager.get_rate_limit_rpm())
+        self.rate_limit_tpm_input.setValue(self.config_manager.get_rate_limit_tpm())
         self.system_prompt_input.setPlainText(self.config_manager.get_system_prompt())
+        self.ai_cache_enabled_checkbox.setChecked(self.config_manager.get_ai_cache_enabled())
+        self.update_ai_cache_stats()
         
         # 加载WebP Quality设置
         quality_value = self.config_manager.get_output_quality()
         self.output_quality_slider.setValue(quality_value)
         self.output_quality_label.setText(f"{quality_value} %")
+        self.auto_quality_checkbox.setChecked(self.config_manager.get_auto_quality())
+
+        # 加载编码档位设置
+        profile_index = self.encode_profile_combo.findData(self.config_manager.get_encode_profile())
+        self.encode_profile_combo.setCurrentIndex(max(profile_index, 0))
+        self.target_filesize_input.setValue(self.config_manager.get_target_filesize())
+        self.keep_alpha_checkbox.setChecked(self.config_manager.get_keep_alpha())
+        output_formats = self.config_manager.get_output_formats()
+        for name, checkbox in self.output_format_checkboxes.items():
+            checkbox.setChecked(checkbox.isEnabled() and name in output_formats)
+
+        # 加载输出缓存设置
+        self.cache_enabled_checkbox.setChecked(self.config_manager.get_cache_enabled())
+        self.cache_max_size_input.setValue(self.config_manager.get_cache_max_size())
+        self.update_cache_stats()
+        self.metrics_log_input.setText(self.config_manager.get_metrics_log())
+
+    def get_selected_formats(self) -> list:
+        """获取选中的输出格式（未选择时使用 WebP）"""
+        formats = [name for name, checkbox in self.output_format_checkboxes.items() if checkbox.isChecked()]
+        return formats or [DEFAULT_OUTPUT_FORMAT]
+
+    def update_cache_stats(self, clear: bool = False) -> None:
+        """
+        更新输出缓存统计（clear 为 True 时先清空）
+
+        统计需要遍历整个缓存目录，在后台线程中执行，完成后通过 cache_stats_ready 信号更新界面
+        """
+        self.cache_stats_label.setText("Clearing..." if clear else "Counting...")
+        self.clear_cache_button.setEnabled(False)
+
+        def collect() -> None:
+            cache = OutputCache()
+            if clear:
+                cache.clear()
+            stats = cache.get_stats()
+            try:
+                self.cache_stats_ready.emit(stats)
+            except RuntimeError:
+                pass  # 对话框已关闭
+
+        threading.Thread(target=collect, name="cache-stats", daemon=True).start()
+
+    def on_cache_stats_ready(self, stats: dict) -> None:
+        """显示输出缓存统计"""
+        self.cache_stats_label.setText(
+            f"{stats['entries']} files, {format_filesize(stats['total_bytes'])}"
+        )
+        self.clear_cache_button.setEnabled(True)
+
+    def clear_cache(self) -> None:
+        """清空输出缓存"""
+        self.update_cache_stats(clear=True)
+
+    def update_ai_cache_stats(self) -> None:
+        """更新 AI 响应缓存统计（命中率为本次运行的统计）"""
+        cache = get_ai_service(self.config_manager).cache
+        if cache is None:
+            self.ai_cache_stats_label.setText("Unavailable")
+            self.clear_ai_cache_button.setEnabled(False)
+            return
+        stats = cache.get_stats()
+        self.ai_cache_stats_label.setText(
+            f"{stats['entries']} entries, {stats['hit_rate']:.0%} hit rate"
+        )
+
+    def clear_ai_cache(self) -> None:
+        """清空 AI 响应缓存"""
+        cache = get_ai_service(self.config_manager).cache
+        if cache is not None:
+            cache.clear()
+        self.update_ai_cache_stats()
     
     def save_settings(self):
         """保存界面设置"""
         self.config_manager.save_api_base_url(self.api_base_url_input.text().strip())
         self.config_manager.save_api_key(self.api_key_input.text().strip())
         self.config_manager.save_model_name(self.model_name_input.text().strip())
+        self.config_manager.save_rate_limit_rpm(self.rate_limit_rpm_input.value())
+        self.config_manager.save_rate_limit_tpm(self.rate_limit_tpm_input.value())
+        get_ai_service(self.config_manager).rate_limiter.set_limits(
+            self.rate_limit_rpm_input.value() or None, self.rate_limit_tpm_input.value() or None
+        )
         self.config_manager.save_system_prompt(self.system_prompt_input.toPlainText().strip())
+        self.config_manager.save_ai_cache_enabled(self.ai_cache_enabled_checkbox.isChecked())
         self.config_manager.save_output_quality(self.output_quality_slider.value())
+        self.config_manager.save_auto_quality(self.auto_quality_checkbox.isChecked())
+        self.config_manager.save_encode_profile(self.encode_profile_combo.currentData())
+        self.config_manager.save_target_filesize(self.target_filesize_input.value())
+        self.config_manager.save_keep_alpha(self.keep_alpha_checkbox.isChecked())
+        self.config_manager.save_output_formats(self.get_selected_formats())
+        self.config_manager.save_cache_enabled(self.cache_enabled_checkbox.isChecked())
+        self.config_manager.save_cache_max_size(self.cache_max_size_input.value())
+        self.config_manager.save_metrics_log(self.metrics_log_input.text().strip())
     
     def test_connection(self):
         """测试连接"""
@@ -216,5 +411,10 @@ class SettingsDialog(QDialog):
             "api_key": self.api_key_input.text().strip(),
             "model_name": self.model_name_input.text().strip(),
             "system_prompt": self.system_prompt_input.toPlainText().strip(),
-            "output_quality": self.output_quality_slider.value()
+            "output_quality": self.output_quality_slider.value(),
+            "auto_quality": self.auto_quality_checkbox.isChecked(),
+            "encode_profile": self.encode_profile_combo.currentData(),
+            "target_filesize_kb": self.target_filesize_input.value(),
+            "keep_alpha": self.keep_alpha_checkbox.isChecked(),
+            "output_formats": self.get_selected_formats()
         }
\ No newline at end of file
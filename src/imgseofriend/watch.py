@@ -0,0 +1,379 @@
+"""
+Image SEO Optimizer - 监视文件夹
+无界面地持续监视一个目录，新增或修改的图片写入完成后自动处理
+
+- 定期扫描目录（os.scandir，不依赖 inotify 等平台接口，网络共享目录同样适用）
+- 文件大小和修改时间在 settle 秒内保持不变才视为写入完成
+- 待处理文件进入队列，由固定大小的进程池处理，同时提交的任务数有上限，
+  一次放入上千个文件也不会为每个文件创建线程或进程
+- 处理结果记录在输出目录的处理清单（SQLite）中，重启后只处理新增或修改的文件，
+  处理参数变化时重新处理全部文件
+
+用法:
+    imgseofriend watch <src> [--dst <dir>] [--width 1200] [--quality 80] [--settle 2]
+"""
+
+import argparse
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Deque, Dict, List, Optional, Sequence, Set, Tuple
+
+from .batch import _init_worker, _process_job
+from .cache import DEFAULT_CACHE_MAX_SIZE_MB
+from .core import (
+    DEFAULT_ENCODE_PROFILE, ENCODE_PROFILES, OUTPUT_FOLDER_NAME, ImageResult, get_base_name,
+    is_image_file
+)
+from .encoders import DEFAULT_OUTPUT_FORMAT, ENCODERS, get_encoder
+from .manifest import MANIFEST_FILENAME, Manifest, get_job_settings, make_settings_key
+from .naming import DirectoryNameIndex
+
+# 文件签名：(大小, 修改时间 ns)
+Signature = Tuple[int, int]
+
+
+class FolderWatcher:
+    """
+    监视目录并处理新增或修改的图片
+
+    poll() 执行一轮：扫描、判断写入是否完成、提交任务、收集结果；run() 循环调用 poll()
+    """
+
+    def __init__(self, src: str, dst: Optional[str] = None,
+                 target_width: int = 1200, quality: int = 80,
+                 workers: Optional[int] = None,
+                 settle_seconds: float = 2.0,
+                 manifest_path: Optional[str] = None,
+                 use_cache: bool = True,
+                 cache_dir: Optional[str] = None,
+                 cache_max_size_mb: int = DEFAULT_CACHE_MAX_SIZE_MB,
+                 profile: str = DEFAULT_ENCODE_PROFILE,
+                 target_filesize: Optional[int] = None,
+                 auto_quality: bool = False,
+                 keep_alpha: bool = False,
+                 output_formats: Sequence[str] = (DEFAULT_OUTPUT_FORMAT,),
+                 verbose: bool = True):
+        """
+        Args:
+            src: 监视的目录
+            dst: 输出目录（默认为 src 下的 image-optimized，扫描时跳过）
+            settle_seconds: 文件大小和修改时间保持不变多久后才处理
+            manifest_path: 处理清单路径（默认为输出目录下的 .imgseofriend-manifest.db）
+            其余参数含义同 batch.run_batch
+        """
+        self.src = os.path.abspath(src)
+        self.dst = os.path.abspath(dst) if dst else os.path.join(self.src, OUTPUT_FOLDER_NAME)
+        self.settle_seconds = settle_seconds
+        self.verbose = verbose
+        self.manifest = Manifest(manifest_path or os.path.join(self.dst, MANIFEST_FILENAME))
+
+        self.output_formats = list(dict.fromkeys(output_formats))
+        self.extensions = [get_encoder(name).extension for name in self.output_formats]
+        self.job_options = (target_width, quality, None, profile, target_filesize, auto_quality,
+                            keep_alpha, self.output_formats, True)
+        self.settings = get_job_settings(target_width, quality, None, profile, target_filesize,
+                                         auto_quality, keep_alpha, self.output_formats)
+        self.settings_key = make_settings_key(self.settings)
+
+        self.workers = workers or os.cpu_count() or 1
+        # 同时提交到进程池的任务上限，其余在队列中等待
+        self.max_in_flight = self.workers * 2
+
+        self._initargs = (cache_dir, cache_max_size_mb if use_cache else None)
+        self._executor = self._create_executor()
+        self._indexes: Dict[str, DirectoryNameIndex] = {}
+        self._unsettled: Dict[str, Tuple[Signature, float]] = {}  # relpath -> (签名, 首次观察到该签名的时间)
+        self._queue: Deque[Tuple[str, Signature]] = deque()
+        self._queued: Set[str] = set()
+        self._in_flight: Dict[Future, Tuple[str, Signature, str]] = {}  # -> (relpath, 签名, 输出路径)
+        self._failed: Dict[str, Signature] = {}  # 处理失败的文件，签名变化后才重试
+        # 进程池崩溃时正在处理的文件 (relpath, 签名, 输出路径)：逐个单独重新处理，找出导致崩溃的文件
+        self._suspects: Deque[Tuple[str, Signature, str]] = deque()
+        self._isolated: Optional[str] = None  # 正在单独处理的文件
+        self._known: Dict[str, Signature] = {}  # 已确认无需处理的文件（避免每轮都查询清单）
+        self._pruned = False
+
+        self.processed = 0
+        self.failures: List[Tuple[str, str]] = []
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        """创建进程池"""
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                   initargs=self._initargs)
+
+    def _scan(self) -> Dict[str, Signature]:
+        """扫描源目录（跳过输出目录和隐藏目录），返回 {相对路径: 签名}"""
+        found = {}
+        stack = [self.src]
+        while stack:
+            directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if os.path.abspath(entry.path) != self.dst:
+                            stack.append(entry.path)
+                    elif is_image_file(entry.name):
+                        stat = entry.stat()
+                        relpath = os.path.relpath(entry.path, self.src)
+                        found[relpath] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+        return found
+
+    def _is_current(self, relpath: str, signature: Signature) -> bool:
+        """文件是否已按当前内容和参数处理过（每个文件首次出现或变化时查询一次清单）"""
+        if self._known.get(relpath) == signature:
+            return True
+        entry = self.manifest.get(os.path.join(self.src, relpath))
+        if self.manifest.is_current(entry, signature[0], signature[1], self.settings_key):
+            self._known[relpath] = signature
+            return True
+        return False
+
+    def _plan_output(self, relpath: str) -> str:
+        """分配输出路径：修改过的文件沿用上次的路径，新文件分配不冲突的文件名"""
+        entry = self.manifest.get(os.path.join(self.src, relpath))
+        if entry is not None:
+            return entry.output_path
+
+        output_dir = os.path.join(self.dst, os.path.dirname(relpath))
+        if output_dir not in self._indexes:
+            self._indexes[output_dir] = DirectoryNameIndex(output_dir)
+        base_name = get_base_name(relpath, "")
+        return self._indexes[output_dir].reserve_group(base_name, self.extensions, "",
+                                                       claim_on_disk=False)[0]
+
+    def _update_queue(self, found: Dict[str, Signature], now: float) -> None:
+        """记录变化的文件，签名保持 settle 秒不变后放入队列"""
+        for relpath in list(self._unsettled):
+            if relpath not in found:
+                del self._unsettled[relpath]
+        if not self._pruned:
+            # 移除停止监视期间被删除的源文件记录
+            for source in self.manifest.sources(self.src):
+                if os.path.relpath(source, self.src) not in found:
+                    self.manifest.remove(source)
+            self._pruned = True
+        for relpath in list(self._known):
+            if relpath not in found:
+                del self._known[relpath]
+                self.manifest.remove(os.path.join(self.src, relpath))
+        for relpath in list(self._failed):
+            if found.get(relpath) != self._failed[relpath]:
+                del self._failed[relpath]
+
+        busy = self._queued | {relpath for relpath, _, _ in self._in_flight.values()}
+        for relpath, signature in found.items():
+            if relpath in busy or relpath in self._failed or self._is_current(relpath, signature):
+                continue
+            seen = self._unsettled.get(relpath)
+            if seen is None or seen[0] != signature:
+                # 新文件或仍在写入：重新计时
+                self._unsettled[relpath] = seen = (signature, now)
+            if now - seen[1] >= self.settle_seconds:
+                del self._unsettled[relpath]
+                self._queue.append((relpath, signature))
+                self._queued.add(relpath)
+
+    def _submit(self) -> None:
+        """从队列中提交任务，直到达到同时处理的上限（有崩溃嫌疑的文件先逐个单独处理）"""
+        if self._suspects:
+            if not self._in_flight:
+                relpath, signature, output_path = self._suspects.popleft()
+                self._queued.discard(relpath)
+                self._isolated = relpath
+                self._submit_job(relpath, signature, output_path)
+            return
+        while self._queue and len(self._in_flight) < self.max_in_flight:
+            relpath, signature = self._queue.popleft()
+            self._queued.discard(relpath)
+            self._submit_job(relpath, signature, self._plan_output(relpath))
+
+    def _submit_job(self, relpath: str, signature: Signature, output_path: str) -> None:
+        """提交一个文件到进程池"""
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        job = (os.path.join(self.src, relpath), output_path) + self.job_options
+        self._in_flight[self._executor.submit(_process_job, job)] = (relpath, signature, output_path)
+
+    def _collect(self, timeout: Optional[float] = 0) -> None:
+        """收集已完成的任务"""
+        if not self._in_flight:
+            return
+        done, _ = wait(list(self._in_flight), timeout=timeout, return_when=FIRST_COMPLETED)
+        broken = False
+        for future in done:
+            broken |= self._finish(future)
+        if broken:
+            # 进程池损坏后其余处理中的任务也会失败：全部收集后重建进程池，继续监视
+            for future in wait(list(self._in_flight)).done:
+                self._finish(future)
+            self._executor.shutdown(wait=False)
+            self._executor = self._create_executor()
+
+    def _finish(self, future: Future) -> bool:
+        """处理一个已完成的任务，返回进程池是否已损坏"""
+        relpath, signature, output_path = self._in_flight.pop(future)
+        isolated = relpath == self._isolated
+        if isolated:
+            self._isolated = None
+        try:
+            source, results, error_message, source_hash, metrics = future.result()
+        except BrokenProcessPool:
+            # 工作进程崩溃（例如解码器出错）：同时处理的文件都会失败，无法确定是哪个文件导致，
+            # 先逐个单独重新处理，单独处理时仍然崩溃的文件记为失败
+            source = os.path.join(self.src, relpath)
+            if isolated:
+                self._fail(relpath, signature, source, "worker process crashed")
+            else:
+                print(f"[WATCH] Worker process crashed while processing {source}, retrying alone")
+                self._suspects.append((relpath, signature, output_path))
+                self._queued.add(relpath)
+            return True
+        if results:
+            self._record(relpath, signature, output_path, results, source_hash, metrics)
+        else:
+            self._fail(relpath, signature, source, error_message)
+        return False
+
+    def _fail(self, relpath: str, signature: Signature, source: str, error_message: str) -> None:
+        """记录处理失败的文件（文件再次修改后才重新尝试）"""
+        self._failed[relpath] = signature
+        self.failures.append((source, error_message))
+        print(f"[WATCH] {source} failed: {error_message}")
+
+    def _record(self, relpath: str, signature: Signature, output_path: str,
+                results: List[ImageResult], source_hash: str, metrics: Dict) -> None:
+        """记录处理成功的文件"""
+        self.processed += 1
+        self.manifest.record(os.path.join(self.src, relpath), signature[0], signature[1], source_hash,
+                             self.settings, output_path,
+                             [result.processed_path for result in results], metrics=metrics)
+        self._known[relpath] = signature
+        if self.verbose:
+            outputs = ", ".join(result.processed_path for result in results)
+            print(f"[WATCH] {os.path.join(self.src, relpath)} -> {outputs}")
+
+    def poll(self, now: Optional[float] = None) -> None:
+        """执行一轮扫描和调度"""
+        self._update_queue(self._scan(), time.monotonic() if now is None else now)
+        self._collect()
+        self._submit()
+        self.manifest.commit()
+
+    def get_pending_count(self) -> int:
+        """尚未完成的文件数（等待写入完成、排队中和处理中）"""
+        return len(self._unsettled) + len(self._queue) + len(self._suspects) + len(self._in_flight)
+
+    def drain(self) -> None:
+        """等待已排队和处理中的任务全部完成"""
+        while self._queue or self._suspects or self._in_flight:
+            self._submit()
+            self._collect(timeout=None)
+        self.manifest.commit()
+
+    def run(self, interval: float = 1.0, max_polls: Optional[int] = None) -> None:
+        """循环扫描，直到 Ctrl+C（或执行 max_polls 轮）"""
+        polls = 0
+        try:
+            while max_polls is None or polls < max_polls:
+                self.poll()
+                polls += 1
+                # 有任务在处理时等待其完成或下一轮扫描，否则直接休眠
+                deadline = time.monotonic() + interval
+                while self._in_flight and time.monotonic() < deadline:
+                    self._collect(timeout=max(deadline - time.monotonic(), 0))
+                    self._submit()
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    time.sleep(remaining)
+        except KeyboardInterrupt:
+            if self.verbose:
+                print("[WATCH] Stopping, waiting for running jobs...")
+            self._queue.clear()
+            self._suspects.clear()
+            self._queued.clear()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        """等待处理中的任务，关闭处理清单和进程池"""
+        while self._in_flight:
+            self._collect(timeout=None)
+        self.manifest.close()
+        self._executor.shutdown()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """命令行入口"""
+    parser = argparse.ArgumentParser(
+        prog="imgseofriend watch",
+        description="Watch a folder and convert new or changed images as they land"
+    )
+    parser.add_argument("src", help="folder to watch")
+    parser.add_argument("--dst", default=None,
+                        help=f"output directory (default: <src>/{OUTPUT_FOLDER_NAME})")
+    parser.add_argument("--width", type=int, default=1200, help="target width in px (default: 1200)")
+    parser.add_argument("--quality", type=int, default=80, help="output quality 1-100 (default: 80)")
+    parser.add_argument("--formats", default=DEFAULT_OUTPUT_FORMAT,
+                        help=f"comma-separated output formats from: {', '.join(ENCODERS)} "
+                             f"(default: {DEFAULT_OUTPUT_FORMAT})")
+    parser.add_argument("--keep-alpha", action="store_true",
+                        help="keep transparency instead of flattening onto white")
+    parser.add_argument("--auto-quality", action="store_true",
+                        help="pick quality per image from its complexity (ignores --quality)")
+    parser.add_argument("--target-kb", type=int, default=None,
+                        help="search the highest quality that keeps each output under this size")
+    parser.add_argument("--profile", choices=list(ENCODE_PROFILES), default=DEFAULT_ENCODE_PROFILE,
+                        help=f"encoder speed/size trade-off (default: {DEFAULT_ENCODE_PROFILE})")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--settle", type=float, default=2.0,
+                        help="seconds a file must stay unchanged before processing (default: 2)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between scans (default: 1)")
+    parser.add_argument("--manifest", default=None,
+                        help=f"manifest database (default: <dst>/{MANIFEST_FILENAME})")
+    parser.add_argument("--no-cache", action="store_true", help="disable the output cache")
+    parser.add_argument("--quiet", action="store_true", help="only print failures")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.src):
+        parser.error(f"source directory not found: {args.src}")
+    if args.width <= 0:
+        parser.error("width must be greater than 0")
+    if not 1 <= args.quality <= 100:
+        parser.error("quality must be between 1 and 100")
+    if args.target_kb is not None and args.target_kb <= 0:
+        parser.error("target size must be greater than 0")
+
+    output_formats = [name.strip().lower() for name in args.formats.split(",") if name.strip()]
+    if not output_formats:
+        parser.error("at least one output format is required")
+    for name in output_formats:
+        try:
+            get_encoder(name)
+        except ValueError as e:
+            parser.error(str(e))
+
+    watcher = FolderWatcher(args.src, args.dst, args.width, args.quality, workers=args.workers,
+                            settle_seconds=args.settle, manifest_path=args.manifest,
+                            use_cache=not args.no_cache, profile=args.profile,
+                            target_filesize=args.target_kb * 1024 if args.target_kb else None,
+                            auto_quality=args.auto_quality, keep_alpha=args.keep_alpha,
+                            output_formats=output_formats, verbose=not args.quiet)
+    print(f"[WATCH] Watching {watcher.src} -> {watcher.dst} (Ctrl+C to stop)")
+    watcher.run(interval=args.interval)
+    print(f"[WATCH] Processed {watcher.processed} images, {len(watcher.failures)} failures")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,57 +1,42 @@
+import json
 import os
-import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, List, Optional
 from PySide6.QtCore import QThread, Signal
-from PIL import Image
-from pillow_heif import register_heif_opener
-from .ai_service import AIService
+from .ai_service import AIService, get_ai_service
+from .cache import OutputCache
 from .config_manager import ConfigManager
-
-# 注册 HEIF 图片格式支持
-register_heif_opener()
-
-
-class ImageResult:
-    """图片处理结果类"""
-    
-    def __init__(self, original_path: str, processed_path: str, 
-                 original_size: Tuple[int, int], processed_size: Tuple[int, int],
-                 original_filesize: int, processed_filesize: int):
-        self.original_path = original_path
-        self.processed_path = processed_path
-        self.original_size = original_size  # (width, height)
-        self.processed_size = processed_size  # (width, height)
-        self.original_filesize = original_filesize  # bytes
-        self.processed_filesize = processed_filesize  # bytes
-    
-    def get_compression_ratio(self) -> float:
-        """获取压缩比例"""
-        if self.original_filesize == 0:
-            return 0
-        return (1 - self.processed_filesize / self.original_filesize) * 100
-    
-    def get_size_info(self) -> str:
-        """获取尺寸信息字符串"""
-        return (f"Original: {self.original_size[0]}x{self.original_size[1]}, "
-                f"{self._format_filesize(self.original_filesize)}")
+from .core import (
+    OUTPUT_FOLDER_NAME, EncodedImage, ImageResult, convert_image_formats, get_base_name,
+    normalize_filename, process_image, process_variants, rename_processed_image, save_encoded_formats
+)
+from .metrics import JobMetrics, append_jsonl, measure
+from .naming import clear_name_indexes
 
 
 class ImageWorker(QThread):
     """
     图片处理工作线程
-    负责图片 resize、WebP 转换和 AI SEO 数据生成
+    Qt 适配层：图片处理由 core 模块完成，本类负责读取配置、调用 AI 并通过信号报告结果
     """
     
     # 信号定义
     finished = Signal(object, dict)  # image_result, ai_result
     error = Signal(str)  # error_message
     progress = Signal(str)  # progress_message
+    variants_finished = Signal(list)  # srcset 模式：按宽度排序的 ImageResult 列表
+    metrics = Signal(dict)  # 任务结束时的阶段计时（JobMetrics.to_dict()）
+    ai_partial = Signal(dict)  # 流式生成中已到达的 title / alt_text（可能不完整）
     
     def __init__(self, image_path: str, keyword: str, target_width: int,
                  config_manager: Optional[ConfigManager] = None, 
                  output_directory: Optional[str] = None,
-                 process_mode: str = "image_only"):  # "image_only" or "with_ai"
+                 process_mode: str = "image_only",  # "image_only", "with_ai", "ai_only" or "srcset"
+                 target_widths: Optional[List[int]] = None,
+                 image_result: Optional[ImageResult] = None,
+                 ai_service: Optional[AIService] = None,
+                 bypass_ai_cache: bool = False):
         super().__init__()
         
         # 输入参数
@@ -60,136 +45,128 @@ class ImageWorker(QThread):
         self.target_width = target_width
         self.output_directory = output_directory
         self.process_mode = process_mode
+        self.target_widths = target_widths or [target_width]
+        self.image_result = image_result  # ai_only 模式：复用已有的处理结果
+        self.bypass_ai_cache = bypass_ai_cache  # 忽略 AI 响应缓存，强制重新生成
         
-        # 服务对象
+        # 服务对象（默认使用进程内共享的 AIService，连接在任务之间复用）
         self.config_manager = config_manager or ConfigManager()
-        self.ai_service = AIService(self.config_manager)
+        self.ai_service = ai_service or get_ai_service(self.config_manager)
         
         # 处理参数
         self.output_quality = self.config_manager.get_output_quality()
+        self.encode_profile = self.config_manager.get_encode_profile()
+        self.auto_quality = self.config_manager.get_auto_quality()
+        self.keep_alpha = self.config_manager.get_keep_alpha()
+        self.output_formats = self.config_manager.get_output_formats()
+        target_filesize_kb = self.config_manager.get_target_filesize()
+        self.target_filesize = target_filesize_kb * 1024 if target_filesize_kb > 0 else None
+        self.output_cache = None
+        if self.config_manager.get_cache_enabled():
+            self.output_cache = OutputCache(max_size_mb=self.config_manager.get_cache_max_size())
+        self.metrics_log = self.config_manager.get_metrics_log()
+        self.job_metrics = JobMetrics(self.image_path, self.process_mode)
     
-    def _ensure_output_directory(self) -> str:
-        """确保输出目录存在"""
-        if self.output_directory:
-            output_dir = Path(self.output_directory)
-        else:
-            # 在原图片路径下创建 image-optimized 文件夹
-            input_path = Path(self.image_path)
-            output_dir = input_path.parent / "image-optimized"
-        
-        output_dir.mkdir(exist_ok=True)
-        return str(output_dir)
+    def _get_output_directory(self) -> str:
+        """本任务写入的输出目录（不创建）"""
+        if self.process_mode == "ai_only" and self.image_result is not None:
+            return str(Path(self.image_result.processed_path).parent)
+        return self.output_directory or str(Path(self.image_path).parent / OUTPUT_FOLDER_NAME)
     
-    def _get_output_filename(self, keyword: str) -> str:
-        """生成输出文件名，处理重名冲突"""
-        output_dir = self._ensure_output_directory()
-        
-        # 如果没有关键词，使用原文件名
-        if not keyword or keyword.strip() == "":
-            input_path = Path(self.image_path)
-            base_name = input_path.stem + ".webp"
-        else:
-            # 清理关键词作为文件名
-            clean_keyword = "".join(c for c in keyword if c.isalnum() or c in (' ', '-', '_')).strip()
-            clean_keyword = clean_keyword.replace(' ', '-').lower()
-            
-            if not clean_keyword:
-                clean_keyword = "optimized"
+    def _process_image(self) -> Optional[ImageResult]:
+        """处理图片：resize 和格式转换（多个格式并行编码）"""
+        try:
+            return process_image(
+                self.image_path,
+                self.keyword,
+                self.target_width,
+                self.output_quality,
+                output_directory=self.output_directory,
+                progress=self.progress.emit,
+                cache=self.output_cache,
+                profile=self.encode_profile,
+                target_filesize=self.target_filesize,
+                auto_quality=self.auto_quality,
+                keep_alpha=self.keep_alpha,
+                output_formats=self.output_formats,
+                metrics=self.job_metrics
+            )
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
             
-            base_name = f"{clean_keyword}.webp"
-        
-        output_path = Path(output_dir) / base_name
-        
-        # 检查文件是否存在，如果存在则添加序号
-        counter = 1
-        while output_path.exists():
-            if not keyword or keyword.strip() == "":
-                input_path = Path(self.image_path)
-                base_name = f"{input_path.stem}-{counter}.webp"
-            else:
-                clean_keyword = "".join(c for c in keyword if c.isalnum() or c in (' ', '-', '_')).strip()
-                clean_keyword = clean_keyword.replace(' ', '-').lower()
-                if not clean_keyword:
-                    clean_keyword = "optimized"
-                base_name = f"{clean_keyword}-{counter}.webp"
-            output_path = Path(output_dir) / base_name
-            counter += 1
+            error_msg = f"Image processing failed: {str(e)}"
+            self.progress.emit(error_msg)
+            self.error.emit(error_msg)
+            return None
+
+    def _encode_image(self) -> List[EncodedImage]:
+        """
+        在内存中完成 resize 和编码（文件名确定后再写入）
         
-        return str(output_path)
+        失败时抛出异常：与之并行的 AI 请求结束后才由调用方发出 error 信号
+        """
+        return convert_image_formats(
+            self.image_path,
+            self.target_width,
+            self.output_quality,
+            self.output_formats,
+            progress=self.progress.emit,
+            cache=self.output_cache,
+            profile=self.encode_profile,
+            target_filesize=self.target_filesize,
+            auto_quality=self.auto_quality,
+            keep_alpha=self.keep_alpha,
+            metrics=self.job_metrics
+        )
     
-    def _process_image(self) -> Optional[ImageResult]:
-        """处理图片：resize 和 WebP 转换"""
-        img = None
+    def _save_with_title(self, encoded_list: List[EncodedImage],
+                         ai_result: Dict[str, str]) -> Optional[ImageResult]:
+        """按 AI Title（失败时按关键词）一次性写入最终文件名"""
+        if ai_result and ai_result.get("title"):
+            base_name = normalize_filename(ai_result["title"])
+        else:
+            base_name = get_base_name(self.image_path, self.keyword)
+
         try:
-            self.progress.emit("Loading image...")
-            
-            # 打开原始图片
-            img = Image.open(self.image_path)
-            
-            # 获取原始信息
-            original_size = img.size
-            original_filesize = os.path.getsize(self.image_path)
-            
-            self.progress.emit("Processing image...")
-            
-            # 计算新尺寸（保持宽高比）
-            if img.width > self.target_width:
-                ratio = self.target_width / img.width
-                new_height = int(img.height * ratio)
-                new_size = (self.target_width, new_height)
-            else:
-                new_size = img.size
-            
-            # 处理图片模式（转换为 RGB）
-            if img.mode in ('RGBA', 'LA', 'P'):
-                # 创建白色背景
-                background = Image.new('RGB', img.size, (255, 255, 255))
-                if img.mode == 'P':
-                    img = img.convert('RGBA')
-                background.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                img.close()
-                img = background
-            
-            # Resize 图片
-            if new_size != img.size:
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
-            
-            # 生成输出文件名
-            output_path = self._get_output_filename(self.keyword)
-            
-            self.progress.emit("Saving as WebP...")
-            
-            # 保存为 WebP（移除元数据以减小文件大小）
-            img.save(output_path, 'WebP', quality=self.output_quality, method=6)
-            
-            # 获取处理后文件信息
-            processed_filesize = os.path.getsize(output_path)
-            processed_size = new_size
-            
-            # 关闭图片
-            img.close()
-            img = None
-            
-            self.progress.emit("Image processing completed!")
+            self.progress.emit("Saving output...")
+            image_result = save_encoded_formats(
+                encoded_list,
+                self.image_path,
+                output_directory=self.output_directory,
+                base_name=base_name,
+                metrics=self.job_metrics
+            )[0]
+            self.progress.emit(f"File saved as: {Path(image_result.processed_path).name}")
+            return image_result
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
             
-            result = ImageResult(
-                original_path=self.image_path,
-                processed_path=output_path,
-                original_size=original_size,
-                processed_size=processed_size,
-                original_filesize=original_filesize,
-                processed_filesize=processed_filesize
+            error_msg = f"Saving image failed: {str(e)}"
+            self.progress.emit(error_msg)
+            self.error.emit(error_msg)
+            return None
+
+    def _process_variants(self) -> Optional[List[ImageResult]]:
+        """一次解码生成多个宽度的响应式图片（使用第一个输出格式）"""
+        try:
+            return process_variants(
+                self.image_path,
+                self.keyword,
+                self.target_widths,
+                self.output_quality,
+                output_directory=self.output_directory,
+                progress=self.progress.emit,
+                profile=self.encode_profile,
+                keep_alpha=self.keep_alpha,
+                output_format=self.output_formats[0],
+                metrics=self.job_metrics
             )
-            return result
-                
-        except Exception:
-            pass
+        except Exception as e:
             import traceback
             traceback.print_exc()
             
-            if img:
-                img.close()
-                
             error_msg = f"Image processing failed: {str(e)}"
             self.progress.emit(error_msg)
             self.error.emit(error_msg)
@@ -204,7 +181,11 @@ class ImageWorker(QThread):
             filename = Path(self.image_path).stem
             
             # 调用 AI 服务
-            ai_result = self.ai_service.generate_seo_data(self.keyword, filename)
+            with measure(self.job_metrics, "ai") as record:
+                ai_result = self.ai_service.generate_seo_data(self.keyword, filename,
+                                                              bypass_cache=self.bypass_ai_cache,
+                                                              on_partial=self.ai_partial.emit)
+                record["bytes"] = len(json.dumps(ai_result or {}).encode())
             
             if ai_result and ai_result.get("title") and ai_result.get("alt_text"):
                 self.progress.emit("SEO data generated!")
@@ -228,9 +209,59 @@ class ImageWorker(QThread):
                 "alt_text": f"Optimized image of {self.keyword}"
             }
     
+    def _rename_by_title(self, image_result: ImageResult, ai_result: Dict[str, str]) -> None:
+        """根据 AI 生成的 Title 重命名输出文件"""
+        if not ai_result or not ai_result.get("title"):
+            return
+
+        self.progress.emit("Renaming file based on AI title...")
+        try:
+            new_path = rename_processed_image(image_result, ai_result["title"], metrics=self.job_metrics)
+            self.progress.emit(f"File renamed to: {Path(new_path).name}")
+        except Exception as rename_error:
+            self.progress.emit(f"Warning: Failed to rename file: {rename_error}")
+
+    def _run_ai_only(self) -> None:
+        """仅重新生成 AI 数据：不读取、不处理图片，只重命名已有的输出文件"""
+        if self.image_result is None or not os.path.exists(self.image_result.processed_path):
+            self.error.emit("No processed image to regenerate SEO data for")
+            return
+
+        if not self.keyword.strip():
+            self.error.emit("Keyword is required for AI processing")
+            return
+
+        ai_result = self._generate_ai_data()
+        self._rename_by_title(self.image_result, ai_result)
+        self.job_metrics.ok = True
+        self.finished.emit(self.image_result, ai_result)
+
     def run(self):
         """线程主方法"""
+        # 只有发出完成信号的任务计为成功
+        self.job_metrics = JobMetrics(self.image_path, self.process_mode)
+        self.job_metrics.ok = False
+        # 界面长时间运行，输出文件可能在应用外被删除或移动：每个任务重新扫描输出目录的文件名索引
+        clear_name_indexes(self._get_output_directory())
+        try:
+            self._run()
+        finally:
+            self._emit_metrics()
+
+    def _emit_metrics(self) -> None:
+        """发出阶段计时，并按配置追加到 JSON Lines 日志"""
+        record = self.job_metrics.to_dict()
+        self.metrics.emit(record)
+        if self.metrics_log:
+            append_jsonl(self.metrics_log, record)
+
+    def _run(self) -> None:
+        """执行任务（错误通过 error 信号发出）"""
         try:
+            if self.process_mode == "ai_only":
+                self._run_ai_only()
+                return
+
             # 验证输入参数
             if not os.path.exists(self.image_path):
                 self.error.emit(f"Image file not found: {self.image_path}")
@@ -241,37 +272,53 @@ class ImageWorker(QThread):
                 self.error.emit("Keyword is required for AI processing")
                 return
             
-            if self.target_width <= 0:
+            if self.target_width <= 0 or any(width <= 0 for width in self.target_widths):
                 self.error.emit("Target width must be greater than 0")
                 return
             
-            # 处理图片
-            image_result = self._process_image()
-            if image_result is None:
-                return  # 错误已通过 error 信号发出
+            # srcset 模式：一次解码生成全部宽度
+            if self.process_mode == "srcset":
+                variant_results = self._process_variants()
+                if variant_results is not None:
+                    self.job_metrics.ok = True
+                    self.variants_finished.emit(variant_results)
+                return
             
-            # 根据处理模式决定是否生成 AI 数据
             ai_result = None
             if self.process_mode == "with_ai":
-                ai_result = self._generate_ai_data()
+                # AI 请求只依赖关键词和文件名，与图片解码/编码并行执行
+                # （Pillow 编码和网络请求都会释放 GIL）
+                ai_executor = ThreadPoolExecutor(max_workers=1)
+                ai_future = ai_executor.submit(self._generate_ai_data)
                 
-                # 如果AI生成成功，根据Title重命名文件
-                if ai_result and ai_result.get("title"):
-                    self.progress.emit("Renaming file based on AI title...")
-                    new_filename = self._normalize_filename(ai_result["title"])
-                    new_path = Path(image_result.processed_path).parent / f"{new_filename}.webp"
+                # 图片先编码到内存
+                try:
+                    encoded_list = self._encode_image()
+                except Exception as e:
+                    import traceback
+                    traceback.print_exc()
                     
-                    # 重命名文件
-                    try:
-                        import shutil
-                        shutil.move(image_result.processed_path, str(new_path))
-                        # 更新结果中的路径
-                        image_result.processed_path = str(new_path)
-                        self.progress.emit(f"File renamed to: {new_filename}.webp")
-                    except Exception as rename_error:
-                        self.progress.emit(f"Warning: Failed to rename file: {rename_error}")
+                    # 未开始的 AI 请求直接取消，已开始的等待其结束（结果丢弃），之后再发出 error 信号
+                    ai_future.cancel()
+                    ai_executor.shutdown(wait=True)
+                    error_msg = f"Image processing failed: {str(e)}"
+                    self.progress.emit(error_msg)
+                    self.error.emit(error_msg)
+                    return
+
+                # 两个阶段都完成后再决定最终文件名，只写入一次
+                ai_result = ai_future.result()
+                ai_executor.shutdown()
+                image_result = self._save_with_title(encoded_list, ai_result)
+            else:
+                # 处理图片
+                image_result = self._process_image()
+
+            if image_result is None:
+                return  # 错误已通过 error 信号发出
             
             # 发出完成信号
+            self.job_metrics.ok = True
             self.finished.emit(image_result, ai_result)
             
         except Exception as e:
@@ -279,40 +326,3 @@ class ImageWorker(QThread):
             traceback.print_exc()
             error_msg = f"Worker thread error: {str(e)}"
             self.error.emit(error_msg)
-    
-    @staticmethod
-    def _normalize_filename(title: str) -> str:
-        """标准化文件名"""
-        import re
-        
-        # 强制转换为小写
-        normalized = title.lower()
-        
-        # 空格和特殊字符替换为短横线
-        # 只保留字母、数字和短横线
-        normalized = re.sub(r'[^a-z0-9\s-]', '-', normalized)
-        
-        # 空格替换为短横线
-        normalized = normalized.replace(' ', '-')
-        
-        # 保持连续的短横线为单个
-        normalized = re.sub(r'-+', '-', normalized)
-        
-        # 移除首尾的短横线
-        normalized = normalized.strip('-')
-        
-        # 如果结果为空，使用默认名称
-        if not normalized:
-            normalized = "optimized-image"
-        
-        return normalized
-    
-    @staticmethod
-    def _format_filesize(size_bytes: int) -> str:
-        """格式化文件大小"""
-        if size_bytes < 1024:
-            return f"{size_bytes}B"
-        elif size_bytes < 1024 * 1024:
-            return f"{size_bytes / 1024:.1f}KB"
-        else:
-            return f"{size_bytes / (1024 * 1024):.1f}MB"
\ No newline at end of file
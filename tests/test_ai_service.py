@@ -0,0 +1,549 @@
+"""
+Tests for AIService against a local OpenAI-compatible server
+"""
+
+import unittest
+import sys
+import os
+import json
+import re
+import threading
+import time
+import asyncio
+import random
+import subprocess
+import tempfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from imgseofriend.ai_async import AsyncAIService
+from imgseofriend.ai_cache import AIResponseCache
+from imgseofriend import ai_service
+from imgseofriend.ai_service import BATCH_SYSTEM_PROMPT_SUFFIX, AIService
+from imgseofriend.rate_limit import RateLimiter, parse_reset
+
+
+class FakeConfig:
+    """只提供 AIService 需要的配置项（不读写用户配置）"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.cache_enabled = True
+
+    def get_api_base_url(self) -> str:
+        return self.base_url
+
+    def get_api_key(self) -> str:
+        return "test-key"
+
+    def get_model_name(self) -> str:
+        return "test-model"
+
+    def get_system_prompt(self) -> str:
+        return "You write SEO titles."
+
+    def get_ai_cache_enabled(self) -> bool:
+        return self.cache_enabled
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """/chat/completions：按用户消息中的关键词返回 title 和 alt_text"""
+
+    protocol_version = "HTTP/1.1"  # 支持 keep-alive
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests.append(payload)
+        prompt = payload["messages"][-1]["content"]
+        if "JSON array" in prompt:
+            self._send_batch(prompt)
+            return
+        keyword = prompt.split("'")[1]
+        if keyword in self.server.rate_limit_once:
+            self.server.rate_limit_once.discard(keyword)
+            self._send_json({"error": {"message": "Rate limit reached"}}, status=429,
+                            headers={"Retry-After": "0.2", "x-ratelimit-remaining-requests": "0"})
+            return
+        with self.server.lock:
+            self.server.active += 1
+            self.server.max_active = max(self.server.max_active, self.server.active)
+        try:
+            time.sleep(self.server.delays.get(keyword, self.server.delay))
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+        content = json.dumps({"title": f"{keyword.title()} Photo", "alt_text": f"Photo of {keyword}"})
+        if payload.get("stream"):
+            self._send_stream(content)
+            return
+        self._send_json({"choices": [{"message": {"role": "assistant", "content": content}}]},
+                        trickle=self.server.trickle.get(keyword, 0.0))
+
+    def _send_stream(self, content):
+        """流式请求：每 4 个字符一个 SSE 事件（chunked 编码，连接保持可用）"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [{"choices": [{"delta": {"role": "assistant"}}]}]
+        events += [{"choices": [{"delta": {"content": content[i:i + 4]}}]} for i in range(0, len(content), 4)]
+        for event in events + ["[DONE]"]:
+            data = event if isinstance(event, str) else json.dumps(event)
+            chunk = f"data: {data}\n\n".encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_batch(self, prompt):
+        """批量请求：返回 JSON 数组，drop_once 中的关键词第一次不返回"""
+        entries = []
+        for number, keyword in re.findall(r"^(\d+)\. keyword: '(.*?)'", prompt, re.MULTILINE):
+            if keyword in self.server.drop_once:
+                self.server.drop_once.discard(keyword)
+                continue
+            entry_id = number if self.server.string_ids else int(number)
+            entries.append({"id": entry_id, "title": f"{keyword.title()} Photo", "alt_text": f"Photo of {keyword}"})
+        content = "```json\n" + json.dumps(entries) + "\n```"
+        self._send_json({"choices": [{"message": {"role": "assistant", "content": content}}]})
+
+    def _send_json(self, data, status=200, headers=None, trickle=0.0):
+        """发送 JSON 响应（trickle 大于 0 时响应体分 10 段在 trickle 秒内发送）"""
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if not trickle:
+            self.wfile.write(body)
+            return
+        step = -(-len(body) // 10)
+        for start in range(0, len(body), step):
+            self.wfile.write(body[start:start + step])
+            self.wfile.flush()
+            time.sleep(trickle / 10)
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """在后台线程中运行的本地服务"""
+
+    daemon_threads = True
+
+    def __init__(self, handler=FakeOpenAIHandler):
+        super().__init__(("127.0.0.1", 0), handler)
+        self.requests = []
+        self.delay = 0.0  # 每个请求的处理时间（秒）
+        self.delays = {}  # 按关键词指定处理时间
+        self.trickle = {}  # 按关键词指定响应体逐段发送的总时间（秒）
+        self.drop_once = set()  # 批量请求中第一次省略的关键词
+        self.string_ids = False  # 批量响应中的 id 写成字符串
+        self.rate_limit_once = set()  # 第一次返回 429 的关键词
+        self.lock = threading.Lock()
+        self.active = 0
+        self.max_active = 0  # 同时处理的最大请求数
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/v1"
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class TestAIServiceClient(unittest.TestCase):
+    """测试 AI 服务的连接复用"""
+
+    def setUp(self):
+        self.server = FakeOpenAIServer()
+        self.service = AIService(FakeConfig(self.server.base_url))
+
+    def tearDown(self):
+        self.service.close()
+        self.server.stop()
+
+    def test_generate_reuses_connection(self):
+        """测试连续请求复用同一个 keep-alive 连接"""
+        for keyword in ["black tote", "red dress", "brass lamp"]:
+            result = self.service.generate_seo_data(keyword)
+            self.assertEqual(result["title"], f"{keyword.title()} Photo")
+
+        stats = self.service.get_connection_stats()
+        self.assertEqual(stats, {"requests": 3, "connections": 1, "reused": 2})
+
+    def test_shared_across_threads(self):
+        """测试多个线程共用一个实例"""
+        results = []
+        threads = [threading.Thread(target=lambda i=i: results.append(self.service.generate_seo_data(f"item {i}")))
+                   for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(result["alt_text"] for result in results),
+                         [f"Photo of item {i}" for i in range(8)])
+        stats = self.service.get_connection_stats()
+        self.assertEqual(stats["requests"], 8)
+        self.assertLessEqual(stats["connections"], 8)
+
+    def test_streaming_reports_partial_results(self):
+        """测试流式生成：title 逐段到达，最终结果完整，读完响应前一直占用并发名额，连接仍可复用"""
+        partials = []
+        in_flight = []
+
+        def on_partial(partial):
+            partials.append(partial)
+            in_flight.append(self.service.rate_limiter.get_stats()["in_flight"])
+
+        result = self.service.generate_seo_data("black tote", on_partial=on_partial)
+
+        self.assertEqual(result, {"title": "Black Tote Photo", "alt_text": "Photo of black tote"})
+        self.assertTrue(self.server.requests[0]["stream"])
+        titles = [partial["title"] for partial in partials if "title" in partial]
+        self.assertGreater(len(titles), 2)
+        self.assertTrue(all("Black Tote Photo".startswith(title) for title in titles))
+        self.assertEqual(partials[-1], result)
+        self.assertEqual(set(in_flight), {1})
+        self.assertEqual(self.service.rate_limiter.get_stats()["in_flight"], 0)
+
+        self.service.generate_seo_data("red dress")
+        self.assertEqual(self.service.get_connection_stats()["connections"], 1)
+
+    def test_streaming_retry_releases_connection(self):
+        """测试流式请求收到 429 时关闭响应，重试复用同一个连接"""
+        self.server.rate_limit_once = {"black tote"}
+        result = self.service.generate_seo_data("black tote", on_partial=lambda partial: None)
+
+        self.assertEqual(result["title"], "Black Tote Photo")
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertEqual(self.service.get_connection_stats()["connections"], 1)
+
+    def test_rate_limited_waits_for_retry_after(self):
+        """测试 429 按 Retry-After 等待后重试，并减少并发数"""
+        self.server.rate_limit_once = {"black tote"}
+        start = time.perf_counter()
+        result = self.service.generate_seo_data("black tote")
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(result["title"], "Black Tote Photo")
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 1.0)
+        stats = self.service.rate_limiter.get_stats()
+        self.assertEqual(stats["rate_limited"], 1)
+        self.assertEqual(stats["concurrency"], 8)
+
+    def test_batch_reasks_only_missing_items(self):
+        """测试批量生成：一个请求返回多个结果，只重新请求缺失的条目"""
+        self.server.drop_once = {"item 2"}
+        items = [(f"item {i}", f"IMG_{i:03d}") for i in range(5)]
+        results = self.service.generate_seo_batch(items, batch_size=5)
+
+        self.assertEqual([result["title"] for result in results], [f"Item {i} Photo" for i in range(5)])
+        self.assertEqual(len(self.server.requests), 2)
+        self.assertIn("(file: IMG_000)", self.server.requests[0]["messages"][-1]["content"])
+        reask = self.server.requests[1]["messages"][-1]["content"]
+        self.assertIn("1. keyword: 'item 2'", reask)
+        self.assertNotIn("item 0", reask)
+
+    def test_batch_overrides_single_object_prompt(self):
+        """测试批量请求的系统提示词改为要求 JSON 数组，字符串 id 也能对应到条目"""
+        self.server.string_ids = True
+        items = [(f"item {i}", "") for i in range(3)]
+        results = self.service.generate_seo_batch(items)
+
+        self.assertEqual([result["title"] for result in results], [f"Item {i} Photo" for i in range(3)])
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn(BATCH_SYSTEM_PROMPT_SUFFIX, self.server.requests[0]["messages"][0]["content"])
+
+
+class TestAIResponseCache(unittest.TestCase):
+    """测试 AI 响应缓存"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.server = FakeOpenAIServer()
+        self.config = FakeConfig(self.server.base_url)
+        self.cache = AIResponseCache(os.path.join(self.temp_dir.name, "ai.db"))
+        self.service = AIService(self.config, cache=self.cache)
+
+    def tearDown(self):
+        self.service.close()
+        self.server.stop()
+        self.temp_dir.cleanup()
+
+    def test_repeated_keyword_hits_cache(self):
+        """测试重复的关键词（忽略大小写和空白）不再请求"""
+        first = self.service.generate_seo_data("black tote")
+        second = self.service.generate_seo_data("  Black   Tote ")
+
+        self.assertEqual(second, first)
+        self.assertEqual(len(self.server.requests), 1)
+        stats = self.cache.get_stats()
+        self.assertEqual((stats["entries"], stats["hits"], stats["misses"]), (1, 1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_bypass_and_disabled(self):
+        """测试 bypass_cache 和在设置中关闭缓存时重新请求"""
+        self.service.generate_seo_data("black tote")
+        self.service.generate_seo_data("black tote", bypass_cache=True)
+        self.assertEqual(len(self.server.requests), 2)
+
+        self.config.cache_enabled = False
+        self.service.generate_seo_data("black tote")
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_model_change_misses(self):
+        """测试更换模型后不使用旧结果"""
+        self.service.generate_seo_data("black tote")
+        self.config.get_model_name = lambda: "other-model"
+        self.service.generate_seo_data("black tote")
+        self.assertEqual(len(self.server.requests), 2)
+
+    def test_batch_requests_only_misses(self):
+        """测试批量生成只请求未缓存的条目"""
+        items = [(f"item {i}", f"IMG_{i:03d}") for i in range(4)]
+        self.service.generate_seo_batch(items[:2])
+        results = self.service.generate_seo_batch(items)
+
+        self.assertEqual([result["title"] for result in results], [f"Item {i} Photo" for i in range(4)])
+        self.assertEqual(len(self.server.requests), 2)
+        prompt = self.server.requests[1]["messages"][-1]["content"]
+        self.assertIn("1. keyword: 'item 2'", prompt)
+        self.assertNotIn("item 0", prompt)
+
+        asyncio.run(self._generate_async(items))
+        self.assertEqual(len(self.server.requests), 2)
+
+    async def _generate_async(self, items):
+        service = AsyncAIService(service=self.service)
+        try:
+            return await service.generate_batch(items)
+        finally:
+            service.close()
+
+    def test_expiry_and_eviction(self):
+        """测试过期条目视为未命中，超出上限时淘汰最久未使用的条目"""
+        result = {"title": "Black Tote", "alt_text": "Black tote"}
+        self.cache.put("old", result)
+        self.cache.ttl_seconds = -1
+        self.assertIsNone(self.cache.get("old"))
+        self.assertEqual(self.cache.get_stats()["entries"], 0)
+
+        self.cache.ttl_seconds = 3600
+        self.cache.max_entries = 10
+        self.cache.put("empty", {"title": "", "alt_text": ""})
+        for i in range(11):
+            self.cache.put(f"key {i}", result)
+        self.assertEqual(self.cache.get_stats()["entries"], 9)
+        self.assertIsNone(self.cache.get("key 0"))
+        self.assertEqual(self.cache.get("key 10"), result)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """测试限流器"""
+
+    def test_parse_reset(self):
+        """测试各服务商的等待时间格式"""
+        self.assertEqual(parse_reset("2"), 2.0)
+        self.assertEqual(parse_reset("6m0s"), 360.0)
+        self.assertEqual(parse_reset("1h2m3.5s"), 3723.5)
+        self.assertAlmostEqual(parse_reset("20ms"), 0.02)
+        self.assertAlmostEqual(parse_reset("2024-01-01T00:00:30Z", now=1704067200.0), 30.0)
+        self.assertAlmostEqual(parse_reset("Mon, 01 Jan 2024 00:00:10 GMT", now=1704067200.0), 10.0)
+        self.assertIsNone(parse_reset("soon"))
+
+    def test_request_and_token_buckets(self):
+        """测试每分钟请求数和 token 数配额"""
+        limiter = RateLimiter(requests_per_minute=60)
+        waits = [limiter.reserve() for _ in range(62)]
+        self.assertEqual(waits[:60], [0.0] * 60)
+        self.assertAlmostEqual(waits[60], 1.0, places=1)
+        self.assertAlmostEqual(waits[61], 2.0, places=1)
+
+        limiter = RateLimiter(tokens_per_minute=6000)
+        self.assertEqual(limiter.reserve(6000), 0.0)
+        self.assertAlmostEqual(limiter.reserve(300), 3.0, places=1)
+
+    def test_learns_limits_from_headers(self):
+        """测试按响应头调整配额，剩余配额为 0 时暂停到重置时间"""
+        limiter = RateLimiter()
+        limiter.on_success({"x-ratelimit-limit-tokens": "90000", "x-ratelimit-remaining-tokens": "89000"})
+        self.assertEqual(limiter.get_stats()["tokens_per_minute"], 90000)
+
+        limiter.on_success({"anthropic-ratelimit-requests-limit": "50",
+                            "anthropic-ratelimit-requests-remaining": "0",
+                            "anthropic-ratelimit-requests-reset": "2s"})
+        self.assertEqual(limiter.get_stats()["requests_per_minute"], 50)
+        self.assertAlmostEqual(limiter.reserve(), 2.0, places=1)
+
+    def test_retry_after_uses_exhausted_bucket(self):
+        """测试没有 Retry-After 时只等待已用完的配额的重置时间"""
+        limiter = RateLimiter(rng=random.Random(0))
+        wait = limiter.on_rate_limited({"x-ratelimit-remaining-requests": "0",
+                                        "x-ratelimit-reset-requests": "1s",
+                                        "x-ratelimit-remaining-tokens": "5000",
+                                        "x-ratelimit-reset-tokens": "6m0s"}, attempt=0)
+        self.assertTrue(1.0 <= wait <= 1.2)
+
+        # 无法判断哪个配额用完时取最短的重置时间
+        limiter = RateLimiter(rng=random.Random(0))
+        wait = limiter.on_rate_limited({"x-ratelimit-reset-requests": "1s",
+                                        "x-ratelimit-reset-tokens": "6m0s"}, attempt=0)
+        self.assertTrue(1.0 <= wait <= 1.2)
+
+    def test_backoff_and_adaptive_concurrency(self):
+        """测试 429 退避带随机等待，并发数减半后逐步恢复"""
+        limiter = RateLimiter(max_concurrency=8, rng=random.Random(0))
+        wait = limiter.on_rate_limited({"retry-after": "2"}, attempt=0)
+        self.assertTrue(2.0 <= wait <= 2.4)
+        self.assertEqual(limiter.concurrency, 4)
+        self.assertGreater(limiter.reserve(), 1.9)
+
+        # 同一波请求的多个 429 只减半一次
+        limiter.on_rate_limited({}, attempt=1)
+        self.assertEqual(limiter.concurrency, 4)
+
+        for _ in range(30):
+            limiter.on_success({})
+        self.assertEqual(limiter.concurrency, 8)
+
+        # 没有响应头时使用带随机等待的指数退避
+        limiter = RateLimiter(rng=random.Random(0))
+        wait = limiter.on_rate_limited({}, attempt=3)
+        self.assertTrue(0 < wait <= 16)
+
+    def test_concurrency_slots(self):
+        """测试并发名额"""
+        limiter = RateLimiter(max_concurrency=2)
+        self.assertTrue(limiter.try_acquire())
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire())
+        limiter.release()
+        with limiter.slot():
+            self.assertEqual(limiter.get_stats()["in_flight"], 2)
+        self.assertEqual(limiter.get_stats()["in_flight"], 1)
+
+        # 名额不足时登记的回调在释放名额时调用一次
+        woken = []
+        self.assertTrue(limiter.try_acquire())
+        self.assertFalse(limiter.try_acquire(lambda: woken.append(1)))
+        limiter.release()
+        limiter.release()
+        self.assertEqual(woken, [1])
+
+
+class TestAsyncAIService(unittest.TestCase):
+    """测试异步批量生成"""
+
+    def setUp(self):
+        self.server = FakeOpenAIServer()
+        self.config = FakeConfig(self.server.base_url)
+        # 替换进程内共享的 AIService（不读写用户配置和缓存）
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.shared = AIService(self.config, cache=AIResponseCache(os.path.join(self.tmp_dir.name, "ai.db")))
+        self._previous_shared = ai_service._shared_service
+        ai_service._shared_service = self.shared
+
+    def tearDown(self):
+        ai_service._shared_service = self._previous_shared
+        self.shared.close()
+        self.tmp_dir.cleanup()
+        self.server.stop()
+
+    async def _collect(self, service, items, batch_size=1):
+        return [item async for item in service.generate_many(items, batch_size=batch_size)]
+
+    def test_import_without_qt(self):
+        """测试导入 ai_async 不依赖 PySide6（ConfigManager 只在未传入配置时导入）"""
+        src = os.path.join(os.path.dirname(__file__), '..', 'src')
+        code = ("import sys; sys.modules['PySide6'] = None; "
+                f"sys.path.insert(0, {src!r}); import imgseofriend.ai_async")
+        completed = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True)
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+
+    def test_shares_rate_limiter(self):
+        """测试默认创建的服务与 get_ai_service() 共用 RateLimiter 和 AI 响应缓存，连接池单独创建"""
+        service = AsyncAIService(self.config, concurrency=3)
+        try:
+            self.assertIs(service.service.rate_limiter, self.shared.rate_limiter)
+            self.assertIsNot(service.service.session, self.shared.session)
+            asyncio.run(self._collect(service, [("black tote", "")]))
+        finally:
+            service.close()
+
+        # 异步路径写入的结果，界面调用时直接命中
+        self.assertEqual(self.shared.generate_seo_data("black tote")["title"], "Black Tote Photo")
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_concurrency_ceiling(self):
+        """测试同时进行的请求数不超过上限，结果全部返回"""
+        self.server.delay = 0.2
+        items = [(f"item {i}", "") for i in range(9)]
+        service = AsyncAIService(self.config, concurrency=3)
+        try:
+            start = time.perf_counter()
+            results = asyncio.run(self._collect(service, iter(items)))
+            elapsed = time.perf_counter() - start
+        finally:
+            service.close()
+
+        self.assertEqual(sorted(index for index, _ in results), list(range(9)))
+        self.assertEqual(dict(results)[4]["title"], "Item 4 Photo")
+        self.assertEqual(self.server.max_active, 3)
+        self.assertLess(elapsed, 9 * 0.2)
+
+    def test_results_stream_as_completed(self):
+        """测试结果按完成顺序返回，超时的请求返回空结果"""
+        self.server.delays = {"slow": 1.5, "fast": 0.0}
+        service = AsyncAIService(self.config, concurrency=2, request_timeout=0.5)
+        service.service.max_retries = 1
+        try:
+            results = asyncio.run(self._collect(service, [("slow", ""), ("fast", "")]))
+        finally:
+            service.close()
+
+        self.assertEqual([index for index, _ in results], [1, 0])
+        self.assertEqual(results[0][1]["title"], "Fast Photo")
+        self.assertEqual(results[1][1], {"title": "", "alt_text": ""})
+
+    def test_request_timeout_covers_whole_response(self):
+        """测试超时限制整个请求：响应体持续缓慢到达时也按 request_timeout 放弃并释放名额"""
+        self.server.trickle = {"slow": 2.0}
+        service = AsyncAIService(self.config, concurrency=2, request_timeout=0.5)
+        service.service.max_retries = 1
+        try:
+            start = time.perf_counter()
+            result = asyncio.run(service.generate("slow"))
+            elapsed = time.perf_counter() - start
+        finally:
+            service.close()
+
+        self.assertEqual(result, {"title": "", "alt_text": ""})
+        self.assertLess(elapsed, 1.5)
+        self.assertEqual(service.service.rate_limiter.get_stats()["in_flight"], 0)
+
+    def test_batched_requests(self):
+        """测试按 batch_size 合并请求"""
+        service = AsyncAIService(self.config, concurrency=2)
+        items = [(f"item {i}", "") for i in range(10)]
+        try:
+            results = asyncio.run(self._collect(service, items, batch_size=4))
+        finally:
+            service.close()
+
+        self.assertEqual(len(self.server.requests), 3)
+        self.assertEqual(sorted(dict(results).items()),
+                         [(i, {"title": f"Item {i} Photo", "alt_text": f"Photo of item {i}"}) for i in range(10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+"""
+Tests for batch processing
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image
+
+from imgseofriend.batch import run_batch, plan_outputs, collect_images
+
+
+class TestBatch(unittest.TestCase):
+    """测试批处理"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = Path(self.tmp.name) / "src"
+        self.dst = Path(self.tmp.name) / "dst"
+        (self.src / "sub").mkdir(parents=True)
+        Image.new('RGB', (800, 600), (200, 30, 30)).save(self.src / "photo.jpg")
+        Image.new('RGBA', (300, 200), (0, 0, 255, 128)).save(self.src / "photo.png")
+        Image.new('RGB', (640, 480), (10, 120, 10)).save(self.src / "sub" / "leaf.jpg")
+        (self.src / "notes.txt").write_text("not an image")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_plan_outputs_avoids_collisions(self):
+        """测试同名图片分配不同输出路径"""
+        images = collect_images(str(self.src))
+        jobs = plan_outputs(images, str(self.src), str(self.dst))
+        outputs = [Path(output).relative_to(self.dst).as_posix() for _, output in jobs]
+        self.assertEqual(outputs, ["photo.webp", "photo-1.webp", "sub/leaf.webp"])
+
+    def test_run_batch(self):
+        """测试批量处理目录树"""
+        cache_dir = str(Path(self.tmp.name) / "cache")
+        report = run_batch(str(self.src), str(self.dst), 500, 80, workers=2, cache_dir=cache_dir,
+                           min_ssim=1.01)
+        self.assertEqual(report.processed, 3)
+        self.assertEqual(report.failures, [])
+        # 每个输出都有 SSIM，低于阈值的列在摘要中
+        self.assertEqual(len(report.low_ssim), 3)
+        self.assertIn("3 below 1.01", report.format_summary())
+        with Image.open(self.dst / "sub" / "leaf.webp") as img:
+            self.assertEqual(img.size, (500, 375))
+
+        # 不使用处理清单时，第二次运行全部命中输出缓存
+        report = run_batch(str(self.src), str(self.dst), 500, 80, workers=2, cache_dir=cache_dir,
+                           use_manifest=False)
+        self.assertEqual(report.cache_hits, 3)
+
+    def test_manifest_skips_unchanged(self):
+        """测试处理清单跳过未变化的图片，参数或源文件变化时重新处理"""
+        report = run_batch(str(self.src), str(self.dst), 500, 80, workers=2, use_cache=False)
+        self.assertEqual(report.processed, 3)
+
+        report = run_batch(str(self.src), str(self.dst), 500, 80, workers=2, use_cache=False)
+        self.assertEqual((report.processed, report.skipped), (0, 3))
+
+        # 只有修改时间变化：内容哈希相同，仍然跳过
+        os.utime(self.src / "photo.jpg", ns=(0, 10 ** 9))
+        report = run_batch(str(self.src), str(self.dst), 500, 80, workers=2, use_cache=False)
+        self.assertEqual((report.processed, report.skipped), (0, 3))
+
+        # 源文件修改后沿用原来的输出路径
+        Image.new('RGB', (400, 300), (0, 0, 0)).save(self.src / "sub" / "leaf.jpg")
+        report = run_batch(str(self.src), str(self.dst), 500, 80, workers=2, use_cache=False)
+        self.assertEqual((report.processed, report.skipped), (1, 2))
+        self.assertEqual(sorted(os.listdir(self.dst / "sub")), ["leaf.webp"])
+
+        # 质量变化时全部重新处理
+        report = run_batch(str(self.src), str(self.dst), 500, 70, workers=2, use_cache=False)
+        self.assertEqual((report.processed, report.skipped), (3, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,279 @@
+"""
+Tests for the Qt-free image pipeline
+"""
+
+import unittest
+import sys
+import os
+import io
+import tempfile
+from unittest import mock
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image
+
+from imgseofriend import analysis, core
+from imgseofriend.encoders import get_available_formats, get_encoder
+from imgseofriend.metrics import JobMetrics, summarize
+from imgseofriend.naming import DirectoryNameIndex
+
+
+def make_image_bytes(size=(1600, 1200), mode='RGB', color=(200, 30, 30), fmt='JPEG') -> bytes:
+    """生成测试图片数据"""
+    buffer = io.BytesIO()
+    Image.new(mode, size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class TestCorePipeline(unittest.TestCase):
+    """测试核心处理流水线"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.tmp_path = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_convert_bytes(self):
+        """测试从 bytes 转换，不写入磁盘"""
+        data = make_image_bytes()
+        messages = []
+        encoded = core.convert_image(data, 800, 80, progress=messages.append)
+        self.assertEqual(encoded.original_size, (1600, 1200))
+        self.assertEqual(encoded.processed_size, (800, 600))
+        self.assertEqual(encoded.original_filesize, len(data))
+        self.assertTrue(messages)
+        with Image.open(io.BytesIO(encoded.data)) as img:
+            self.assertEqual(img.format, 'WEBP')
+
+    def test_process_path(self):
+        """测试从路径处理并保存"""
+        source = self.tmp_path / "red dress.png"
+        Image.new('RGBA', (400, 300), (255, 0, 0, 128)).save(source)
+        result = core.process_image(str(source), "Red Dress", 1200, 80)
+        self.assertEqual(Path(result.processed_path).name, "red-dress.webp")
+        self.assertEqual(Path(result.processed_path).parent.name, core.OUTPUT_FOLDER_NAME)
+        self.assertEqual(result.processed_size, (400, 300))
+
+    def test_process_bytes_requires_destination(self):
+        """测试 bytes 来源必须指定输出位置"""
+        with self.assertRaises(ValueError):
+            core.process_image(make_image_bytes(), "", 500, 80)
+
+    def test_reduction_factor(self):
+        """测试降低解码倍数选择"""
+        self.assertEqual(core.get_reduction_factor((6000, 4000), (1200, 800)), 4)
+        self.assertEqual(core.get_reduction_factor((2000, 1500), (1200, 900)), 1)
+        self.assertEqual(core.get_reduction_factor((20000, 10000), (500, 250)), 8)
+
+    def test_reduced_decode_keeps_target_size(self):
+        """测试 JPEG draft 解码后仍输出目标尺寸"""
+        encoded = core.convert_image(make_image_bytes(size=(4800, 3200)), 1200, 80)
+        self.assertEqual(encoded.processed_size, (1200, 800))
+
+    def test_process_variants(self):
+        """测试一次解码生成多个宽度"""
+        source = self.tmp_path / "sofa.jpg"
+        Image.new('RGB', (1000, 800), (30, 30, 200)).save(source)
+        results = core.process_variants(str(source), "", [500, 750, 1200], 80)
+        names = [Path(result.processed_path).name for result in results]
+        self.assertEqual(names, ["sofa-500w.webp", "sofa-750w.webp"])
+        self.assertEqual([result.processed_size for result in results], [(500, 400), (750, 600)])
+        self.assertEqual(core.get_srcset(results), "sofa-500w.webp 500w, sofa-750w.webp 750w")
+
+    def test_output_cache(self):
+        """测试相同源内容和参数命中输出缓存"""
+        cache = core.OutputCache(self.tmp_path / "cache")
+        data = make_image_bytes()
+        first = core.process_image(data, "chair", 800, 80, output_directory=str(self.tmp_path), cache=cache)
+        second = core.process_image(data, "chair", 800, 80, output_directory=str(self.tmp_path), cache=cache)
+        third = core.process_image(data, "chair", 800, 70, output_directory=str(self.tmp_path), cache=cache)
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertFalse(third.from_cache)
+        self.assertEqual(Path(second.processed_path).name, "chair-1.webp")
+        self.assertEqual(second.processed_size, first.processed_size)
+        self.assertEqual(Path(second.processed_path).read_bytes(), Path(first.processed_path).read_bytes())
+        self.assertEqual(cache.get_stats()["hits"], 1)
+        # 计算缓存键时得到的源文件哈希随结果返回，供处理清单复用
+        self.assertEqual(first.source_hash, core.hash_source(data))
+        self.assertEqual(second.source_hash, first.source_hash)
+
+    def test_output_cache_cleans_up_failed_write(self):
+        """测试写入缓存失败时删除临时文件"""
+        cache = core.OutputCache(self.tmp_path / "cache")
+        with mock.patch("imgseofriend.cache.os.replace", side_effect=OSError("disk full")):
+            cache.put("ab" * 20, b"data")
+        self.assertEqual(list((self.tmp_path / "cache").rglob("*.tmp")), [])
+        self.assertIsNone(cache.get("ab" * 20))
+
+    def test_encode_profiles(self):
+        """测试编码档位参与缓存键，未知档位报错"""
+        data = make_image_bytes()
+        cache = core.OutputCache(self.tmp_path / "cache")
+        core.convert_image(data, 800, 80, cache=cache, profile="fast")
+        encoded = core.convert_image(data, 800, 80, cache=cache, profile="max_compression")
+        self.assertFalse(encoded.from_cache)
+        with self.assertRaises(ValueError):
+            core.convert_image(data, 800, 80, profile="ultra")
+
+    def test_encode_profile_threads(self):
+        """测试编码档位的线程数传给支持多线程的编码器，且不参与缓存键"""
+        avif = get_encoder("avif")
+        self.assertEqual(avif.get_options(80, "fast")["max_threads"], 1)
+        self.assertEqual(avif.get_options(80, "balanced")["max_threads"], 2)
+        self.assertNotIn("max_threads", avif.get_options(80, "max_compression"))
+        self.assertNotIn("max_threads", avif.get_settings("fast"))
+        self.assertNotIn("max_threads", get_encoder("webp").get_options(80, "fast"))
+        if avif.is_available():
+            img = Image.new("RGB", (64, 48), "red")
+            self.assertTrue(avif.encode(img, 80, "fast"))
+
+    def test_target_filesize(self):
+        """测试目标文件大小模式搜索质量并记录编码次数"""
+        gradient = Image.linear_gradient('L').resize((1200, 900))
+        noise = Image.effect_noise((1200, 900), 30)
+        buffer = io.BytesIO()
+        Image.merge('RGB', (gradient, noise, gradient)).save(buffer, 'PNG')
+        data = buffer.getvalue()
+
+        # 以质量 50 的大小作为目标，搜索结果应落在容差范围内
+        target = core.convert_image(data, 800, 50, profile="fast").processed_filesize + 100
+        encoded = core.convert_image(data, 800, 80, profile="fast", target_filesize=target)
+        self.assertLessEqual(encoded.processed_filesize, target)
+        self.assertGreaterEqual(encoded.processed_filesize, target * (1 - core.DEFAULT_SIZE_TOLERANCE))
+        self.assertGreater(encoded.encode_passes, 1)
+        self.assertLess(encoded.quality, 80)
+
+    def test_auto_quality(self):
+        """测试平坦图片与细节丰富的图片自动选择不同质量"""
+        flat = core.convert_image(make_image_bytes(fmt='PNG'), 800, 80, auto_quality=True)
+        noise = io.BytesIO()
+        Image.effect_noise((1600, 1200), 60).convert('RGB').save(noise, 'PNG')
+        detailed = core.convert_image(noise.getvalue(), 800, 80, auto_quality=True)
+        self.assertEqual(flat.quality, analysis.AUTO_QUALITY_RANGE[0])
+        self.assertEqual(detailed.quality, analysis.AUTO_QUALITY_RANGE[1])
+        self.assertEqual(flat.encode_passes, 1)
+
+    def test_alpha_handling(self):
+        """测试不透明 RGBA 直接转为 RGB，透明图片按选项保留或合成"""
+        opaque = core.prepare_image(Image.new('RGBA', (1000, 800), (10, 20, 30, 255)), 500)
+        self.assertEqual((opaque.mode, opaque.size), ('RGB', (500, 400)))
+
+        transparent = Image.new('RGBA', (1000, 800), (10, 20, 30, 0))
+        flattened = core.prepare_image(transparent, 500)
+        self.assertEqual(flattened.getpixel((0, 0)), (255, 255, 255))
+        kept = core.prepare_image(transparent, 500, keep_alpha=True)
+        self.assertEqual(kept.mode, 'RGBA')
+
+        data = make_image_bytes(mode='RGBA', color=(0, 0, 255, 128), fmt='PNG')
+        encoded = core.convert_image(data, 800, 80, keep_alpha=True)
+        with Image.open(io.BytesIO(encoded.data)) as img:
+            self.assertEqual(img.mode, 'RGBA')
+
+    def test_output_formats(self):
+        """测试多种格式一次解码并行编码，文件主名相同"""
+        source = self.tmp_path / "lamp.png"
+        Image.new('RGBA', (1000, 800), (200, 120, 0, 128)).save(source)
+        formats = [name for name in ("webp", "avif", "jpeg") if name in get_available_formats()]
+        result = core.process_image(str(source), "", 500, 80, output_formats=formats)
+        results = [result] + result.alternates
+        self.assertEqual([Path(item.processed_path).name for item in results],
+                         [f"lamp{get_encoder(name).extension}" for name in formats])
+        for item in results:
+            with Image.open(item.processed_path) as img:
+                self.assertEqual(img.size, (500, 400))
+
+        core.rename_processed_image(result, "Brass Lamp")
+        self.assertEqual(sorted(Path(item.processed_path).stem for item in results), ["brass-lamp"] * len(formats))
+        with self.assertRaises(ValueError):
+            core.convert_image(make_image_bytes(), 500, 80, output_format="gif")
+
+    def test_stage_metrics(self):
+        """测试按阶段记录耗时和字节数"""
+        metrics = JobMetrics("lamp")
+        result = core.process_image(make_image_bytes(), "lamp", 800, 80,
+                                    output_directory=str(self.tmp_path), metrics=metrics)
+        core.rename_processed_image(result, "Brass Lamp", metrics=metrics)
+
+        stages = {record["stage"]: record for record in metrics.stages}
+        self.assertEqual(set(stages), {"open", "decode", "convert", "resize", "encode", "ssim", "write",
+                                       "rename"})
+        self.assertEqual(stages["encode"]["bytes"], result.processed_filesize)
+        self.assertEqual(stages["write"]["bytes"], result.processed_filesize)
+        self.assertEqual(stages["resize"]["bytes"], 800 * 600 * 3)
+
+        summary = summarize([metrics.to_dict(), metrics.to_dict()])
+        self.assertEqual(summary["encode"]["count"], 2)
+        self.assertGreaterEqual(summary["wall"]["p95_ms"], summary["encode"]["p50_ms"])
+
+    def test_ssim(self):
+        """测试 SSIM：相同图片为 1，低质量编码的噪点图片明显下降"""
+        noise = Image.effect_noise((800, 600), 60).convert('RGB')
+        reference = analysis.get_ssim_reference(noise)
+        self.assertEqual(reference.shape, (192, 256))
+        self.assertAlmostEqual(analysis.structural_similarity(reference, reference), 1.0)
+
+        buffer = io.BytesIO()
+        noise.save(buffer, 'PNG')
+        high = core.convert_image(buffer.getvalue(), 800, 95)
+        low = core.convert_image(buffer.getvalue(), 800, 5)
+        self.assertGreater(high.ssim, low.ssim)
+        self.assertLessEqual(high.ssim, 1.0)
+        # JPEG 与参考平面按相同方式缩小，高质量编码不会被误判为低 SSIM
+        jpeg = core.convert_image(buffer.getvalue(), 800, 95, output_format="jpeg")
+        self.assertGreater(jpeg.ssim, 0.95)
+
+        result = core.process_image(buffer.getvalue(), "noise", 400, 80, output_directory=str(self.tmp_path))
+        self.assertIsNotNone(result.ssim)
+        self.assertIn("SSIM", result.get_quality_info())
+
+    def test_reserve_output_path(self):
+        """测试占用不冲突的输出文件名"""
+        first = core.reserve_output_path(str(self.tmp_path), "lamp")
+        second = core.reserve_output_path(str(self.tmp_path), "lamp")
+        self.assertEqual([Path(first).name, Path(second).name], ["lamp.webp", "lamp-1.webp"])
+
+        core.write_atomic(b"data", first)
+        self.assertEqual(Path(first).read_bytes(), b"data")
+        self.assertEqual(sorted(os.listdir(self.tmp_path)), ["lamp-1.webp", "lamp.webp"])
+
+    def test_name_index(self):
+        """测试目录文件名索引分配与并发占用"""
+        for counter in range(50):
+            name = "red-dress.webp" if counter == 0 else f"red-dress-{counter}.webp"
+            (self.tmp_path / name).write_bytes(b"")
+
+        index = DirectoryNameIndex(str(self.tmp_path))
+        self.assertEqual(Path(index.next_free("red-dress")).name, "red-dress-50.webp")
+
+        # 索引建立后由其他进程创建的文件通过 O_EXCL 发现
+        (self.tmp_path / "red-dress-50.webp").write_bytes(b"")
+        self.assertEqual(Path(index.reserve("red-dress")).name, "red-dress-51.webp")
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            paths = list(executor.map(lambda _: index.reserve("red-dress"), range(40)))
+        self.assertEqual(len(set(paths)), 40)
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_rename_does_not_overwrite(self):
+        """测试按标题重命名时不覆盖已有文件"""
+        (self.tmp_path / "red-chair.webp").write_bytes(b"existing")
+        result = core.process_image(make_image_bytes(), "chair", 500, 80, output_directory=str(self.tmp_path))
+        core.rename_processed_image(result, "Red Chair")
+        self.assertEqual(Path(result.processed_path).name, "red-chair-1.webp")
+        self.assertEqual((self.tmp_path / "red-chair.webp").read_bytes(), b"existing")
+
+    def test_normalize_filename(self):
+        """测试文件名标准化"""
+        self.assertEqual(core.normalize_filename("Black Leather Tote | Shop!"), "black-leather-tote-shop")
+        self.assertEqual(core.normalize_filename("!!!"), "optimized-image")
+
+
+if __name__ == '__main__':
+    unittest.main()
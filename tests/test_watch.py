@@ -0,0 +1,121 @@
+"""
+Tests for the watch-folder runner
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image
+
+from unittest import mock
+
+from imgseofriend import watch
+from imgseofriend.batch import _process_job
+from imgseofriend.core import OUTPUT_FOLDER_NAME
+from imgseofriend.manifest import MANIFEST_FILENAME
+from imgseofriend.watch import FolderWatcher
+
+
+def _crashing_job(job):
+    """文件名包含 crash 时让工作进程直接退出（模拟解码器崩溃）"""
+    if "crash" in os.path.basename(job[0]):
+        os._exit(1)
+    return _process_job(job)
+
+
+class TestFolderWatcher(unittest.TestCase):
+    """测试监视文件夹"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = Path(self.tmp.name)
+        self.dst = self.src / OUTPUT_FOLDER_NAME
+        (self.src / "day1").mkdir()
+        Image.new('RGB', (800, 600), (200, 30, 30)).save(self.src / "day1" / "look.jpg")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _make_watcher(self, **kwargs) -> FolderWatcher:
+        return FolderWatcher(str(self.src), target_width=400, workers=1, use_cache=False,
+                             verbose=False, **kwargs)
+
+    def test_waits_for_writes_to_settle(self):
+        """测试文件保持不变 settle 秒后才处理"""
+        watcher = self._make_watcher(settle_seconds=5)
+        try:
+            watcher.poll(now=100)
+            self.assertEqual(watcher.get_pending_count(), 1)
+            self.assertEqual(watcher._in_flight, {})
+
+            watcher.poll(now=106)
+            watcher.drain()
+        finally:
+            watcher.close()
+        self.assertEqual(watcher.processed, 1)
+        with Image.open(self.dst / "day1" / "look.webp") as img:
+            self.assertEqual(img.size, (400, 300))
+
+    def test_state_survives_restart(self):
+        """测试重启后只处理新增或修改的文件"""
+        watcher = self._make_watcher(settle_seconds=0)
+        try:
+            watcher.poll()
+            watcher.drain()
+        finally:
+            watcher.close()
+        self.assertTrue((self.dst / MANIFEST_FILENAME).exists())
+
+        Image.new('RGB', (800, 600), (10, 120, 10)).save(self.src / "leaf.png")
+        watcher = self._make_watcher(settle_seconds=0)
+        try:
+            watcher.poll()
+            watcher.drain()
+        finally:
+            watcher.close()
+        self.assertEqual(watcher.processed, 1)
+        outputs = sorted(name for name in os.listdir(self.dst) if not name.startswith("."))
+        self.assertEqual(outputs, ["day1", "leaf.webp"])
+
+        # 修改过的文件覆盖原来的输出
+        Image.new('RGB', (1000, 500), (0, 0, 0)).save(self.src / "day1" / "look.jpg")
+        os.utime(self.src / "day1" / "look.jpg", ns=(0, 10 ** 9))
+        watcher = self._make_watcher(settle_seconds=0)
+        try:
+            watcher.poll()
+            watcher.drain()
+        finally:
+            watcher.close()
+        self.assertEqual(os.listdir(self.dst / "day1"), ["look.webp"])
+        with Image.open(self.dst / "day1" / "look.webp") as img:
+            self.assertEqual(img.size, (400, 200))
+
+    def test_recovers_from_crashed_worker(self):
+        """测试工作进程崩溃后重建进程池，崩溃的文件记为失败，其他文件继续处理"""
+        Image.new('RGB', (800, 600), (0, 0, 200)).save(self.src / "crash.png")
+        watcher = self._make_watcher(settle_seconds=0)
+        try:
+            with mock.patch.object(watch, "_process_job", _crashing_job):
+                watcher.poll()
+                watcher.drain()
+                # 崩溃的文件未修改时不再重试，进程池仍可使用
+                Image.new('RGB', (800, 600), (0, 200, 0)).save(self.src / "after.png")
+                watcher.poll()
+                watcher.drain()
+        finally:
+            watcher.close()
+
+        self.assertEqual([os.path.basename(source) for source, _ in watcher.failures], ["crash.png"])
+        self.assertEqual(watcher.processed, 2)
+        self.assertTrue((self.dst / "after.webp").exists())
+        self.assertTrue((self.dst / "day1" / "look.webp").exists())
+
+
+if __name__ == '__main__':
+    unittest.main()
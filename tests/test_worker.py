@@ -0,0 +1,146 @@
+"""
+Tests for ImageWorker
+"""
+
+import unittest
+import sys
+import os
+import tempfile
+import time
+from pathlib import Path
+
+# 添加src目录到Python路径
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from PIL import Image
+
+from imgseofriend.ai_service import AIService
+from imgseofriend.core import convert_image, process_image
+from imgseofriend.metrics import read_jsonl
+from imgseofriend.worker import ImageWorker
+
+
+class TestImageWorker(unittest.TestCase):
+    """测试图片处理工作线程（在当前线程中直接调用 run）"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.source = Path(self.tmp.name) / "tote.jpg"
+        Image.new('RGB', (900, 600), (20, 20, 20)).save(self.source)
+        self.finished = []
+        self.errors = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _make_worker(self, **kwargs) -> ImageWorker:
+        """创建工作线程并记录信号"""
+        # 使用独立的 AIService，替换方法不影响进程内共享的实例
+        worker = ImageWorker(image_path=str(self.source), keyword="black tote", target_width=500,
+                             ai_service=AIService(), **kwargs)
+        worker.ai_service.generate_seo_data = lambda keyword, filename="", bypass_cache=False, on_partial=None: {
+            "title": "Black Leather Tote Bag", "alt_text": "Black leather tote on a table"
+        }
+        worker.finished.connect(lambda result, ai_result: self.finished.append((result, ai_result)))
+        worker.error.connect(self.errors.append)
+        return worker
+
+    def test_ai_only_renames_without_reprocessing(self):
+        """测试 ai_only 模式只调用 AI 并原地重命名"""
+        image_result = process_image(str(self.source), "black tote", 500, 80)
+        original_bytes = Path(image_result.processed_path).read_bytes()
+
+        worker = self._make_worker(process_mode="ai_only", image_result=image_result)
+        worker.run()
+
+        self.assertEqual(self.errors, [])
+        result, ai_result = self.finished[0]
+        self.assertEqual(Path(result.processed_path).name, "black-leather-tote-bag.webp")
+        self.assertEqual(Path(result.processed_path).read_bytes(), original_bytes)
+        self.assertEqual(os.listdir(Path(result.processed_path).parent), ["black-leather-tote-bag.webp"])
+
+    def test_with_ai_overlaps_encode_and_request(self):
+        """测试 with_ai 模式中 AI 请求与图片编码并行执行"""
+        worker = self._make_worker(process_mode="with_ai")
+        worker.output_cache = None
+
+        def slow_ai(keyword, filename="", bypass_cache=False, on_partial=None):
+            time.sleep(0.5)
+            return {"title": "Black Tote", "alt_text": "Black tote"}
+
+        def slow_encode():
+            time.sleep(0.5)
+            return [convert_image(str(self.source), 500, 80)]
+
+        worker.ai_service.generate_seo_data = slow_ai
+        worker._encode_image = slow_encode
+
+        start = time.perf_counter()
+        worker.run()
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(self.errors, [])
+        self.assertLess(elapsed, 0.9)
+        result, ai_result = self.finished[0]
+        # 直接写入最终文件名，不经过关键词文件名再重命名
+        self.assertEqual(os.listdir(Path(result.processed_path).parent), ["black-tote.webp"])
+
+    def test_reuses_name_deleted_outside_app(self):
+        """测试在应用外删除的输出文件名在下一次处理时重新使用"""
+        first = self._make_worker(process_mode="image_only")
+        first.output_cache = None
+        first.run()
+        output_path = Path(self.finished[0][0].processed_path)
+        self.assertEqual(output_path.name, "black-tote.webp")
+
+        output_path.unlink()
+        second = self._make_worker(process_mode="image_only")
+        second.output_cache = None
+        second.run()
+
+        self.assertEqual(self.errors, [])
+        self.assertEqual(Path(self.finished[1][0].processed_path).name, "black-tote.webp")
+
+    def test_encode_failure_waits_for_ai_request(self):
+        """测试 with_ai 模式编码失败时等待进行中的 AI 请求结束后才发出 error，结果不再使用"""
+        worker = self._make_worker(process_mode="with_ai")
+        events = []
+        worker.error.connect(lambda message: events.append("error"))
+
+        def slow_ai(keyword, filename="", bypass_cache=False, on_partial=None):
+            time.sleep(0.3)
+            events.append("ai")
+            return {"title": "Black Tote", "alt_text": "Black tote"}
+
+        def failing_encode():
+            time.sleep(0.05)  # AI 请求已经开始
+            raise OSError("cannot decode")
+
+        worker.ai_service.generate_seo_data = slow_ai
+        worker._encode_image = failing_encode
+        worker.run()
+
+        self.assertEqual(events, ["ai", "error"])
+        self.assertEqual(self.finished, [])
+        self.assertEqual(len(self.errors), 1)
+        self.assertIn("cannot decode", self.errors[0])
+
+    def test_metrics_signal_and_log(self):
+        """测试任务结束时发出阶段计时并追加到 JSON Lines 日志"""
+        worker = self._make_worker(process_mode="with_ai")
+        worker.output_cache = None
+        worker.metrics_log = str(Path(self.tmp.name) / "logs" / "metrics.jsonl")
+        records = []
+        worker.metrics.connect(records.append)
+        worker.run()
+
+        self.assertEqual(self.errors, [])
+        self.assertTrue(records[0]["ok"])
+        stages = [record["stage"] for record in records[0]["stages"]]
+        for name in ("open", "decode", "resize", "encode", "write", "ai"):
+            self.assertIn(name, stages)
+        self.assertEqual(read_jsonl(worker.metrics_log), records)
+
+
+if __name__ == '__main__':
+    unittest.main()